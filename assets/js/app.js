@@ -1,26 +1,46 @@
 
 const state = {
   personas: [],
-  actions: [],
+  summary: {groups: []}, // per persona x task aggregates from the worker
+  rows: 0,
+  status: "",
 };
 
+// Run data is fetched and parsed by a worker; the page only ever holds the visible rows
+const worker = new Worker("./assets/js/feed-worker.js");
+const ROW_HEIGHT = 37;
+const OVERSCAN = 10;
+let rowRequest = 0;
+
 async function loadData() {
-  const pj = await fetch("./data/simpersonas.json").then(r=>r.json());
-  const csvText = await fetch("./data/simpersona_actions.csv").then(r=>r.text());
-  const parsed = Papa.parse(csvText, {header:true,dynamicTyping:true});
-  state.personas = pj;
-  state.actions = parsed.data.filter(r => r.persona_id); // drop trailing empty row
+  state.personas = await fetch("./data/simpersonas.json").then(r=>r.json());
+  worker.postMessage({type: "init", base: new URL("./data/", location.href).href});
 }
 
-function groupBy(arr, key) {
-  return arr.reduce((acc, cur) => {
-    const k = cur[key];
-    (acc[k] ||= []).push(cur);
-    return acc;
-  }, {});
+worker.onmessage = (e) => {
+  const msg = e.data;
+  if (msg.type === "summary") {
+    state.summary = msg.summary;
+    state.rows = msg.rows;
+    state.status = msg.status;
+    renderCharts();
+    renderTables();
+  } else if (msg.type === "rows" && msg.id === rowRequest) {
+    renderRows(msg.start, msg.rows);
+  } else if (msg.type === "error") {
+    console.error(msg.message);
+  }
+};
+
+function listenForUpdates() {
+  // Served by `main.py --serve`: each new feed index is pushed while the run is in progress
+  if (!location.protocol.startsWith("http") || !window.EventSource) return;
+  const events = new EventSource("/events");
+  events.addEventListener("index", e => worker.postMessage({type: "index", index: JSON.parse(e.data)}));
+  events.onerror = () => { if (events.readyState === EventSource.CLOSED) events.close(); };
 }
 
-function avg(nums){ return nums.length? nums.reduce((a,b)=>a+b,0)/nums.length : 0; }
+function ratio(num, den){ return den ? num/den : 0; }
 
 function renderPersonaCards() {
   const wrap = document.querySelector("#persona-cards");
@@ -47,19 +67,43 @@ function renderPersonaCards() {
 }
 
 function renderTables() {
+  // Virtualized: the spacer gives the scrollbar its full height, only visible rows are in the DOM
+  document.querySelector("#logs-spacer").style.height = `${state.rows * ROW_HEIGHT}px`;
+  document.querySelector("#logs-count").textContent =
+    `${state.rows.toLocaleString()} runs${state.status === "running" ? " (run in progress)" : ""}`;
+  requestRows();
+}
+
+function requestRows() {
+  const viewport = document.querySelector("#logs-viewport");
+  const start = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+  const count = Math.ceil(viewport.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN;
+  // Only the latest request is rendered; answers for rows scrolled past are dropped
+  worker.postMessage({type: "rows", id: ++rowRequest, start, count});
+}
+
+function renderRows(start, rows) {
   const tbody = document.querySelector("#logs-body");
-  tbody.innerHTML = "";
-  state.actions.slice(0,200).forEach(r => {
+  tbody.parentElement.style.transform = `translateY(${start * ROW_HEIGHT}px)`;
+  tbody.replaceChildren(...rows.map(r => {
     const tr = document.createElement("tr");
-    tr.innerHTML = `
-      <td>${r.persona_label}</td>
-      <td>${r.task_label}</td>
-      <td>${r.steps_count}</td>
-      <td>${r.errors}</td>
-      <td>${r.success ? "Yes" : "No"}</td>
-      <td><span class="small">${r.actions}</span></td>
-    `;
-    tbody.appendChild(tr);
+    [r.persona_label, r.task_label, r.steps_count, r.errors, r.success ? "Yes" : "No", r.actions].forEach((value, i) => {
+      const td = document.createElement("td");
+      td.textContent = value ?? "";
+      if (i === 5) td.className = "small";
+      tr.appendChild(td);
+    });
+    return tr;
+  }));
+}
+
+function wireTable() {
+  const viewport = document.querySelector("#logs-viewport");
+  let pending = false;
+  viewport.addEventListener("scroll", () => {
+    if (pending) return;
+    pending = true;
+    requestAnimationFrame(() => { pending = false; requestRows(); });
   });
 }
 
@@ -69,15 +113,17 @@ function renderCharts() {
   Object.values(charts).forEach(c => c.destroy && c.destroy());
 
   // Average steps per persona per task (grouped)
-  const tasks = [...new Set(state.actions.map(r=>r.task_label))];
-  const personas = [...new Set(state.actions.map(r=>r.persona_label))];
+  const groups = state.summary.groups;
+  const tasks = [...new Set(groups.map(g=>g.task_label))];
+  const personas = [...new Set(groups.map(g=>g.persona_label))];
+  const total = (pl, field) => groups.filter(g=>g.persona_label===pl).reduce((a,g)=>a+g[field],0);
 
   const datasets1 = personas.map(pl => {
     return {
       label: pl,
       data: tasks.map(tl => {
-        const subset = state.actions.filter(r=>r.persona_label===pl && r.task_label===tl);
-        return +(avg(subset.map(s=>Number(s.steps_count)||0)).toFixed(2));
+        const g = groups.find(g=>g.persona_label===pl && g.task_label===tl);
+        return g ? +ratio(g.steps, g.runs).toFixed(2) : 0;
       }),
     };
   });
@@ -88,10 +134,7 @@ function renderCharts() {
   });
 
   // Average errors per persona
-  const avgErr = personas.map(pl => {
-    const subset = state.actions.filter(r=>r.persona_label===pl);
-    return +(avg(subset.map(s=>Number(s.errors)||0)).toFixed(2));
-  });
+  const avgErr = personas.map(pl => +ratio(total(pl, "errors"), total(pl, "runs")).toFixed(2));
   charts.errors = new Chart(document.getElementById("chart-errors"), {
     type: "bar",
     data: { labels: personas, datasets: [{ label: "Errors", data: avgErr }] },
@@ -99,11 +142,7 @@ function renderCharts() {
   });
 
   // Success rate by persona
-  const succPct = personas.map(pl => {
-    const subset = state.actions.filter(r=>r.persona_label===pl);
-    const rate = 100 * (avg(subset.map(s=>Number(s.success)||0)));
-    return +rate.toFixed(1);
-  });
+  const succPct = personas.map(pl => +(100 * ratio(total(pl, "successes"), total(pl, "runs"))).toFixed(1));
   charts.success = new Chart(document.getElementById("chart-success"), {
     type: "bar",
     data: { labels: personas, datasets: [{ label: "Success Rate (%)", data: succPct }] },
@@ -120,15 +159,16 @@ function wireTabs() {
     document.getElementById(target).style.display="block";
     links.forEach(l => l.classList.remove("active"));
     a.classList.add("active");
+    if (target === "logs") requestRows(); // the viewport had no height while hidden
   }));
 }
 
 async function main() {
   wireTabs();
+  wireTable();
   await loadData();
   renderPersonaCards();
-  renderTables();
-  renderCharts();
+  listenForUpdates();
   // default view
   document.querySelector('.nav a[href="#dashboard"]').click();
 }
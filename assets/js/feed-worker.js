@@ -0,0 +1,107 @@
+
+// Loads dashboard data off the main thread.
+// Reads data/dashboard/index.json, summary.json and rows-*.json pages as the table needs them;
+// falls back to parsing data/simpersona_actions.csv when a run predates the paged feed.
+
+const feed = {
+  base: "",
+  index: null,
+  offsets: [],   // first row number of each page
+  pages: new Map(), // file -> {rows, data: Promise<object[]>}
+  legacy: null,  // all rows, when there is no paged feed
+};
+
+function fetchJson(url, cache = "no-store") {
+  // Full pages never change, so only they may come from the HTTP cache
+  return fetch(url, {cache}).then(r => {
+    if (!r.ok) throw new Error(`${url}: ${r.status}`);
+    return r.json();
+  });
+}
+
+function toObjects(columns, rows) {
+  return rows.map(values => Object.fromEntries(columns.map((c, i) => [c, values[i]])));
+}
+
+function summarize(rows) {
+  // Same shape as summary.json, for the CSV fallback
+  const groups = {};
+  let successes = 0;
+  rows.forEach(r => {
+    const k = `${r.persona_label}\u0000${r.task_label}`;
+    const g = (groups[k] ||= {persona_label: r.persona_label, task_label: r.task_label, runs: 0, steps: 0, errors: 0, successes: 0});
+    g.runs += 1;
+    g.steps += Number(r.steps_count) || 0;
+    g.errors += Number(r.errors) || 0;
+    g.successes += Number(r.success) || 0;
+    successes += Number(r.success) || 0;
+  });
+  return {rows: rows.length, success_rate: rows.length ? successes / rows.length : null, groups: Object.values(groups)};
+}
+
+async function loadIndex(index) {
+  feed.index = index;
+  feed.offsets = [];
+  let offset = 0;
+  index.pages.forEach(p => {
+    feed.offsets.push(offset);
+    offset += p.rows;
+    // A page that grew since it was fetched (the last one during a run) is fetched again
+    const cached = feed.pages.get(p.file);
+    if (cached && cached.rows !== p.rows) feed.pages.delete(p.file);
+  });
+  const summary = await fetchJson(`${feed.base}dashboard/summary.json?v=${index.version}`);
+  postMessage({type: "summary", summary, rows: index.rows, status: index.status});
+}
+
+async function loadLegacy() {
+  importScripts("https://cdn.jsdelivr.net/npm/papaparse@5.4.1/papaparse.min.js");
+  const text = await fetch(`${feed.base}simpersona_actions.csv`).then(r => r.text());
+  const parsed = Papa.parse(text, {header: true, dynamicTyping: true});
+  feed.legacy = parsed.data.filter(r => r.persona_id); // drop trailing empty row
+  postMessage({type: "summary", summary: summarize(feed.legacy), rows: feed.legacy.length, status: "finished"});
+}
+
+function page(number) {
+  const p = feed.index.pages[number];
+  if (!feed.pages.has(p.file)) {
+    const data = fetchJson(`${feed.base}dashboard/${p.file}?rows=${p.rows}`, "default")
+      .then(json => toObjects(json.columns, json.rows));
+    feed.pages.set(p.file, {rows: p.rows, data});
+  }
+  return feed.pages.get(p.file).data;
+}
+
+async function rows(start, count) {
+  if (feed.legacy) return feed.legacy.slice(start, start + count);
+  if (!feed.index) return [];
+  const end = Math.min(start + count, feed.index.rows);
+  const out = [];
+  for (let n = 0; n < feed.index.pages.length; n++) {
+    const first = feed.offsets[n], last = first + feed.index.pages[n].rows;
+    if (last <= start || first >= end) continue;
+    const data = await page(n);
+    out.push(...data.slice(Math.max(0, start - first), end - first));
+  }
+  return out;
+}
+
+onmessage = async (e) => {
+  const msg = e.data;
+  try {
+    if (msg.type === "init") {
+      feed.base = msg.base;
+      try {
+        await loadIndex(await fetchJson(`${feed.base}dashboard/index.json`));
+      } catch (err) {
+        await loadLegacy();
+      }
+    } else if (msg.type === "index") {
+      await loadIndex(msg.index);
+    } else if (msg.type === "rows") {
+      postMessage({type: "rows", id: msg.id, start: msg.start, rows: await rows(msg.start, msg.count)});
+    }
+  } catch (err) {
+    postMessage({type: "error", message: String(err)});
+  }
+};
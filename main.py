@@ -1,71 +1,784 @@
 #!/usr/bin/env python3
-import json, csv, os, random, time
+from __future__ import annotations
+import argparse, array, asyncio, base64, collections, copy, hashlib, importlib, importlib.util, inspect, io, itertools, json, csv, os, platform, posixpath, random, re, sqlite3, sys, time, queue, threading, urllib.parse, zlib, multiprocessing.util
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, redirect_stdout
+from functools import lru_cache
+from html.parser import HTMLParser
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from datetime import datetime
+from types import SimpleNamespace
 from typing import Dict, List, Any
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
 import textwrap
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.chrome.options import Options
-
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+
+
+class _LazyImport:
+    """A module, or one attribute of it, imported on first use
+    
+    numpy, pandas, PIL, selenium and openai together take seconds to import;
+    deferring them keeps --help, config errors and stages that never touch
+    them fast.
+    """
+    
+    def __init__(self, module: str, attr: str = None):
+        self.__dict__.update(_module=module, _attr=attr, _target=None)
+    
+    def _load(self):
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            self.__dict__["_target"] = getattr(target, self._attr) if self._attr else target
+        return self._target
+    
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+    
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+
+np = _LazyImport("numpy")
+pd = _LazyImport("pandas")
+Image = _LazyImport("PIL.Image")
+ImageChops = _LazyImport("PIL.ImageChops")
+ImageDraw = _LazyImport("PIL.ImageDraw")
+ImageFont = _LazyImport("PIL.ImageFont")
+features = _LazyImport("PIL.features")
+webdriver = _LazyImport("selenium.webdriver")
+By = _LazyImport("selenium.webdriver.common.by", "By")
+Keys = _LazyImport("selenium.webdriver.common.keys", "Keys")
+WebDriverWait = _LazyImport("selenium.webdriver.support.ui", "WebDriverWait")
+EC = _LazyImport("selenium.webdriver.support.expected_conditions")
+Options = _LazyImport("selenium.webdriver.chrome.options", "Options")
+# Exception classes are looked up when an except clause runs, i.e. once selenium is loaded
+selenium_exceptions = _LazyImport("selenium.common.exceptions")
+
+OPENAI_AVAILABLE = all(importlib.util.find_spec(name) for name in ("openai", "httpx"))
+httpx = _LazyImport("httpx")
+openai = _LazyImport("openai")
+OpenAI = _LazyImport("openai", "OpenAI")
+AsyncOpenAI = _LazyImport("openai", "AsyncOpenAI")
+
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+pa = _LazyImport("pyarrow")
+pq = _LazyImport("pyarrow.parquet")
+
+XLSXWRITER_AVAILABLE = importlib.util.find_spec("xlsxwriter") is not None
+xlsxwriter = _LazyImport("xlsxwriter")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", " !!!key here!!! ")
+# Point at any OpenAI-compatible server (e.g. a local fake for testing)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 
-class ActionGenerator:
-    """Generates realistic action sequences using GPT-4"""
+def _extract_json(content: str) -> str:
+    """Strip markdown code fences from a model response"""
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+    return content
+
+
+def _loads_lenient(text: str) -> Any:
+    """json.loads that first repairs common LLM defects (smart quotes, trailing commas, bare keys, Python literals)"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    text = text.replace("\u201c", '"').replace("\u201d", '"')
+    text = re.sub(r",\s*([}\]])", r"\1", text)
+    text = re.sub(r'([{,]\s*)([A-Za-z_]\w*)\s*:', r'\1"\2":', text)
+    text = re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", re.sub(r"\bNone\b", "null", text)))
+    return json.loads(text)
+
+
+def _keyed_plans(content: str) -> Dict[str, List]:
+    """The {task: [actions]} object of a multi-task plan response ({} if there is none)"""
+    content = _extract_json(content)
+    start, end = content.find("{"), content.rfind("}")
+    try:
+        plans = _loads_lenient(content[start:end + 1]) if 0 <= start < end else {}
+    except json.JSONDecodeError:
+        return {}
+    return {task: plan for task, plan in plans.items() if isinstance(plan, list)} if isinstance(plans, dict) else {}
+
+ACTION_TYPES = ("look", "click", "type", "key", "wait", "error", "clear", "navigate")
+ACTION_ALIASES = {"read": "look", "scan": "look", "view": "look", "tap": "click", "press": "key", "input": "type",
+                  "fill": "type", "enter_text": "type", "pause": "wait", "sleep": "wait", "mistake": "error",
+                  "delete": "clear", "go_back": "navigate", "back": "navigate"}
+MAX_ACTION_DELAY = 30.0
+
+
+def _canonical_target(target: str, targets: List[str] = None) -> str:
+    """A spelling of target the TargetResolver understands (RULES plus the page's targets), or None"""
+    target = re.sub(r"[\s\-]+", "_", str(target).strip().lower())
+    names = {rule[0] for rule in TargetResolver.RULES} | {"page"} | set(targets or ())
+    if target in names or f"{target}_field" in names:
+        return target
+    if target.endswith("_field") and target[:-len("_field")] in names:
+        return target[:-len("_field")]
+    return None
+
+
+def validate_action(raw: Any, defects: Dict[str, int], targets: List[str] = None) -> Dict:
+    """Check one planned step against the action schema and repair what can be repaired
+    
+    Returns the normalised step, or None when it cannot be executed.
+    Every repair or rejection is counted in defects.
+    """
+    def defect(kind):
+        defects[kind] = defects.get(kind, 0) + 1
+    
+    if not isinstance(raw, dict):
+        defect("not_an_object")
+        return None
+    action = str(raw.get("action", "")).strip().lower()
+    if action not in ACTION_TYPES:
+        if action not in ACTION_ALIASES:
+            defect("unknown_action")
+            return None
+        action = ACTION_ALIASES[action]
+        defect("aliased_action")
+    
+    target = raw.get("target")
+    target = "" if target is None else str(target).strip()
+    if action == "key":
+        key = target.lower()
+        target = "enter" if key == "return" else key
+    elif action in ("look", "wait") and not target:
+        target = "page"
+    elif action in ("click", "type", "clear"):
+        canonical = _canonical_target(target, targets)
+        if canonical is None:
+            # Kept: a step at a target that is not on the page is a realistic miss
+            defect("unknown_target")
+        elif canonical != target:
+            defect("renamed_target")
+            target = canonical
+    
+    value = raw.get("value")
+    try:
+        delay = min(MAX_ACTION_DELAY, max(0.0, float(raw.get("delay") or 0)))
+    except (TypeError, ValueError):
+        defect("bad_delay")
+        delay = 0.0
+    return {"action": action, "target": target, "value": "" if value is None else str(value),
+            "notes": str(raw.get("notes") or ""), "delay": delay}
+
+
+class ActionStreamParser:
+    """Incremental parser for a JSON array of actions in a streamed completion
+    
+    feed() takes text as it arrives and returns every action whose object
+    has closed. The array is the first one inside a ```json fence or,
+    without a fence, the first "[" that opens an object; prose before it
+    is skipped and counted as a "preamble" defect. Each
+    object is parsed leniently and validated on its own, so one bad step
+    no longer loses the whole plan, and a truncated tail only loses the
+    step it cuts off.
+    """
+    
+    def __init__(self, targets: List[str] = None):
+        self.targets = targets
+        self.defects = {}
+        self._buffer = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+        self._started = False
+        self._finished = False
+    
+    def feed(self, text: str) -> List[Dict]:
+        """Consume more text; returns the actions completed by it"""
+        actions = []
+        if self._finished:
+            return actions
+        start = len(self._buffer)
+        self._buffer += text
+        buffer = self._buffer
+        
+        if not self._started:
+            bracket = self._array_start(buffer)
+            if bracket < 0:
+                return actions
+            if buffer[:bracket].replace("```json", "").strip():
+                self.defects["preamble"] = self.defects.get("preamble", 0) + 1
+            self._started = True
+            self._depth = 1
+            start = bracket + 1
+        
+        for pos in range(start, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 1 and char == "{":
+                    self._object_start = pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._object_start is not None:
+                    actions.extend(self._emit(buffer[self._object_start:pos + 1]))
+                    self._object_start = None
+                elif self._depth == 0:
+                    self._finished = True
+                    break
+        
+        # Keep only the unfinished object
+        keep = self._object_start if self._object_start is not None else len(buffer)
+        self._buffer = buffer[keep:]
+        if self._object_start is not None:
+            self._object_start = 0
+        return actions
+    
+    @staticmethod
+    def _array_start(buffer: str) -> int:
+        """Position of the plan's opening bracket, or -1 while it has not arrived"""
+        fence = buffer.find("```json")
+        if fence >= 0:
+            return buffer.find("[", fence)
+        # "[6 steps]" in prose is not the plan
+        match = re.search(r"\[\s*\{", buffer)
+        return match.start() if match else -1
+    
+    def close(self) -> List[Dict]:
+        """End of stream; records a truncated tail"""
+        if self._object_start is not None or (self._started and not self._finished):
+            self.defects["truncated"] = self.defects.get("truncated", 0) + 1
+        if not self._started:
+            self.defects["no_array"] = self.defects.get("no_array", 0) + 1
+        self._buffer = ""
+        return []
+    
+    def _emit(self, text: str) -> List[Dict]:
+        try:
+            raw = _loads_lenient(text)
+        except json.JSONDecodeError:
+            self.defects["unparseable"] = self.defects.get("unparseable", 0) + 1
+            return []
+        action = validate_action(raw, self.defects, self.targets)
+        return [action] if action else []
+
+
+class ActionStream:
+    """Validated actions of one plan, consumable while the completion is still streaming
+    
+    The producer calls feed() and finish(); the browser thread iterates.
+    `actions` keeps every step delivered so far.
+    """
+    
+    _END = object()
+    
+    def __init__(self, timeout: float = 300.0, targets: List[str] = None):
+        self.parser = ActionStreamParser(targets)
+        self.actions = []
+        self.error = None
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.first_action_latency = None
+        self._queue = queue.Queue()
+    
+    def feed(self, text: str):
+        """Add streamed text"""
+        for action in self.parser.feed(text):
+            if self.first_action_latency is None:
+                self.first_action_latency = time.monotonic() - self.started
+            self.actions.append(action)
+            self._queue.put(action)
+    
+    def finish(self, error: Exception = None):
+        """Mark the stream complete, or failed with error"""
+        self.parser.close()
+        self.error = error
+        self._queue.put(self._END)
+    
+    def __iter__(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No streamed action for {self.timeout:.0f}s")
+            if item is self._END:
+                if self.error:
+                    raise self.error
+                return
+            yield item
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a request has no cached response"""
+
+
+class ResponseCache:
+    """Content-addressed SQLite cache for chat completion responses
+    
+    Keys are a SHA-256 of model, messages, temperature and max_tokens,
+    plus seed when the request sets one.
+    In "replay" mode only cached responses are served and misses raise
+    CacheMissError, so regression runs never touch the network.
+    """
+    
+    def __init__(self, path: str, mode: str = "readwrite", max_bytes: int = 256 * 1024 * 1024,
+                 max_age: float = 30 * 24 * 3600):
+        if mode not in ("readwrite", "replay"):
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            request TEXT,
+            content TEXT,
+            size INTEGER,
+            created REAL,
+            accessed REAL
+        )""")
+        self._db.commit()
+        if mode == "readwrite":
+            self.evict()
+    
+    @staticmethod
+    def make_key(request: Dict) -> str:
+        """Hash the parts of a request that determine the response"""
+        material = {k: request.get(k) for k in ("model", "messages", "temperature", "max_tokens")}
+        if request.get("seed") is not None:
+            # Unseeded requests keep their earlier keys
+            material["seed"] = request["seed"]
+        return hashlib.sha256(json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    
+    def get(self, request: Dict):
+        """Cached response content, or None"""
+        key = self.make_key(request)
+        with self._lock:
+            row = self._db.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.stats["hits"] += 1
+                if self.mode == "readwrite":
+                    self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                return row[0]
+            self.stats["misses"] += 1
+        if self.mode == "replay":
+            raise CacheMissError(f"No cached response for request {key[:12]} (replay mode)")
+        return None
+    
+    def put(self, request: Dict, content: str):
+        """Store a response"""
+        if self.mode == "replay":
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(request), request.get("model"), json.dumps(request, ensure_ascii=False),
+                 content, len(content.encode("utf-8")), now, now)
+            )
+            self._db.commit()
+            self.stats["writes"] += 1
     
-    def __init__(self, api_key):
+    def entries(self):
+        """Every cached (request, content) pair"""
+        with self._lock:
+            rows = self._db.execute("SELECT request, content FROM responses").fetchall()
+        for request, content in rows:
+            yield json.loads(request), content
+    
+    def evict(self):
+        """Drop entries older than max_age, then least recently used until under max_bytes"""
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            evicted = cursor.rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+            self._db.commit()
+            self.stats["evicted"] += evicted
+    
+    def report(self):
+        """Print hit/miss counts"""
+        print(f"\n   [CACHE] {self.stats['hits']} hits, {self.stats['misses']} misses, "
+              f"{self.stats['writes']} writes, {self.stats['evicted']} evicted ({self.mode})")
+    
+    def close(self):
+        """Evict and close the database"""
+        if self.mode == "readwrite":
+            self.evict()
+        self._db.close()
+
+
+class _NullSpan:
+    """Shared do-nothing span returned while tracing is off"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def set(self, **args):
+        pass
+
+
+class _Span:
+    """One timed region; records a Chrome trace event on exit"""
+    
+    __slots__ = ("tracer", "name", "cat", "args", "overlapping", "start")
+    
+    def __init__(self, tracer, name, cat, args, overlapping):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.overlapping = overlapping
+    
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.cat, self.start, time.perf_counter_ns() - self.start,
+                           self.args, self.overlapping)
+        return False
+    
+    def set(self, **args):
+        """Attach more arguments to the event"""
+        self.args.update(args)
+
+
+class Tracer:
+    """Span timer for the pipeline's hot paths
+    
+    Spans are Chrome trace "complete" events (chrome://tracing, Perfetto).
+    While disabled, span() returns a shared no-op object, so instrumented
+    code pays for one attribute check. Spans that overlap on one thread
+    (async LLM calls on the event loop) are recorded as async events.
+    """
+    
+    _NULL = _NullSpan()
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.events = []
+        self._threads = set()
+        self._async_ids = itertools.count(1)
+    
+    def enable(self):
+        self.enabled = True
+    
+    def span(self, name: str, cat: str = "pipeline", overlapping: bool = False, **args):
+        """Context manager timing one region"""
+        if not self.enabled:
+            return self._NULL
+        return _Span(self, name, cat, args, overlapping)
+    
+    def record(self, name: str, cat: str, start_ns: int, duration_ns: int, args: Dict = None, overlapping: bool = False):
+        """Add a finished span (list.append is atomic, so no lock is needed)"""
+        pid, tid = os.getpid(), threading.get_ident()
+        if (pid, tid) not in self._threads:
+            self._threads.add((pid, tid))
+            self.events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                                "args": {"name": threading.current_thread().name}})
+        event = {"name": name, "cat": cat, "ts": start_ns / 1000, "pid": pid, "tid": tid, "args": args or {}}
+        if overlapping:
+            event_id = next(self._async_ids)
+            self.events.append(dict(event, ph="b", id=event_id))
+            self.events.append({"name": name, "cat": cat, "ph": "e", "id": event_id, "ts": (start_ns + duration_ns) / 1000,
+                                "pid": pid, "tid": tid})
+        else:
+            self.events.append(dict(event, ph="X", dur=duration_ns / 1000))
+    
+    def drain(self) -> List[Dict]:
+        """Take the recorded events (used to ship a worker process's spans back)"""
+        events, self.events = self.events, []
+        self._threads = set()
+        return events
+    
+    def extend(self, events: List[Dict]):
+        """Merge events recorded elsewhere"""
+        self.events.extend(events)
+    
+    def durations(self) -> pd.DataFrame:
+        """One row per span: name, category, duration in seconds"""
+        rows = [(e["name"], e["cat"], e["dur"] / 1e6) for e in self.events if e["ph"] == "X"]
+        opened = {}
+        for e in self.events:
+            if e["ph"] == "b":
+                opened[e["id"]] = e
+            elif e["ph"] == "e" and e["id"] in opened:
+                begin = opened.pop(e["id"])
+                rows.append((begin["name"], begin["cat"], (e["ts"] - begin["ts"]) / 1e6))
+        return pd.DataFrame(rows, columns=["span", "category", "seconds"])
+    
+    def summary(self) -> pd.DataFrame:
+        """Count, total, mean, p95 and max time per span name, largest total first"""
+        frame = self.durations()
+        if frame.empty:
+            return frame
+        table = frame.groupby(["category", "span"])["seconds"].agg(
+            count="count", total="sum", mean="mean", p95=lambda x: x.quantile(0.95), max="max")
+        return table.sort_values("total", ascending=False).reset_index()
+    
+    def export(self, path: str):
+        """Write a Chrome trace JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+TRACER = Tracer()
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for budgeting prompts"""
+    return len(text) // 4 + 1
+
+
+def _record_usage(usage: Dict, response_usage):
+    """Copy a response's token counts into usage; cached_tokens is the provider-cached prompt prefix"""
+    if usage is None or response_usage is None:
+        return
+    details = getattr(response_usage, "prompt_tokens_details", None)
+    usage["prompt_tokens"] = getattr(response_usage, "prompt_tokens", 0) or 0
+    usage["completion_tokens"] = getattr(response_usage, "completion_tokens", 0) or 0
+    usage["cached_tokens"] = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+
+def _chat_completion(client, cache: ResponseCache, request: Dict, usage: Dict = None) -> str:
+    """Blocking chat completion, served from the cache when possible
+    
+    usage, when given, receives the call's token counts (left empty on a cache hit).
+    """
+    with TRACER.span("llm_completion", "llm", model=request.get("model")) as span:
+        content = cache.get(request) if cache else None
+        span.set(cached=content is not None)
+        if content is None:
+            response = client.chat.completions.create(**request)
+            content = response.choices[0].message.content
+            _record_usage(usage, getattr(response, "usage", None))
+            if cache:
+                cache.put(request, content)
+    return content
+
+
+async def _achat_completion(async_client: "AsyncLLMClient", cache: ResponseCache, request: Dict,
+                            usage: Dict = None) -> str:
+    """Async chat completion, served from the cache when possible
+    
+    The SQLite cache blocks, so its reads and writes run off the event loop.
+    """
+    with TRACER.span("llm_completion", "llm", overlapping=True, model=request.get("model")) as span:
+        content = await asyncio.to_thread(cache.get, request) if cache else None
+        span.set(cached=content is not None)
+        if content is None:
+            content = await async_client.complete(**request, usage=usage)
+            if cache:
+                await asyncio.to_thread(cache.put, request, content)
+    return content
+
+
+class TokenBucket:
+    """Asyncio token-bucket rate limiter"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncLLMClient:
+    """Concurrent chat completions over one shared connection pool
+    
+    Runs its own event loop in a background thread so synchronous code can
+    submit requests and get concurrent.futures.Future objects back.
+    """
+    
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    
+    def __init__(self, api_key, base_url=None, max_concurrency=8, requests_per_second=5.0,
+                 burst=10, max_retries=5, backoff=1.0, timeout=60.0):
         if not OPENAI_AVAILABLE:
             raise ImportError("OpenAI library not installed. Run: pip install openai")
-        if not api_key or api_key == "your-api-key-here":
-            raise ValueError("Valid OpenAI API key required")
-        
-        self.client = OpenAI(api_key=api_key)
-        print("[OK] GPT-4 Action Generator ACTIVE")
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._loop = None
+        self._thread = None
     
-    def generate_actions(self, persona: Dict, task: str, task_description: str) -> List[Dict]:
-        """Generate action sequence for persona performing task"""
+    def start(self):
+        """Start the event loop thread and open the connection pool"""
+        if self._loop:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-loop", daemon=True)
+        self._thread.start()
+        self.run_coroutine(self._open()).result()
+    
+    async def _open(self):
+        """Create loop-bound resources"""
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency),
+            timeout=self.timeout
+        )
+        self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                  http_client=self.http_client, max_retries=0)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.bucket = TokenBucket(self.requests_per_second, self.burst)
+    
+    def run_coroutine(self, coro):
+        """Schedule a coroutine on the client loop"""
+        if not self._loop:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+    
+    async def complete(self, messages: List[Dict], model="gpt-4", temperature=0.7, max_tokens=500,
+                       usage: Dict = None, seed: int = None) -> str:
+        """Chat completion with rate limiting and exponential backoff on 429/5xx; token counts go into usage"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            async with self.semaphore:
+                self.stats["requests"] += 1
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **({"seed": seed} if seed is not None else {})
+                    )
+                    _record_usage(usage, response.usage)
+                    return response.choices[0].message.content
+                except (openai.APIStatusError, openai.APIConnectionError) as e:
+                    error = e
+            await self._backoff(error, attempt)
+    
+    async def stream(self, messages: List[Dict], model="gpt-4", temperature=0.7, max_tokens=500, usage: Dict = None,
+                     seed: int = None):
+        """Streaming chat completion; yields content deltas and fills usage from the final chunk
         
-        print(f"      [GPT] Generating actions for {persona['label']} on {task}...")
+        Failures are retried like complete() until the first delta arrives;
+        after that they propagate, since the caller has already used the text.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            received = False
+            async with self.semaphore:
+                self.stats["requests"] += 1
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **({"seed": seed} if seed is not None else {})
+                    )
+                    async for chunk in response:
+                        _record_usage(usage, getattr(chunk, "usage", None))
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            received = True
+                            yield delta
+                    return
+                except (openai.APIStatusError, openai.APIConnectionError) as e:
+                    if received:
+                        self.stats["failures"] += 1
+                        raise
+                    error = e
+            await self._backoff(error, attempt)
+    
+    async def _backoff(self, error: Exception, attempt: int):
+        """Sleep before the next attempt, or raise when the error is final"""
+        retry_after = None
+        retryable = True
+        if isinstance(error, openai.APIStatusError):
+            retryable = error.status_code in self.RETRY_STATUS
+            retry_after = error.response.headers.get("retry-after")
+        if not retryable or attempt == self.max_retries:
+            self.stats["failures"] += 1
+            raise error
         
-        prompt = f"""You are simulating a {persona['label']} interacting with a {task_description}.
+        self.stats["retries"] += 1
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+        await asyncio.sleep(delay)
+    
+    def close(self):
+        """Close the connection pool and stop the loop"""
+        if not self._loop:
+            return
+        self.run_coroutine(self.http_client.aclose()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
 
-PERSONA PROFILE:
-- Type: {persona['type']}
-- Behavior: {persona['behavior']['description']}
-- Goals: {', '.join(persona['behavior']['goals'][:3])}
-- Frustrations: {', '.join(persona['behavior']['frustrations'][:3])}
-- Tech Comfort: {persona['demographics']['tech_comfort']}
 
-TASK: {task_description}
+# Static head of every plan request. It is identical for all cells and sent
+# first, so the provider can cache it and only the persona/task tail varies.
+ACTION_PROMPT_PREFIX = """You generate realistic user interaction sequences with errors. Return only valid JSON.
 
-Generate a realistic sequence of actions this user would take, INCLUDING realistic mistakes based on their behavior type:
+Each sequence shows how one user type works through a web form, INCLUDING realistic mistakes based on their behavior type:
 - Novice: might click wrong things, type slowly, re-read instructions, make typos, click wrong fields
 - Expert: fast, uses keyboard shortcuts, might skip reading, minimal errors
 - Distracted: pauses, loses focus, goes back to check, interruptions, forgets steps
 - Accessibility: uses tab navigation, relies on keyboard, slower but methodical, may struggle with poorly labeled elements
 
-Return ONLY a JSON array of 6-15 actions in this format:
+A sequence is a JSON array of 6-15 actions in this format:
 [
-  {{"action": "look", "target": "page", "value": "", "notes": "Reading page carefully", "delay": 2.0}},
-  {{"action": "click", "target": "username_field", "value": "", "notes": "Clicked username", "delay": 0.5}},
-  {{"action": "type", "target": "username", "value": "truman123", "notes": "Typing username", "delay": 0.0}},
-  {{"action": "error", "target": "username", "value": "", "notes": "Made a typo", "delay": 0.5}},
-  {{"action": "clear", "target": "username", "value": "", "notes": "Fixing mistake", "delay": 0.3}},
-  {{"action": "type", "target": "username", "value": "truman123", "notes": "Retyped correctly", "delay": 0.0}}
+  {"action": "look", "target": "page", "value": "", "notes": "Reading page carefully", "delay": 2.0},
+  {"action": "click", "target": "username_field", "value": "", "notes": "Clicked username", "delay": 0.5},
+  {"action": "type", "target": "username", "value": "truman123", "notes": "Typing username", "delay": 0.0},
+  {"action": "error", "target": "username", "value": "", "notes": "Made a typo", "delay": 0.5},
+  {"action": "clear", "target": "username", "value": "", "notes": "Fixing mistake", "delay": 0.3},
+  {"action": "type", "target": "username", "value": "truman123", "notes": "Retyped correctly", "delay": 0.0}
 ]
 
 Action types: look, click, type, key (tab/enter), wait, error, clear, navigate
-Valid targets: page, username_field, password_field, username, password, button, name_field, address_field, signup_link
+Use only the valid targets listed for the task.
 Delays in seconds (float).
 
 Include realistic errors:
@@ -74,97 +787,861 @@ Include realistic errors:
 - Distracted: 2-3 errors (losing focus, forgetting steps, having to backtrack)
 - Accessibility: 1-2 errors (tab navigation confusion, unclear labels)"""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You generate realistic user interaction sequences with errors. Return only valid JSON arrays."},
+
+def _chain(source: Future, target: Future, transform=None):
+    """Settle target with source's outcome, optionally transformed"""
+    def done(future):
+        try:
+            result = future.result()
+            target.set_result(transform(result) if transform else result)
+        except Exception as e:
+            target.set_exception(e)
+    source.add_done_callback(done)
+
+
+class ActionGenerator:
+    """Generates realistic action sequences using GPT-4
+    
+    Requests share one static system prompt (ACTION_PROMPT_PREFIX); only the
+    persona and task lines differ. With tasks_per_call > 1, a persona's
+    tasks are planned together in one call that returns a plan per task
+    key, split by group_tasks() to fit the model's context window. A cell's
+    seed goes into its request, so repetitions of a cell get their own
+    completion and cache entry. Token counts are kept per cell (pop_usage)
+    and in usage_totals.
+    """
+    
+    # Offered when a task has no interface descriptor
+    DEFAULT_TARGETS = ["page", "username_field", "password_field", "username", "password", "button", "name_field",
+                       "address_field", "signup_link"]
+    # Completion budget per plan, and the context window it must fit in with the prompt (gpt-4)
+    PLAN_TOKENS = 1000
+    CONTEXT_TOKENS = 8192
+    
+    def __init__(self, api_key, base_url=None, async_client: AsyncLLMClient = None, cache: ResponseCache = None,
+                 client=None, interfaces: Dict[str, Dict] = None, tasks_per_call: int = 1):
+        if client is None:
+            if not OPENAI_AVAILABLE:
+                raise ImportError("OpenAI library not installed. Run: pip install openai")
+            if not api_key or api_key == "your-api-key-here":
+                raise ValueError("Valid OpenAI API key required")
+            client = OpenAI(api_key=api_key, base_url=base_url)
+        
+        # Any object with the OpenAI chat.completions.create interface (e.g. FakeChatClient)
+        self.client = client
+        self.async_client = async_client
+        self.cache = cache
+        # InterfaceRegistry descriptors by task; their targets go into the prompt and the plan check
+        self.interfaces = interfaces or {}
+        self.tasks_per_call = max(1, tasks_per_call)
+        self.usage_totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        self._cell_usage = {}
+        self._groups = {}
+        self._lock = threading.Lock()
+        print("[OK] GPT-4 Action Generator ACTIVE")
+    
+    def _targets(self, task: str) -> List[str]:
+        interface = self.interfaces.get(task)
+        return interface["targets"] if interface else None
+    
+    @staticmethod
+    def _persona_block(persona: Dict) -> str:
+        return f"""PERSONA PROFILE:
+- Type: {persona['type']}
+- Behavior: {persona['behavior']['description']}
+- Goals: {', '.join(persona['behavior']['goals'][:3])}
+- Frustrations: {', '.join(persona['behavior']['frustrations'][:3])}
+- Tech Comfort: {persona['demographics']['tech_comfort']}"""
+    
+    def _request(self, prompt: str, plans: int = 1, seed: int = None) -> Dict:
+        request = {
+            "model": "gpt-4",
+            "messages": [
+                {"role": "system", "content": ACTION_PROMPT_PREFIX},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.9,
-            max_tokens=1000
-        )
-        
-        content = response.choices[0].message.content
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-        
-        actions = json.loads(content)
-        error_count = len([a for a in actions if a.get('action') == 'error'])
-        print(f"         -> Generated {len(actions)} actions, {error_count} errors (GPT)")
-        return actions
+            "temperature": 0.9,
+            "max_tokens": self.PLAN_TOKENS * plans
+        }
+        if seed is not None:
+            # Part of the cache key as well as the provider's sampling seed
+            request["seed"] = seed
+        return request
+    
+    def _build_request(self, persona: Dict, task_description: str, task: str = None, seed: int = None) -> Dict:
+        """Build the chat completion request for one persona/task cell"""
+        targets = self._targets(task) or self.DEFAULT_TARGETS
+        prompt = f"""You are simulating a {persona['label']} interacting with a {task_description}.
 
+{self._persona_block(persona)}
 
-class PersonaGenerator:
-    """Generates detailed persona profiles using GPT-4"""
+TASK: {task_description}
+Valid targets: {', '.join(targets)}
+
+Return ONLY the JSON array of actions."""
+        return self._request(prompt, seed=seed)
     
-    def __init__(self, api_key):
-        if not OPENAI_AVAILABLE:
-            raise ImportError("OpenAI library not installed. Run: pip install openai")
-        if not api_key or api_key == "your-api-key-here":
-            raise ValueError("Valid OpenAI API key required")
+    def _build_group_request(self, persona: Dict, group: List[tuple]) -> Dict:
+        """Build one request that plans several (task, task_description[, seed]) cells of a persona"""
+        tasks = "\n".join(f"- {task}: {description}\n  Valid targets: {', '.join(self._targets(task) or self.DEFAULT_TARGETS)}"
+                          for task, description, *_ in group)
+        prompt = f"""You are simulating a {persona['label']} completing several web forms, one after another.
+
+{self._persona_block(persona)}
+
+TASKS:
+{tasks}
+
+Return ONLY a JSON object with one key per task ({', '.join(f'"{task}"' for task, *_ in group)}), each holding that task's JSON array of actions."""
+        # The call's seed follows from its cells' seeds
+        seeds = [cell[2] for cell in group if len(cell) > 2]
+        return self._request(prompt, plans=len(group), seed=int(_content_hash(*seeds)[:8], 16) if seeds else None)
+    
+    def group_tasks(self, persona: Dict, cells: List[tuple]) -> List[List[tuple]]:
+        """Split a persona's (task, task_description[, seed]) cells into calls of at most tasks_per_call
+        tasks whose prompt and completion budget fit CONTEXT_TOKENS"""
+        groups, current = [], []
+        for cell in cells:
+            candidate = current + [cell]
+            request = self._build_group_request(persona, candidate)
+            needed = sum(_estimate_tokens(m["content"]) for m in request["messages"]) + request["max_tokens"]
+            if current and (len(candidate) > self.tasks_per_call or needed > self.CONTEXT_TOKENS):
+                groups.append(current)
+                candidate = [cell]
+            current = candidate
+        return groups + [current] if current else groups
+    
+    def _track(self, persona: Dict, tasks: List[str], usage: Dict, shares: List[float] = None,
+               seeds: List[int] = None):
+        """Record a call's tokens, split over the cells it planned (completion by each plan's share)"""
+        shares = shares or [1.0 / len(tasks)] * len(tasks)
+        seeds = seeds or [None] * len(tasks)
+        with self._lock:
+            if usage:
+                self.usage_totals["calls"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                self.usage_totals[key] += usage.get(key, 0)
+            for task, share, seed in zip(tasks, shares, seeds):
+                cell = {key: round(usage.get(key, 0) * (share if key == "completion_tokens" else 1.0 / len(tasks)))
+                        for key in ("prompt_tokens", "completion_tokens", "cached_tokens")}
+                self._cell_usage.setdefault((persona["id"], task, seed), []).append(cell)
+    
+    def pop_usage(self, persona: Dict, task: str, seed: int = None) -> Dict:
+        """Tokens spent planning this cell since the last pop (zeros for cached responses)"""
+        with self._lock:
+            calls = self._cell_usage.pop((persona["id"], task, seed), [])
+        return {key: sum(call[key] for call in calls) for key in ("prompt_tokens", "completion_tokens", "cached_tokens")}
+    
+    def report_usage(self):
+        """Print token totals"""
+        totals = self.usage_totals
+        if not totals["calls"]:
+            return
+        print(f"\n   [TOKENS] {totals['calls']} plan calls: {totals['prompt_tokens']} prompt "
+              f"({totals['cached_tokens']} from the provider's prefix cache), {totals['completion_tokens']} completion")
+    
+    def _parse_actions(self, content: str, task: str = None) -> List[Dict]:
+        """Parse and validate the model response into an action list"""
+        with TRACER.span("parse_plan", "generator"):
+            parser = ActionStreamParser(self._targets(task))
+            actions = parser.feed(content) + parser.close()
+        if not actions:
+            raise ValueError(f"No valid actions in response ({', '.join(parser.defects) or 'empty'})")
+        error_count = len([a for a in actions if a.get('action') == 'error'])
+        repaired = f", {sum(parser.defects.values())} defects repaired or dropped" if parser.defects else ""
+        print(f"         -> Generated {len(actions)} actions, {error_count} errors (GPT){repaired}")
+        return actions
+    
+    def _parse_group(self, content: str, group: List[tuple]) -> Dict[str, List[Dict]]:
+        """Validated plans by task from a keyed response; tasks without a usable plan are left out"""
+        with TRACER.span("parse_plan", "generator", tasks=len(group)):
+            raw = _keyed_plans(content)
+            plans, defects = {}, {}
+            for task, *_ in group:
+                actions = [action for action in (validate_action(step, defects, self._targets(task))
+                                                 for step in raw.get(task) or []) if action]
+                if actions:
+                    plans[task] = actions
+        repaired = f", {sum(defects.values())} defects repaired or dropped" if defects else ""
+        print(f"         -> Generated {len(plans)}/{len(group)} plans in one call, "
+              f"{sum(len(plan) for plan in plans.values())} actions (GPT){repaired}")
+        return plans
+    
+    def _plan_shares(self, plans: Dict[str, List[Dict]], group: List[tuple]) -> List[float]:
+        sizes = [len(json.dumps(plans.get(task, []))) for task, *_ in group]
+        return [size / sum(sizes) for size in sizes] if sum(sizes) else None
+    
+    def _generate_group(self, persona: Dict, group: List[tuple]) -> Dict[str, List[Dict]]:
+        usage = {}
+        print(f"      [GPT] Generating actions for {persona['label']} on {', '.join(task for task, *_ in group)}...")
+        content = _chat_completion(self.client, self.cache, self._build_group_request(persona, group), usage)
+        plans = self._parse_group(content, group)
+        self._track(persona, [cell[0] for cell in group], usage, self._plan_shares(plans, group),
+                    [cell[2] if len(cell) > 2 else None for cell in group])
+        return plans
+    
+    async def _agenerate_group(self, persona: Dict, group: List[tuple]) -> Dict[str, List[Dict]]:
+        usage = {}
+        print(f"      [GPT] Generating actions for {persona['label']} on {', '.join(task for task, *_ in group)}...")
+        content = await _achat_completion(self.async_client, self.cache, self._build_group_request(persona, group), usage)
+        plans = self._parse_group(content, group)
+        self._track(persona, [cell[0] for cell in group], usage, self._plan_shares(plans, group),
+                    [cell[2] if len(cell) > 2 else None for cell in group])
+        return plans
+    
+    def _group_future(self, persona: Dict, group: List[tuple]) -> Future:
+        """Plans for the group; the first of its cells to ask sends the call, the others share it
         
-        self.client = OpenAI(api_key=api_key)
-        print("[OK] GPT-4 Persona Generator ACTIVE")
+        Cells carry their seeds, so each repetition of a group is a call of its own.
+        """
+        key = (persona["id"], tuple((task, *seed) for task, _, *seed in group))
+        with self._lock:
+            entry = self._groups.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._groups[key] = [Future(), len(group)]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._groups[key]
+        future = entry[0]
+        if owner:
+            if self.async_client:
+                _chain(self.async_client.run_coroutine(self._agenerate_group(persona, group)), future)
+            else:
+                try:
+                    future.set_result(self._generate_group(persona, group))
+                except Exception as e:
+                    future.set_exception(e)
+        return future
+    
+    def _plan_from_group(self, persona: Dict, task: str, task_description: str, group: List[tuple],
+                         seed: int = None) -> Future:
+        """Future of this cell's plan out of its group call, falling back to a single-task call"""
+        plan = Future()
+        
+        def pick(done):
+            try:
+                plans = done.result()
+            except Exception:
+                plans = {}
+            if task in plans:
+                plan.set_result(plans[task])
+            elif self.async_client:
+                # Not blocking here: this may run on the client's event loop
+                _chain(self.submit_actions(persona, task, task_description, seed=seed), plan)
+            else:
+                try:
+                    plan.set_result(self.generate_actions(persona, task, task_description, seed=seed))
+                except Exception as e:
+                    plan.set_exception(e)
+        
+        self._group_future(persona, group).add_done_callback(pick)
+        return plan
     
-    def generate_persona(self, persona_type: str) -> Dict[str, Any]:
-        """Generate complete persona profile using GPT-4"""
+    def generate_actions(self, persona: Dict, task: str, task_description: str, group: List[tuple] = None,
+                         seed: int = None) -> List[Dict]:
+        """Generate action sequence for persona performing task (planned with its group, if any)"""
+        if group and len(group) > 1:
+            return self._plan_from_group(persona, task, task_description, group, seed).result()
         
-        print(f"   [GPT] Generating {persona_type} persona...")
+        print(f"      [GPT] Generating actions for {persona['label']} on {task}...")
+        usage = {}
+        content = _chat_completion(self.client, self.cache, self._build_request(persona, task_description, task, seed),
+                                   usage)
+        self._track(persona, [task], usage, seeds=[seed])
+        return self._parse_actions(content, task)
+    
+    async def agenerate_actions(self, persona: Dict, task: str, task_description: str, seed: int = None) -> List[Dict]:
+        """Generate action sequence through the async client"""
+        print(f"      [GPT] Generating actions for {persona['label']} on {task}...")
+        usage = {}
+        content = await _achat_completion(self.async_client, self.cache,
+                                          self._build_request(persona, task_description, task, seed), usage)
+        self._track(persona, [task], usage, seeds=[seed])
+        return self._parse_actions(content, task)
+    
+    def submit_actions(self, persona: Dict, task: str, task_description: str, group: List[tuple] = None,
+                       seed: int = None):
+        """Start generating an action plan; returns a concurrent.futures.Future"""
+        if group and len(group) > 1:
+            return self._plan_from_group(persona, task, task_description, group, seed)
+        return self.async_client.run_coroutine(self.agenerate_actions(persona, task, task_description, seed))
+    
+    def stream_actions(self, persona: Dict, task: str, task_description: str, group: List[tuple] = None,
+                       seed: int = None) -> ActionStream:
+        """Start a streamed plan; its leading actions can run before the completion ends
         
-        persona_desc = {
-            "novice": "new to interfaces, explores randomly, makes mistakes, reads everything carefully",
-            "expert": "experienced user, uses shortcuts, efficient, fast navigator",
-            "distracted": "multitasking user, forgets tasks, gets interrupted, loses focus",
-            "accessibility-focused": "requires accessible interactions, uses assistive tech, keyboard navigation"
-        }
+        Grouped cells are not streamed: their plan arrives whole once the group call is parsed.
+        """
+        stream = ActionStream(targets=self._targets(task))
+        if group and len(group) > 1:
+            def deliver(done):
+                try:
+                    stream.feed(json.dumps(done.result()))
+                    stream.finish()
+                except Exception as e:
+                    stream.finish(e)
+            def start():
+                self._plan_from_group(persona, task, task_description, group, seed).add_done_callback(deliver)
+            if self.async_client:
+                start()
+            else:
+                # The blocking group call must not run on the caller's (the scheduler's) thread
+                threading.Thread(target=start, daemon=True).start()
+            return stream
         
-        prompt = f"""Create a realistic {persona_type} user persona for HCI research.
+        print(f"      [GPT] Streaming actions for {persona['label']} on {task}...")
+        request = self._build_request(persona, task_description, task, seed)
+        try:
+            content = self.cache.get(request) if self.cache else None
+        except CacheMissError as e:
+            stream.finish(e)
+            return stream
+        if content is not None:
+            self._track(persona, [task], {}, seeds=[seed])
+            stream.feed(content)
+            stream.finish()
+        elif self.async_client:
+            self.async_client.run_coroutine(self._astream_into(stream, request, persona, task, seed))
+        else:
+            threading.Thread(target=self._stream_into, args=(stream, request, persona, task, seed), daemon=True).start()
+        return stream
+    
+    async def _astream_into(self, stream: ActionStream, request: Dict, persona: Dict, task: str, seed: int = None):
+        """Feed a stream from the async client"""
+        parts = []
+        usage = {}
+        with TRACER.span("llm_stream", "llm", overlapping=True, model=request.get("model")):
+            try:
+                async for delta in self.async_client.stream(**request, usage=usage):
+                    parts.append(delta)
+                    stream.feed(delta)
+            except Exception as e:
+                stream.finish(e)
+                return
+        self._track(persona, [task], usage, seeds=[seed])
+        # Writes to the SQLite cache; keep it off the event loop
+        await asyncio.to_thread(self._finish_stream, stream, request, "".join(parts))
+    
+    def _stream_into(self, stream: ActionStream, request: Dict, persona: Dict, task: str, seed: int = None):
+        """Feed a stream from the blocking client (runs on its own thread)"""
+        parts = []
+        usage = {}
+        with TRACER.span("llm_stream", "llm", model=request.get("model")):
+            try:
+                for chunk in self.client.chat.completions.create(**request, stream=True,
+                                                                 stream_options={"include_usage": True}):
+                    _record_usage(usage, getattr(chunk, "usage", None))
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        stream.feed(delta)
+            except Exception as e:
+                stream.finish(e)
+                return
+        self._track(persona, [task], usage, seeds=[seed])
+        self._finish_stream(stream, request, "".join(parts))
 
-Persona type: {persona_desc[persona_type]}
+    def _finish_stream(self, stream: ActionStream, request: Dict, content: str):
+        """Close a finished stream and cache its completion"""
+        stream.finish(None if stream.actions else ValueError("No valid actions in response"))
+        if self.cache and stream.actions:
+            self.cache.put(request, content)
+        defects = stream.parser.defects
+        repaired = f", {sum(defects.values())} defects repaired or dropped" if defects else ""
+        print(f"         -> Streamed {len(stream.actions)} actions, first after "
+              f"{stream.first_action_latency or 0:.2f}s (GPT){repaired}")
 
-Return ONLY valid JSON in this exact format:
-{{
-  "age": [18-65],
-  "gender": "[male/female/non-binary]",
-  "location": "[country]",
-  "occupation": "[specific job title]",
-  "tech_experience": "[Low/Medium/High]",
-  "description": "[2-3 sentences describing behavior patterns and how they interact with interfaces]",
-  "goals": ["specific goal 1", "specific goal 2", "specific goal 3"],
-  "frustrations": ["specific frustration 1", "specific frustration 2", "specific frustration 3"],
-  "preferred_actions": ["specific action 1", "specific action 2", "specific action 3"]
-}}
 
-Make it realistic, diverse, and detailed. Base goals/frustrations on the persona type."""
+# Per-type knobs for the local planner: per-field probabilities and base delays (seconds)
+MARKOV_PROFILES = {
+    "novice": {"look": 0.6, "tab": 0.1, "error": 0.35, "wrong_click": 0.15, "wait": 0.1, "slow_typing": 0.5,
+               "delays": {"look": 2.0, "click": 0.8, "type": 0.0, "key": 0.5, "wait": 2.0, "error": 0.8, "clear": 0.5}},
+    "expert": {"look": 0.1, "tab": 0.6, "error": 0.05, "wrong_click": 0.02, "wait": 0.0, "slow_typing": 0.0,
+               "delays": {"look": 0.5, "click": 0.2, "type": 0.0, "key": 0.1, "wait": 0.5, "error": 0.3, "clear": 0.2}},
+    "distracted": {"look": 0.3, "tab": 0.1, "error": 0.3, "wrong_click": 0.1, "wait": 0.4, "slow_typing": 0.1,
+                   "delays": {"look": 1.0, "click": 0.6, "type": 0.0, "key": 0.4, "wait": 3.0, "error": 0.6, "clear": 0.4}},
+    "accessibility-focused": {"look": 0.3, "tab": 0.9, "error": 0.2, "wrong_click": 0.05, "wait": 0.1, "slow_typing": 0.3,
+                              "delays": {"look": 1.5, "click": 0.8, "type": 0.0, "key": 0.8, "wait": 1.5, "error": 0.8, "clear": 0.5}},
+}
 
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You create realistic HCI personas. Return only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8,
-            max_tokens=500
-        )
+# Form fields the local planner recognises in a task description, with the value it types
+TASK_FIELDS = [
+    (r"\busername\b", "username", "truman123"),
+    (r"\bpassword\b", "password", "Seahaven#1998"),
+    (r"\be-?mail\b", "email", "truman@example.com"),
+    (r"\bname\b", "name", "Truman Burbank"),
+    (r"\baddress\b", "address", "42 Lancaster Square"),
+    (r"\bcity\b", "city", "Seahaven"),
+    (r"\bstate\b", "state", "FL"),
+    (r"\b(?:zip|postal)\b", "zip", "32459"),
+    (r"\bcard\b", "card_number", "4242424242424242"),
+    (r"\bexpir\w*|\bmm\s*/\s*yy\b", "expiry", "12/29"),
+    (r"\bcvc\b", "cvc", "123"),
+    (r"\bbio\b", "bio", "Insurance salesman who loves the sea"),
+]
+
+
+class MarkovActionGenerator:
+    """Local, offline drop-in for ActionGenerator
+    
+    Plans come from a stochastic grammar over the same action vocabulary:
+    each form field is an optional look, a click or tab into the field, a
+    type that may go wrong (error, clear, retype) and an optional pause,
+    then a submit. Probabilities and delays are per persona type and can
+    be fitted from GPT plans in the response cache.
+    """
+    
+    async_client = None
+    
+    def __init__(self, profiles: Dict = None, seed: int = 0, cache: ResponseCache = None,
+                 interfaces: Dict[str, Dict] = None):
+        self.profiles = copy.deepcopy(profiles or MARKOV_PROFILES)
+        self.seed = seed
+        # InterfaceRegistry descriptors by task; tasks without one fall back to the description's wording
+        self.interfaces = interfaces or {}
+        self.fitted = 0
+        if cache is not None:
+            self.fit(cache)
+        print(f"[OK] Local Action Generator ACTIVE ({self.fitted} cached GPT plans fitted)")
+    
+    def fingerprint(self) -> str:
+        """Hash of everything that shapes the plans"""
+        # Plans are drawn per cell seed
+        return _content_hash("markov", self.profiles, self.seed, "cell-seed")
+    
+    def fit(self, cache: ResponseCache, min_plans: int = 3) -> int:
+        """Re-estimate each persona type's probabilities and delays from cached GPT plans"""
+        counts = {}
+        for request, content in cache.entries():
+            prompt = request["messages"][-1]["content"]
+            match = re.search(r"^- Type: (\S+)", prompt, re.MULTILINE)
+            if not match or match.group(1) not in self.profiles:
+                continue
+            # Multi-task responses hold one plan per task key
+            if re.search(r"^TASKS:", prompt, re.MULTILINE):
+                plans = [[action for action in (validate_action(step, {}) for step in plan) if action]
+                         for plan in _keyed_plans(content).values()]
+            else:
+                plans = [ActionStreamParser().feed(content)]
+            for actions in plans:
+                if actions:
+                    self._count_plan(counts.setdefault(match.group(1), {
+                        "plans": 0, "fields": 0, "look": 0, "tab": 0, "field_clicks": 0,
+                        "error": 0, "wait": 0, "slow": 0, "delays": {}}), actions)
         
-        content = response.choices[0].message.content
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
+        for persona_type, c in counts.items():
+            if c["plans"] < min_plans or not c["fields"]:
+                continue
+            profile = self.profiles[persona_type]
+            profile["look"] = min(1.0, c["look"] / c["fields"])
+            profile["error"] = min(0.9, c["error"] / c["fields"])
+            profile["wait"] = min(1.0, c["wait"] / c["fields"])
+            profile["slow_typing"] = c["slow"] / c["fields"]
+            if c["tab"] + c["field_clicks"]:
+                profile["tab"] = c["tab"] / (c["tab"] + c["field_clicks"])
+            for kind, delays in c["delays"].items():
+                if kind in profile["delays"]:
+                    profile["delays"][kind] = round(sum(delays) / len(delays), 3)
+            self.fitted += c["plans"]
+        return self.fitted
+    
+    @staticmethod
+    def _count_plan(c: Dict, actions: List[Dict]):
+        """Add one plan's field, look/tab/error/wait and delay counts to c"""
+        c["plans"] += 1
+        previous = None
+        for action in actions:
+            kind, target = action.get("action"), str(action.get("target", ""))
+            if kind == "type" and previous != "clear":
+                c["fields"] += 1
+                c["slow"] += "slowly" in str(action.get("notes", "")).lower()
+            elif kind == "key" and target == "tab":
+                c["tab"] += 1
+            elif kind == "click" and target not in ("button", "page") and not target.endswith("_link"):
+                c["field_clicks"] += 1
+            elif kind in ("look", "error", "wait"):
+                c[kind] += 1
+            try:
+                c["delays"].setdefault(kind, []).append(float(action.get("delay") or 0))
+            except (TypeError, ValueError):
+                pass
+            previous = kind
+    
+    @staticmethod
+    def task_fields(task_description: str) -> List[tuple]:
+        """(target, value) for each field the task mentions, in the order mentioned"""
+        found = []
+        for pattern, target, value in TASK_FIELDS:
+            match = re.search(pattern, task_description, re.IGNORECASE)
+            if match:
+                found.append((match.start(), target, value))
+        return [(target, value) for _, target, value in sorted(found)]
+    
+    def _fields(self, task: str, task_description: str) -> tuple:
+        """(target, value) per field in page order, and the targets the page offers"""
+        interface = self.interfaces.get(task)
+        if not interface:
+            return self.task_fields(task_description), None
+        return ([(re.sub(r"_field$", "", field["target"]), field["value"]) for field in interface["fields"]],
+                interface["targets"])
+    
+    def generate_actions(self, persona: Dict, task: str, task_description: str, group: List[tuple] = None,
+                         seed: int = None) -> List[Dict]:
+        """Sample an action plan; the same persona, task and seed always give the same plan
         
-        base_persona = json.loads(content)
-        persona_id = f"persona_{random.randint(10, 99):02d}"
-        formatted_persona = self._format_persona_for_frontend(persona_id, persona_type, base_persona)
+        seed is the cell's seed (cell_seed), so each repetition draws its own plan.
+        group is accepted for interface parity with ActionGenerator; local plans cost no calls.
+        """
+        rng = random.Random(f"{self.seed}:{persona['id']}:{task}" if seed is None else f"{self.seed}:{seed}")
+        profile = self.profiles.get(persona['type'], MARKOV_PROFILES["novice"])
+        actions = []
         
-        print(f"   [OK] Generated: {persona_id} - {base_persona.get('occupation', 'N/A')}")
-        return formatted_persona
-    
-    def _format_persona_for_frontend(self, persona_id: str, persona_type: str, base_data: Dict) -> Dict:
-        """Format persona data for frontend consumption"""
-        type_labels = {
+        def add(kind, target, value="", notes=""):
+            delay = profile["delays"].get(kind, 0.0) * rng.uniform(0.5, 1.5)
+            actions.append({"action": kind, "target": target, "value": value, "notes": notes, "delay": round(delay, 2)})
+        
+        add("look", "page", notes="Reading the page")
+        fields, targets = self._fields(task, task_description)
+        for index, (target, value) in enumerate(fields):
+            if rng.random() < profile["look"] and index:
+                add("look", "page", notes="Checking the next field")
+            if rng.random() < profile["wrong_click"]:
+                wrong = rng.choice([other for other, _ in fields if other != target] or ["page"])
+                add("click", _canonical_target(f"{wrong}_field", targets) or wrong, notes="Clicked the wrong field")
+                add("error", wrong, notes="Wrong field selected")
+            if index and rng.random() < profile["tab"]:
+                add("key", "tab", notes="Tabbing to the next field")
+            else:
+                add("click", _canonical_target(f"{target}_field", targets) or target, notes=f"Clicked {target}")
+            if not value:
+                # Click-only field (select, checkbox)
+                continue
+            
+            notes = "Typing slowly" if rng.random() < profile["slow_typing"] else f"Typing {target}"
+            if rng.random() < profile["error"] and len(value) > 1:
+                pos = rng.randrange(len(value) - 1)
+                typo = value[:pos] + value[pos + 1] + value[pos] + value[pos + 2:]
+                add("type", target, typo, notes)
+                add("error", target, notes="Made a typo")
+                add("clear", target, notes="Fixing mistake")
+                add("type", target, value, "Retyped correctly")
+            else:
+                add("type", target, value, notes)
+            
+            if rng.random() < profile["wait"]:
+                add("wait", "page", notes="Got distracted")
+        
+        if fields and rng.random() < profile["tab"]:
+            add("key", "enter", notes="Submitting with enter")
+        else:
+            add("click", "button", notes="Submitting the form")
+        
+        error_count = sum(1 for a in actions if a["action"] == "error")
+        print(f"         -> Generated {len(actions)} actions, {error_count} errors (local)")
+        return actions
+    
+    def generate_actions_batch(self, cells: List[tuple]) -> List[List[Dict]]:
+        """Generate plans for many (persona, task, task_description) cells"""
+        return [self.generate_actions(*cell) for cell in cells]
+
+
+class HybridActionGenerator:
+    """Plans a fixed, hash-chosen fraction of cells with GPT and the rest locally"""
+    
+    def __init__(self, gpt: ActionGenerator, local: MarkovActionGenerator, gpt_fraction: float = 0.1, seed: int = 0):
+        self.gpt = gpt
+        self.local = local
+        self.gpt_fraction = gpt_fraction
+        self.seed = seed
+        self.async_client = gpt.async_client
+        self.usage_totals = gpt.usage_totals
+    
+    def fingerprint(self) -> str:
+        """Hash of everything that shapes the plans"""
+        return _content_hash("hybrid", self.local.fingerprint(), self.gpt_fraction, self.seed)
+    
+    def uses_gpt(self, persona: Dict, task: str) -> bool:
+        """Whether this cell is in the GPT sample"""
+        digest = hashlib.sha256(f"{self.seed}:{persona['id']}:{task}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") / 2 ** 64 < self.gpt_fraction
+    
+    def _gpt_group(self, persona: Dict, group: List[tuple]) -> List[tuple]:
+        """The part of a persona's task group that GPT plans"""
+        return [cell for cell in group if self.uses_gpt(persona, cell[0])] if group else None
+    
+    def group_tasks(self, persona: Dict, cells: List[tuple]) -> List[List[tuple]]:
+        """Group the GPT-sampled cells for shared calls; local cells stay single"""
+        sampled = [cell for cell in cells if self.uses_gpt(persona, cell[0])]
+        return (self.gpt.group_tasks(persona, sampled) if sampled else []) + \
+            [[cell] for cell in cells if cell not in sampled]
+    
+    def pop_usage(self, persona: Dict, task: str, seed: int = None) -> Dict:
+        """Tokens spent planning this cell (zeros for local plans)"""
+        return self.gpt.pop_usage(persona, task, seed)
+    
+    def report_usage(self):
+        """Print token totals"""
+        self.gpt.report_usage()
+    
+    def generate_actions(self, persona: Dict, task: str, task_description: str, group: List[tuple] = None,
+                         seed: int = None) -> List[Dict]:
+        """Generate action sequence for persona performing task"""
+        if self.uses_gpt(persona, task):
+            return self.gpt.generate_actions(persona, task, task_description, self._gpt_group(persona, group), seed)
+        return self.local.generate_actions(persona, task, task_description, seed=seed)
+    
+    def submit_actions(self, persona: Dict, task: str, task_description: str, group: List[tuple] = None,
+                       seed: int = None):
+        """Start generating an action plan; returns a concurrent.futures.Future"""
+        if self.uses_gpt(persona, task):
+            return self.gpt.submit_actions(persona, task, task_description, self._gpt_group(persona, group), seed)
+        future = Future()
+        future.set_result(self.local.generate_actions(persona, task, task_description, seed=seed))
+        return future
+
+
+
+PERSONA_TYPES = ["novice", "expert", "distracted", "accessibility-focused"]
+
+# Zero padding of persona_NN ids; fixed so an id (and its cards and cell hashes) never depends on the population size
+PERSONA_ID_WIDTH = 2
+
+# Weighted demographics that population-scale personas are drawn from
+PERSONA_DISTRIBUTION = {
+    "age": [((18, 24), 0.15), ((25, 34), 0.25), ((35, 44), 0.22), ((45, 54), 0.18), ((55, 65), 0.20)],
+    "gender": [("male", 0.48), ("female", 0.48), ("non-binary", 0.04)],
+    "region": [("North America", 0.22), ("Europe", 0.22), ("Asia", 0.30), ("Latin America", 0.12),
+               ("Africa", 0.10), ("Oceania", 0.04)],
+    "tech_experience": {
+        "novice": [("Low", 0.7), ("Medium", 0.3)],
+        "expert": [("Medium", 0.2), ("High", 0.8)],
+        "distracted": [("Low", 0.3), ("Medium", 0.5), ("High", 0.2)],
+        "accessibility-focused": [("Low", 0.3), ("Medium", 0.4), ("High", 0.3)],
+    },
+}
+
+
+def _weighted_choice(rng: random.Random, options: List) -> Any:
+    """Pick a value from [(value, weight), ...]"""
+    values, weights = zip(*options)
+    return rng.choices(values, weights=weights)[0]
+
+
+def sample_persona_profile(persona_type: str, rng: random.Random, distribution: Dict = None) -> Dict:
+    """Draw the demographic profile one persona is asked to follow"""
+    distribution = distribution or PERSONA_DISTRIBUTION
+    age_low, age_high = _weighted_choice(rng, distribution["age"])
+    return {
+        "age_range": [age_low, age_high],
+        "gender": _weighted_choice(rng, distribution["gender"]),
+        "region": _weighted_choice(rng, distribution["region"]),
+        "tech_experience": _weighted_choice(rng, distribution["tech_experience"][persona_type]),
+    }
+
+
+class NearDuplicateIndex:
+    """Flags personas whose text is nearly identical to one already accepted
+    
+    Word shingles are MinHashed and bucketed by LSH bands, so each lookup
+    only compares against a few candidates instead of every persona.
+    """
+    
+    # Smallest prime above 2**32: a*x+b with 32-bit a and x always wraps past it, so
+    # the minimum is well mixed, and stays inside uint64
+    PRIME = (1 << 32) + 15
+    
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+    
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the text's word shingles"""
+        words = re.findall(r"[a-z0-9']+", text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % self.PRIME).min(axis=1)
+    
+    def add(self, key: str, text: str) -> str:
+        """Index the text unless it duplicates an earlier one; returns that one's key"""
+        sig = self.signature(text)
+        bands = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        candidates = {other for band, bucket in zip(bands, self._buckets) for other in bucket.get(band, ())}
+        for other in candidates:
+            if np.mean(self._signatures[other] == sig) >= self.threshold:
+                return other
+        self._signatures[key] = sig
+        for band, bucket in zip(bands, self._buckets):
+            bucket.setdefault(band, []).append(key)
+        return None
+    
+    def __len__(self):
+        return len(self._signatures)
+
+
+class PersonaGenerator:
+    """Generates detailed persona profiles using GPT-4"""
+    
+    PERSONA_FIELDS = ("age", "gender", "location", "occupation", "tech_experience", "description",
+                      "goals", "frustrations", "preferred_actions")
+    
+    def __init__(self, api_key, base_url=None, async_client: AsyncLLMClient = None, cache: ResponseCache = None,
+                 client=None):
+        if client is None:
+            if not OPENAI_AVAILABLE:
+                raise ImportError("OpenAI library not installed. Run: pip install openai")
+            if not api_key or api_key == "your-api-key-here":
+                raise ValueError("Valid OpenAI API key required")
+            client = OpenAI(api_key=api_key, base_url=base_url)
+        
+        # Any object with the OpenAI chat.completions.create interface (e.g. FakeChatClient)
+        self.client = client
+        self.async_client = async_client
+        self.cache = cache
+        self.population_stats = {"generated": 0, "duplicates": 0, "dropped": 0, "failed": 0}
+        print("[OK] GPT-4 Persona Generator ACTIVE")
+    
+    def _build_request(self, persona_type: str, profile: Dict = None, variation: str = None) -> Dict:
+        """Build the chat completion request for one persona type"""
+        persona_desc = {
+            "novice": "new to interfaces, explores randomly, makes mistakes, reads everything carefully",
+            "expert": "experienced user, uses shortcuts, efficient, fast navigator",
+            "distracted": "multitasking user, forgets tasks, gets interrupted, loses focus",
+            "accessibility-focused": "requires accessible interactions, uses assistive tech, keyboard navigation"
+        }
+        
+        prompt = f"""Create a realistic {persona_type} user persona for HCI research.
+
+Persona type: {persona_desc[persona_type]}
+
+Return ONLY valid JSON in this exact format:
+{{
+  "age": [18-65],
+  "gender": "[male/female/non-binary]",
+  "location": "[country]",
+  "occupation": "[specific job title]",
+  "tech_experience": "[Low/Medium/High]",
+  "description": "[2-3 sentences describing behavior patterns and how they interact with interfaces]",
+  "goals": ["specific goal 1", "specific goal 2", "specific goal 3"],
+  "frustrations": ["specific frustration 1", "specific frustration 2", "specific frustration 3"],
+  "preferred_actions": ["specific action 1", "specific action 2", "specific action 3"]
+}}
+
+Make it realistic, diverse, and detailed. Base goals/frustrations on the persona type."""
+        
+        if profile:
+            prompt += f"""
+
+This persona must match the following profile:
+- age between {profile['age_range'][0]} and {profile['age_range'][1]}
+- gender: {profile['gender']}
+- location: a country in {profile['region']}
+- tech_experience: {profile['tech_experience']}"""
+        if variation:
+            prompt += f"\n\nPersona variation: {variation} (make it distinct from other personas of this type)"
+
+        return {
+            "model": "gpt-4",
+            "messages": [
+                {"role": "system", "content": "You create realistic HCI personas. Return only valid JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.8,
+            "max_tokens": 500
+        }
+    
+    def _submit_request(self, request: Dict) -> Future:
+        """Start one completion; runs inline when there is no async client"""
+        if self.async_client:
+            return self.async_client.run_coroutine(_achat_completion(self.async_client, self.cache, request))
+        future = Future()
+        try:
+            future.set_result(_chat_completion(self.client, self.cache, request))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def generate_population(self, slots, seed: int = 0, window: int = 32, dedup: NearDuplicateIndex = None,
+                            max_attempts: int = 3, distribution: Dict = None):
+        """Generate personas for (persona id, type) slots, yielding each as it completes
+        
+        At most `window` requests are in flight, so prompts and responses for a
+        large population are never all held at once. Each slot gets its own
+        sampled demographic profile; a persona that near-duplicates an accepted
+        one is regenerated with a fresh profile, then dropped.
+        """
+        slots = iter(slots)
+        pending = {}
+        
+        def submit(persona_id, persona_type, attempt):
+            rng = random.Random(f"{seed}:{persona_id}:{attempt}")
+            profile = sample_persona_profile(persona_type, rng, distribution)
+            request = self._build_request(persona_type, profile, variation=f"{persona_id}.{attempt}")
+            pending[self._submit_request(request)] = (persona_id, persona_type, attempt)
+        
+        def refill():
+            while len(pending) < window:
+                slot = next(slots, None)
+                if slot is None:
+                    return
+                submit(*slot, 0)
+        
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # Submission order, so the same seed always keeps the same one of two near-duplicates
+            for future in [f for f in pending if f in done]:
+                persona_id, persona_type, attempt = pending.pop(future)
+                try:
+                    persona = self._parse_persona(persona_type, future.result(), persona_id)
+                except Exception as e:
+                    self.population_stats["failed"] += 1
+                    print(f"   [WARNING] Persona {persona_id} failed: {e}")
+                    continue
+                
+                duplicate_of = dedup.add(persona_id, self.persona_text(persona)) if dedup is not None else None
+                if duplicate_of:
+                    self.population_stats["duplicates"] += 1
+                    if attempt + 1 < max_attempts:
+                        submit(persona_id, persona_type, attempt + 1)
+                    else:
+                        self.population_stats["dropped"] += 1
+                        print(f"   [WARNING] Dropped {persona_id}: near-duplicate of {duplicate_of}")
+                    continue
+                
+                self.population_stats["generated"] += 1
+                yield persona
+            refill()
+    
+    @staticmethod
+    def persona_text(persona: Dict) -> str:
+        """The free text compared for near-duplicates"""
+        behavior = persona["behavior"]
+        return " ".join([persona["demographics"]["occupation"], behavior["description"],
+                         *behavior["goals"], *behavior["frustrations"], *behavior["preferred_actions"]])
+    
+    def _parse_persona(self, persona_type: str, content: str, persona_id: str) -> Dict[str, Any]:
+        """Parse the model response into a formatted persona"""
+        with TRACER.span("parse_persona", "generator"):
+            base_persona = _loads_lenient(_extract_json(content))
+        missing = [key for key in self.PERSONA_FIELDS if key not in base_persona]
+        if missing:
+            raise ValueError(f"Persona response is missing {', '.join(missing)}")
+        return self._format_persona_for_frontend(persona_id, persona_type, base_persona)
+    
+    def _format_persona_for_frontend(self, persona_id: str, persona_type: str, base_data: Dict) -> Dict:
+        """Format persona data for frontend consumption"""
+        type_labels = {
             "novice": "Novice User",
             "expert": "Expert User",
             "distracted": "Distracted User",
@@ -191,9 +1668,91 @@ Make it realistic, diverse, and detailed. Base goals/frustrations on the persona
         }
 
 
+@lru_cache(maxsize=None)
+def _card_fonts():
+    """Title, header and body fonts, loaded once per process"""
+    try:
+        return (ImageFont.truetype("arial.ttf", 20),
+                ImageFont.truetype("arial.ttf", 16),
+                ImageFont.truetype("arial.ttf", 12))
+    except OSError:
+        default = ImageFont.load_default()
+        return default, default, default
+
+
+def _render_card_job(job: tuple) -> tuple:
+    """Process pool entry point: (persona, path, hash) -> (persona id, hash, error)"""
+    persona, output_path, card_hash = job
+    try:
+        PersonaCardGenerator.create_card(persona, output_path)
+        return persona['id'], card_hash, None
+    except Exception as e:
+        return persona['id'], None, str(e)
+
+
 class PersonaCardGenerator:
     """Generates PNG persona cards"""
     
+    # What to do with a card that already exists on disk
+    POLICIES = ("skip-unchanged", "overwrite", "skip-existing")
+    
+    @staticmethod
+    def card_hash(persona: Dict) -> str:
+        """Hash of everything the card shows"""
+        return _content_hash(persona)
+    
+    @staticmethod
+    def render_batch(personas: List[Dict], cards_dir: str, policy: str = "skip-unchanged",
+                     workers: int = None) -> Dict[str, int]:
+        """Render many cards across a process pool, skipping cards whose persona hash is unchanged"""
+        if policy not in PersonaCardGenerator.POLICIES:
+            raise ValueError(f"Unknown card policy: {policy}")
+        
+        index_path = os.path.join(cards_dir, "card_index.json")
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        
+        jobs = []
+        skipped = 0
+        for persona in personas:
+            path = os.path.join(cards_dir, f"{persona['id']}.png")
+            card_hash = PersonaCardGenerator.card_hash(persona)
+            exists = os.path.exists(path)
+            if exists and (policy == "skip-existing" or (policy == "skip-unchanged" and index.get(persona['id']) == card_hash)):
+                skipped += 1
+                continue
+            jobs.append((persona, path, card_hash))
+        
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(jobs) < workers * 2:
+            # Not worth a process pool
+            results = map(_render_card_job, jobs)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_render_card_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        
+        stats = {"rendered": 0, "skipped": skipped, "failed": 0}
+        try:
+            for persona_id, card_hash, error in results:
+                if error:
+                    stats["failed"] += 1
+                    print(f"   [WARNING] Card error ({persona_id}): {error}")
+                else:
+                    stats["rendered"] += 1
+                    index[persona_id] = card_hash
+        finally:
+            if pool:
+                pool.shutdown()
+        
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, index_path)
+        return stats
+    
     @staticmethod
     def create_card(persona: Dict, output_path: str):
         """Create visual persona card"""
@@ -201,14 +1760,7 @@ class PersonaCardGenerator:
         img = Image.new('RGB', (width, height), color='white')
         draw = ImageDraw.Draw(img)
         
-        try:
-            title_font = ImageFont.truetype("arial.ttf", 20)
-            header_font = ImageFont.truetype("arial.ttf", 16)
-            body_font = ImageFont.truetype("arial.ttf", 12)
-        except:
-            title_font = ImageFont.load_default()
-            header_font = ImageFont.load_default()
-            body_font = ImageFont.load_default()
+        title_font, header_font, body_font = _card_fonts()
         
         colors = {
             "novice": "#3b82f6",
@@ -223,175 +1775,2486 @@ class PersonaCardGenerator:
         title = persona['label']
         draw.text((20, 25), title, fill='white', font=title_font)
         
-        # Demographics
-        y = 100
-        draw.text((20, y), f"ID: {persona['id']}", fill='#1f2937', font=header_font)
-        y += 25
-        draw.text((20, y), f"Age: {persona['demographics']['age']} | {persona['demographics']['gender'].title()}", fill='#4b5563', font=body_font)
-        y += 20
-        draw.text((20, y), f"Location: {persona['demographics']['location']}", fill='#4b5563', font=body_font)
-        y += 20
-        draw.text((20, y), f"Occupation: {persona['demographics']['occupation']}", fill='#4b5563', font=body_font)
-        y += 30
+        # Demographics
+        y = 100
+        draw.text((20, y), f"ID: {persona['id']}", fill='#1f2937', font=header_font)
+        y += 25
+        draw.text((20, y), f"Age: {persona['demographics']['age']} | {persona['demographics']['gender'].title()}", fill='#4b5563', font=body_font)
+        y += 20
+        draw.text((20, y), f"Location: {persona['demographics']['location']}", fill='#4b5563', font=body_font)
+        y += 20
+        draw.text((20, y), f"Occupation: {persona['demographics']['occupation']}", fill='#4b5563', font=body_font)
+        y += 30
+        
+        # Goals
+        draw.text((20, y), "Goals:", fill='#1f2937', font=header_font)
+        y += 20
+        for goal in persona['behavior']['goals'][:3]:
+            wrapped = textwrap.fill(f"- {goal}", width=50)
+            for line in wrapped.split('\n'):
+                draw.text((25, y), line, fill='#4b5563', font=body_font)
+                y += 15
+        
+        y += 10
+        # Frustrations
+        draw.text((20, y), "Frustrations:", fill='#1f2937', font=header_font)
+        y += 20
+        for frust in persona['behavior']['frustrations'][:3]:
+            wrapped = textwrap.fill(f"- {frust}", width=50)
+            for line in wrapped.split('\n'):
+                draw.text((25, y), line, fill='#4b5563', font=body_font)
+                y += 15
+        
+        img.save(output_path)
+
+
+# Builds the semantic target map for the current page in one round trip.
+# arguments[0] is a list of [target, regex, css selector] rules; each element
+# is claimed by the first rule that matches its label/ARIA/placeholder text.
+TARGET_MAP_JS = r"""
+const rules = arguments[0];
+function describe(el) {
+  const parts = [];
+  if (el.id) {
+    const forLabel = document.querySelector('label[for="' + CSS.escape(el.id) + '"]');
+    if (forLabel) parts.push(forLabel.textContent);
+  }
+  const wrapping = el.closest('label');
+  if (wrapping) parts.push(wrapping.textContent);
+  const prev = el.previousElementSibling;
+  if (prev && prev.tagName === 'LABEL' && !prev.htmlFor) parts.push(prev.textContent);
+  const labelledBy = el.getAttribute('aria-labelledby');
+  if (labelledBy) {
+    labelledBy.split(/\s+/).forEach(function (id) {
+      const ref = document.getElementById(id);
+      if (ref) parts.push(ref.textContent);
+    });
+  }
+  ['aria-label', 'placeholder', 'name', 'id', 'title', 'autocomplete', 'type'].forEach(function (attr) {
+    const value = el.getAttribute(attr);
+    if (value) parts.push(value);
+  });
+  if (el.tagName === 'BUTTON' || el.tagName === 'A') parts.push(el.textContent);
+  return parts.join(' ').replace(/\s+/g, ' ').trim();
+}
+const found = {};
+const used = new Set();
+for (const [name, pattern, selector] of rules) {
+  const re = new RegExp(pattern, 'i');
+  for (const el of document.querySelectorAll(selector)) {
+    if (used.has(el)) continue;
+    if (re.test(describe(el))) {
+      found[name] = el;
+      used.add(el);
+      break;
+    }
+  }
+}
+return found;
+"""
+
+
+class TargetResolver:
+    """Maps semantic action targets to cached element handles for the current page"""
+    
+    FIELDS = "input:not([type=hidden]):not([type=submit]):not([type=button]), textarea, select"
+    RULES = [
+        ["password_field", r"password", FIELDS],
+        ["username_field", r"user\s*name|login|e-?mail or", FIELDS],
+        ["email_field", r"e-?mail", FIELDS],
+        ["name_field", r"\bname\b", FIELDS],
+        ["address_field", r"address|street", FIELDS],
+        ["city_field", r"\bcity\b", FIELDS],
+        ["state_field", r"\bstate\b|province", FIELDS],
+        ["zip_field", r"\bzip\b|postal", FIELDS],
+        ["card_number", r"card", FIELDS],
+        ["expiry_field", r"mm\s*/\s*yy|expir", FIELDS],
+        ["cvc_field", r"\bcvc\b|\bcvv\b|security code", FIELDS],
+        ["bio_field", r"\bbio\b|about", FIELDS],
+        ["shipping_field", r"", "select"],
+        ["button", r"", "button, input[type=submit], input[type=button]"],
+        ["signup_link", r"sign\s*up|register|create account", "a"],
+        ["forgot_password_link", r"forgot", "a"]
+    ]
+    
+    def __init__(self, driver, rules: List[list] = None):
+        self.driver = driver
+        # Per page: RULES plus the interface descriptor's rules for targets RULES does not know
+        self.rules = rules or self.RULES
+        self._targets = None
+        self.stats = {"target_builds": 0, "target_lookups": 0, "target_misses": 0}
+    
+    def invalidate(self):
+        """Forget cached handles (after navigation)"""
+        self._targets = None
+    
+    def build(self):
+        """Resolve every known target on the page with a single execute_script"""
+        self._targets = self.driver.execute_script(TARGET_MAP_JS, self.rules) or {}
+        self.stats["target_builds"] += 1
+    
+    def resolve(self, target: str):
+        """Element for a target such as "username_field" or "username", or None"""
+        self.stats["target_lookups"] += 1
+        if self._targets is None:
+            self.build()
+        for key in (target, f"{target}_field"):
+            if key in self._targets:
+                return self._targets[key]
+        self.stats["target_misses"] += 1
+        return None
+    
+    def reset_stats(self):
+        """Zero the counters for a new run"""
+        for key in self.stats:
+            self.stats[key] = 0
+
+
+class _HTMLNode:
+    """Element of the tree built by _HTMLTreeBuilder; children are nodes and text"""
+    
+    __slots__ = ("tag", "attrs", "parent", "children")
+    
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: "_HTMLNode" = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+    
+    def text(self) -> str:
+        """textContent, whitespace collapsed"""
+        parts = [child if isinstance(child, str) else child.text() for child in self.children]
+        return re.sub(r"\s+", " ", " ".join(parts)).strip()
+    
+    def iter(self):
+        for child in self.children:
+            if isinstance(child, _HTMLNode):
+                yield child
+                yield from child.iter()
+    
+    def previous_element(self) -> "_HTMLNode":
+        siblings = [child for child in self.parent.children if isinstance(child, _HTMLNode)] if self.parent else []
+        index = siblings.index(self)
+        return siblings[index - 1] if index else None
+    
+    def closest(self, tag: str) -> "_HTMLNode":
+        node = self.parent
+        while node is not None and node.tag != tag:
+            node = node.parent
+        return node
+
+
+class _HTMLTreeBuilder(HTMLParser):
+    """Lenient DOM-ish tree for the static mock pages (no scripts are run)"""
+    
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = self.current = _HTMLNode("#document", {})
+    
+    def handle_starttag(self, tag, attrs):
+        node = _HTMLNode(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in self.VOID:
+            self.current = node
+    
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(_HTMLNode(tag, {name: value or "" for name, value in attrs}, self.current))
+    
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+    
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+class InterfaceRegistry:
+    """Interfaces discovered from the HTML pages in data/interfaces/
+    
+    Each page is parsed once into a descriptor: its name and task
+    description, the fields, buttons and links it contains, the action
+    targets they map to and the extra resolver rules for targets that
+    TargetResolver.RULES does not cover. Descriptors are cached by the
+    page's content hash, so only new or edited pages are parsed again.
+    Element matching mirrors TARGET_MAP_JS, so the targets offered to the
+    planner are the ones the resolver finds in the browser.
+    """
+    
+    VERSION = 1
+    BUTTONS = "button, input[type=submit], input[type=button]"
+    
+    def __init__(self, directory: str, cache_path: str = None):
+        self.directory = directory
+        self.cache_path = cache_path
+        self.stats = {"interfaces": 0, "parsed": 0, "cached": 0}
+    
+    def scan(self) -> Dict[str, Dict]:
+        """Descriptors of every *.html page by task name (the file name without .html)"""
+        cache = {}
+        if self.cache_path and os.path.exists(self.cache_path):
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                cache = data["interfaces"]
+        
+        interfaces = {}
+        used = {}
+        for filename in sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []:
+            if not filename.endswith(".html"):
+                continue
+            path = os.path.join(self.directory, filename)
+            with open(path, "rb") as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()
+            task = os.path.splitext(filename)[0]
+            key = f"{task}:{digest}"
+            if key in cache:
+                self.stats["cached"] += 1
+                descriptor = cache[key]
+            else:
+                self.stats["parsed"] += 1
+                descriptor = self.describe(content.decode("utf-8", errors="replace"), task)
+            used[key] = descriptor
+            interfaces[task] = dict(descriptor, file_path=path, hash=digest)
+        self.stats["interfaces"] = len(interfaces)
+        
+        if self.cache_path and (self.stats["parsed"] or len(used) != len(cache)):
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "interfaces": used}, f, indent=1)
+            os.replace(tmp_path, self.cache_path)
+        return interfaces
+    
+    @staticmethod
+    def _describe_element(node: _HTMLNode, labels_for: Dict[str, str], ids: Dict[str, _HTMLNode]) -> tuple:
+        """(describe() text as TARGET_MAP_JS builds it, the most human name for the element or "")"""
+        explicit, sibling = [], []
+        if node.attrs.get("id") in labels_for:
+            explicit.append(labels_for[node.attrs["id"]])
+        wrapping = node.closest("label")
+        if wrapping is not None:
+            explicit.append(wrapping.text())
+        previous = node.previous_element()
+        if previous is not None and previous.tag == "label" and not previous.attrs.get("for"):
+            sibling.append(previous.text())
+        for ref in node.attrs.get("aria-labelledby", "").split():
+            if ref in ids:
+                explicit.append(ids[ref].text())
+        attrs = {attr: node.attrs[attr] for attr in ("aria-label", "placeholder", "name", "id", "title",
+                                                     "autocomplete", "type") if node.attrs.get(attr)}
+        parts = explicit + sibling + list(attrs.values())
+        own = node.text() if node.tag in ("button", "a") else node.attrs.get("value", "")
+        if node.tag in ("button", "a") and own:
+            parts.append(own)
+        names = explicit + [attrs.get("aria-label", "")] + sibling + [attrs.get("placeholder", ""), own] + \
+            [attrs.get(attr, "") for attr in ("name", "id", "title")]
+        primary = next((name for name in names if name.strip()), "")
+        return re.sub(r"\s+", " ", " ".join(parts)).strip(), primary.strip()
+    
+    @staticmethod
+    def _field_value(text: str, input_type: str, placeholder: str) -> str:
+        """A plausible value to type into a field"""
+        for pattern, _, value in TASK_FIELDS:
+            if re.search(pattern, text, re.IGNORECASE):
+                return value
+        by_type = {"email": "truman@example.com", "password": "Seahaven#1998", "tel": "555-0100",
+                   "number": "42", "date": "1998-06-05", "url": "https://example.com"}
+        if input_type in by_type:
+            return by_type[input_type]
+        match = re.match(r"e\.g\.\s*(.+)", placeholder, re.IGNORECASE)
+        return match.group(1).strip() if match else "Truman"
+    
+    @classmethod
+    def describe(cls, html: str, task: str) -> Dict:
+        """Parse one page into its interface descriptor"""
+        builder = _HTMLTreeBuilder()
+        builder.feed(html)
+        builder.close()
+        nodes = list(builder.root.iter())
+        ids = {node.attrs["id"]: node for node in nodes if node.attrs.get("id")}
+        labels_for = {node.attrs["for"]: node.text() for node in nodes if node.tag == "label" and node.attrs.get("for")}
+        
+        elements = {TargetResolver.FIELDS: [], "select": [], cls.BUTTONS: [], "a": []}
+        for node in nodes:
+            input_type = node.attrs.get("type", "").lower()
+            if node.tag == "input" and input_type in ("submit", "button"):
+                elements[cls.BUTTONS].append(node)
+            elif node.tag == "button":
+                elements[cls.BUTTONS].append(node)
+            elif (node.tag == "input" and input_type != "hidden") or node.tag in ("textarea", "select"):
+                elements[TargetResolver.FIELDS].append(node)
+                if node.tag == "select":
+                    elements["select"].append(node)
+            elif node.tag == "a":
+                elements["a"].append(node)
+        described = {id(node): cls._describe_element(node, labels_for, ids) for group in elements.values() for node in group}
+        
+        # Same claiming order as TARGET_MAP_JS: rules in order, first unclaimed match in document order
+        targets = {}
+        for name, pattern, selector in TargetResolver.RULES:
+            for node in elements[selector]:
+                if id(node) not in targets and re.search(pattern, described[id(node)][0], re.IGNORECASE):
+                    targets[id(node)] = name
+                    break
+        
+        rules = []
+        taken = set(targets.values())
+        kinds = ((TargetResolver.FIELDS, "field"), (cls.BUTTONS, "button"), ("a", "link"))
+        for selector, suffix in kinds:
+            for node in elements[selector]:
+                primary = described[id(node)][1]
+                if id(node) in targets or not primary:
+                    continue
+                slug = re.sub(r"[^a-z0-9]+", "_", primary.lower()).strip("_") or node.tag
+                name = f"{slug}_{suffix}"
+                for n in itertools.count(2):
+                    if name not in taken:
+                        break
+                    name = f"{slug}_{suffix}_{n}"
+                taken.add(name)
+                targets[id(node)] = name
+                rules.append([name, re.escape(primary), selector])
+        
+        def label(node, suffix):
+            # Unnamed elements (an unlabelled select) are called after their target
+            target = targets[id(node)]
+            return described[id(node)][1] or re.sub(f"{suffix}$", "", target).replace("_", " ")
+        
+        fields = []
+        for node in elements[TargetResolver.FIELDS]:
+            if id(node) not in targets:
+                continue
+            target = targets[id(node)]
+            text = described[id(node)][0]
+            field_type = node.attrs.get("type", "text").lower() if node.tag == "input" else node.tag
+            # An empty value marks a click-only field (select, checkbox, radio)
+            clickable = field_type in ("select", "checkbox", "radio")
+            fields.append({"target": target, "label": label(node, "_field"), "tag": node.tag, "type": field_type,
+                           "value": "" if clickable else
+                           cls._field_value(text, field_type, node.attrs.get("placeholder", ""))})
+        buttons = [{"target": targets[id(node)], "label": label(node, "_button")}
+                   for node in elements[cls.BUTTONS] if id(node) in targets]
+        links = [{"target": targets[id(node)], "label": label(node, "_link")}
+                 for node in elements["a"] if id(node) in targets]
+        
+        title = next((node.text() for node in nodes if node.tag == "title"), "")
+        name = re.split(r"\s+[\u2014\u2013|:-]\s+", title)[-1].strip() if title else ""
+        name = name or task.replace("_", " ").replace("-", " ").title()
+        description = f"a {name.lower()} form"
+        if fields:
+            description += f" with {', '.join(field['label'].lower() for field in fields)} field{'s' if len(fields) > 1 else ''}"
+        if buttons:
+            description += f" and a {buttons[0]['label'].lower()} button"
+        
+        # Fields are typed under their short name (username) and clicked under the full one (username_field)
+        offered = ["page"]
+        for field in fields:
+            offered.append(field["target"])
+            short = field["target"][:-len("_field")] if field["target"].endswith("_field") else None
+            if short and field["value"]:
+                offered.append(short)
+        offered += [button["target"] for button in buttons] + [link["target"] for link in links]
+        return {"task": task, "name": name, "label": f"{name} Form", "description": description,
+                "fields": fields, "buttons": buttons, "links": links,
+                "targets": list(dict.fromkeys(offered)), "rules": rules}
+
+
+# Runs a batch of plan steps in one round trip. arguments[0] is a list of
+# {action, target, value, element} steps; returns one {ok, error, navigates, missing}
+# result per executed step and stops at the first failure.
+BATCH_ACTIONS_JS = r"""
+const steps = arguments[0];
+const results = [];
+function fire(el, type, init) {
+  const Ctor = type.startsWith('key') ? KeyboardEvent : (type.startsWith('mouse') || type === 'click' ? MouseEvent : Event);
+  el.dispatchEvent(new Ctor(type, Object.assign({bubbles: true, cancelable: true}, init || {})));
+}
+function setValue(el, value) {
+  const proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+  const setter = Object.getOwnPropertyDescriptor(proto, 'value').set;
+  setter.call(el, value);
+}
+function isEditable(el) {
+  return !!el && (el.tagName === 'INPUT' || el.tagName === 'TEXTAREA') && !el.disabled && !el.readOnly;
+}
+function focusables() {
+  const all = Array.from(document.querySelectorAll(
+    'a[href], button, input:not([type=hidden]), select, textarea, [tabindex]'
+  )).filter(function (el) { return !el.disabled && el.tabIndex >= 0 && el.offsetParent !== null; });
+  const positive = all.filter(function (el) { return el.tabIndex > 0; }).sort(function (a, b) { return a.tabIndex - b.tabIndex; });
+  return positive.concat(all.filter(function (el) { return el.tabIndex === 0; }));
+}
+for (const step of steps) {
+  // outcome as the per-step path logs it: missed (no element) or failed (element not editable)
+  const result = {ok: true, error: '', navigates: false, outcome: 'ok'};
+  try {
+    const active = document.activeElement || document.body;
+    if ((step.action === 'click' || step.action === 'type' || step.action === 'clear') && !step.element) {
+      result.outcome = 'missed';
+    } else if ((step.action === 'type' || step.action === 'clear') && !isEditable(step.element)) {
+      result.outcome = 'failed';
+    } else if (step.action === 'click') {
+      const el = step.element;
+      if (el) {
+        el.scrollIntoView({block: 'center'});
+        fire(el, 'mousedown');
+        if (el.focus) el.focus();
+        fire(el, 'mouseup');
+        el.click();
+        result.navigates = el.tagName === 'A' || el.tagName === 'BUTTON' || el.type === 'submit';
+      }
+    } else if (step.action === 'type') {
+      const el = step.element;
+      el.focus();
+      for (const ch of String(step.value)) {
+        fire(el, 'keydown', {key: ch});
+        fire(el, 'keypress', {key: ch});
+        setValue(el, el.value + ch);
+        el.dispatchEvent(new InputEvent('input', {bubbles: true, inputType: 'insertText', data: ch}));
+        fire(el, 'keyup', {key: ch});
+      }
+    } else if (step.action === 'key') {
+      if (step.target === 'tab') {
+        fire(active, 'keydown', {key: 'Tab'});
+        const order = focusables();
+        const next = order[(order.indexOf(active) + 1) % order.length];
+        if (next) next.focus();
+        fire(document.activeElement, 'keyup', {key: 'Tab'});
+      } else if (step.target === 'enter') {
+        fire(active, 'keydown', {key: 'Enter'});
+        if (active.tagName === 'BUTTON' || active.tagName === 'A') {
+          active.click();
+          result.navigates = true;
+        } else if (active.form) {
+          active.form.requestSubmit();
+          result.navigates = true;
+        }
+        fire(active, 'keyup', {key: 'Enter'});
+      }
+    } else if (step.action === 'clear') {
+      const el = step.element;
+      setValue(el, '');
+      el.dispatchEvent(new InputEvent('input', {bubbles: true, inputType: 'deleteContentBackward'}));
+      fire(el, 'change');
+    }
+  } catch (e) {
+    result.ok = false;
+    result.error = String(e && e.message || e);
+  }
+  results.push(result);
+  if (!result.ok || result.navigates) break;
+}
+return results;
+"""
+
+# isEditable() from BATCH_ACTIONS_JS, for the per-step path
+EDITABLE_JS = r"""
+const el = arguments[0];
+return !!el && (el.tagName === 'INPUT' || el.tagName === 'TEXTAREA') && !el.disabled && !el.readOnly;
+"""
+
+
+class BrowserSimulator:
+    """Simulates persona interactions with HTML
+    
+    time_mode "realtime" keeps the persona's planned pacing; "compressed" skips
+    the sleeps and only records the planned delays as virtual time. "virtual"
+    also skips them and stamps the log with virtual time instead of the wall
+    clock, so the same plan on the same page always logs the same bytes. Page
+    and element readiness always come from WebDriverWait conditions.
+    
+    With batch_js, runs of consecutive zero-delay steps (every step in
+    compressed mode) are sent to the page as one injected JS program.
+    """
+    
+    TIME_MODES = ("realtime", "compressed", "virtual")
+    BATCHABLE = ("look", "click", "type", "key", "clear", "error")
+    
+    def __init__(self, headless=False, time_mode="realtime", batch_js=False):
+        if time_mode not in self.TIME_MODES:
+            raise ValueError(f"Unknown time mode: {time_mode}")
+        chrome_options = Options()
+        if headless:
+            chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--window-size=1920,1080")
+        
+        self.driver = webdriver.Chrome(options=chrome_options)
+        self.wait = WebDriverWait(self.driver, 10)
+        self.uses = 0
+        self.time_mode = time_mode
+        self.batch_js = batch_js
+        self.run_stats = {"virtual_time": 0.0, "batches": 0, "batched_steps": 0}
+        self.targets = TargetResolver(self.driver)
+        # Called with the number of logged steps after each step or batch (per-step frames)
+        self.on_step = None
+        self._run_started = self._step_started = self._clock()
+    
+    def load_page(self, file_path: str, target_rules: List[list] = None):
+        """Load HTML file; target_rules replaces TargetResolver.RULES for this page"""
+        abs_path = os.path.abspath(file_path)
+        with TRACER.span("load_page", "browser", page=os.path.basename(file_path)):
+            self.driver.get(f"file://{abs_path}")
+            self.wait_ready()
+        self.run_stats = {"virtual_time": 0.0, "batches": 0, "batched_steps": 0}
+        self._run_started = self._clock()
+        self.targets.reset_stats()
+        self.targets.rules = target_rules or TargetResolver.RULES
+        self.targets.invalidate()
+        self.targets.build()
+    
+    def collect_stats(self) -> Dict:
+        """Timing and lookup counters for the current run"""
+        return dict(self.run_stats, **self.targets.stats)
+    
+    def wait_ready(self):
+        """Block until the current document has finished loading"""
+        self.wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+    
+    def _clock(self) -> float:
+        """Log clock: virtual time in virtual mode, otherwise the monotonic wall clock"""
+        return self.run_stats["virtual_time"] if self.time_mode == "virtual" else time.monotonic()
+    
+    def _pause(self, seconds):
+        """Persona think/typing time: slept in realtime mode, only recorded otherwise"""
+        try:
+            seconds = max(0.0, float(seconds))
+        except (TypeError, ValueError):
+            seconds = 0.0
+        self.run_stats["virtual_time"] += seconds
+        if self.time_mode == "realtime" and seconds:
+            with TRACER.span("persona_delay", "browser"):
+                time.sleep(seconds)
+    
+    def _click(self, target: str) -> bool:
+        """Click a semantic target once it is interactable; False if the page has no such target"""
+        for attempt in range(2):
+            elem = self.targets.resolve(target)
+            if elem is None:
+                return False
+            try:
+                self.wait.until(EC.element_to_be_clickable(elem))
+                elem.click()
+                return True
+            except selenium_exceptions.StaleElementReferenceException:
+                if attempt:
+                    raise
+                self.targets.invalidate()
+    
+    def take_screenshot(self, path: str):
+        """Capture screenshot"""
+        with TRACER.span("screenshot", "browser"):
+            self.driver.save_screenshot(path)
+    
+    def capture(self, scope: str = "viewport") -> bytes:
+        """PNG bytes of the viewport, or of the first element matching the CSS selector scope
+        
+        Uses CDP's fast-path capture (clipped to the element) when available,
+        falling back to the plain WebDriver screenshot calls.
+        """
+        with TRACER.span("capture", "browser", scope=scope):
+            clip = None
+            if scope != "viewport":
+                clip = self.driver.execute_script(
+                    "const el = document.querySelector(arguments[0]); if (!el) return null;"
+                    "const r = el.getBoundingClientRect();"
+                    "return {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height};",
+                    scope)
+                if not clip or not clip["width"] or not clip["height"]:
+                    clip = None
+            params = {"format": "png", "optimizeForSpeed": True}
+            if clip:
+                params.update(clip=dict(clip, scale=1), captureBeyondViewport=True)
+            try:
+                return base64.b64decode(self.driver.execute_cdp_cmd("Page.captureScreenshot", params)["data"])
+            except (AttributeError, KeyError, selenium_exceptions.WebDriverException):
+                if clip:
+                    return self.driver.find_element(By.CSS_SELECTOR, scope).screenshot_as_png
+                return self.driver.get_screenshot_as_png()
+    
+    def execute_actions(self, actions) -> List[Dict]:
+        """Execute GPT-generated action sequence
+        
+        actions may be any iterable, including an ActionStream that is still
+        receiving steps; each step runs as soon as it is available.
+        """
+        executed_actions = []
+        
+        try:
+            actions = iter(actions)
+            pending = next(actions, None)
+            while pending is not None:
+                # Batching has to look one step ahead to see where a run ends
+                run = []
+                while self.batch_js and pending is not None and self._batchable(pending):
+                    run.append(pending)
+                    pending = next(actions, None)
+                if len(run) > 1:
+                    with TRACER.span("js_batch", "browser", steps=len(run)):
+                        self._execute_batch(run, executed_actions)
+                    if self.on_step:
+                        self.on_step(len(executed_actions))
+                    continue
+                
+                self._step_started = self._clock()
+                step = run[0] if run else pending
+                with TRACER.span(f"step_{step.get('action', '')}", "browser"):
+                    self._execute_action(step, executed_actions)
+                if self.on_step:
+                    self.on_step(len(executed_actions))
+                if not run:
+                    pending = next(actions, None)
+        
+        except Exception as e:
+            self._add_action(executed_actions, "error", "interaction", "", f"Execution error: {str(e)}",
+                             outcome="failed")
+        
+        return executed_actions
+    
+    def _execute_action(self, action_plan: Dict, executed_actions: List[Dict]):
+        """Execute one planned step with its own WebDriver calls"""
+        action_type = action_plan.get("action", "")
+        target = action_plan.get("target", "")
+        value = action_plan.get("value", "")
+        notes = action_plan.get("notes", "")
+        delay = action_plan.get("delay", 0.0)
+        
+        # Execute based on action type
+        if action_type == "look":
+            self._pause(delay)
+            self._add_action(executed_actions, "look", target, value, notes)
+        
+        elif action_type == "click":
+            clicked = self._click(target)
+            if clicked and (target == "button" or target.endswith("_link")):
+                # Buttons and links may submit or navigate
+                self.wait_ready()
+                self.targets.invalidate()
+            
+            self._pause(delay)
+            self._add_action(executed_actions, "click", target, value, notes, outcome="ok" if clicked else "missed")
+        
+        elif action_type == "type":
+            element = self.targets.resolve(target)
+            outcome = self._edit_outcome(element)
+            if outcome == "ok":
+                try:
+                    # Type character by character if delay specified
+                    if "slowly" in notes.lower():
+                        for char in value:
+                            element.send_keys(char)
+                            self._pause(0.3)
+                    else:
+                        element.send_keys(value)
+                except (selenium_exceptions.ElementNotInteractableException,
+                        selenium_exceptions.InvalidElementStateException):
+                    outcome = "failed"
+            
+            self._pause(delay)
+            # Mask password
+            display_value = "********" if target == "password" else value
+            self._add_action(executed_actions, "type", target, display_value, notes, outcome=outcome)
+        
+        elif action_type == "key":
+            if target == "tab":
+                self.driver.switch_to.active_element.send_keys(Keys.TAB)
+            elif target == "enter":
+                self.driver.switch_to.active_element.send_keys(Keys.RETURN)
+                self.wait_ready()
+                self.targets.invalidate()
+            
+            self._pause(delay)
+            self._add_action(executed_actions, "key", target, value, notes)
+        
+        elif action_type == "clear":
+            element = self.targets.resolve(target)
+            outcome = self._edit_outcome(element)
+            if outcome == "ok":
+                try:
+                    element.clear()
+                except (selenium_exceptions.ElementNotInteractableException,
+                        selenium_exceptions.InvalidElementStateException):
+                    outcome = "failed"
+            self._pause(delay)
+            self._add_action(executed_actions, "clear", target, value, notes, outcome=outcome)
+        
+        elif action_type == "wait":
+            self._pause(delay if float(delay or 0) > 0 else value)
+            self._add_action(executed_actions, "wait", target, value, notes)
+        
+        elif action_type == "navigate":
+            if target == "back":
+                self.driver.back()
+                self.wait_ready()
+                self.targets.invalidate()
+                self._pause(delay)
+            self._add_action(executed_actions, "navigate", target, value, notes)
+        
+        elif action_type == "error":
+            # Error actions are just logged, not executed
+            self._pause(delay)
+            self._add_action(executed_actions, "error", target, value, notes, outcome="error")
+    
+    def _edit_outcome(self, element) -> str:
+        """How a type or clear on a resolved element is logged; BATCH_ACTIONS_JS classifies the same way"""
+        if element is None:
+            return "missed"
+        return "ok" if self.driver.execute_script(EDITABLE_JS, element) else "failed"
+    
+    def _batchable(self, action_plan: Dict) -> bool:
+        """Whether a step can go out in a single JS program with its neighbours"""
+        if action_plan.get("action") not in self.BATCHABLE:
+            return False
+        if self.time_mode == "realtime":
+            try:
+                delay = float(action_plan.get("delay") or 0)
+            except (TypeError, ValueError):
+                delay = 0.0
+            if delay > 0 or "slowly" in str(action_plan.get("notes", "")).lower():
+                return False
+        return True
+    
+    def _execute_batch(self, run: List[Dict], executed_actions: List[Dict]):
+        """Execute a run of steps in a single execute_script call; logs match the per-step path"""
+        for attempt in range(2):
+            steps = []
+            for action_plan in run:
+                action_type = action_plan.get("action", "")
+                target = action_plan.get("target", "")
+                steps.append({
+                    "action": action_type,
+                    "target": target,
+                    "value": str(action_plan.get("value", "")),
+                    "element": self.targets.resolve(target) if action_type in ("click", "type", "clear") else None
+                })
+            try:
+                started = time.monotonic()
+                results = self.driver.execute_script(BATCH_ACTIONS_JS, steps)
+                # One round trip for the whole run; split its cost evenly
+                duration = (time.monotonic() - started) / max(1, len(results))
+                break
+            except selenium_exceptions.StaleElementReferenceException:
+                if attempt:
+                    raise
+                self.targets.invalidate()
+        
+        self.run_stats["batches"] += 1
+        self.run_stats["batched_steps"] += len(results)
+        for action_plan, result in zip(run, results):
+            if not result["ok"]:
+                raise RuntimeError(result["error"])
+            
+            action_type = action_plan.get("action", "")
+            target = action_plan.get("target", "")
+            value = action_plan.get("value", "")
+            notes = action_plan.get("notes", "")
+            if action_type == "type" and "slowly" in notes.lower():
+                self._pause(0.3 * len(value))
+            self._pause(action_plan.get("delay", 0.0))
+            
+            # Mask password
+            if action_type == "type" and target == "password":
+                value = "********"
+            outcome = "error" if action_type == "error" else result["outcome"]
+            self._add_action(executed_actions, action_type, target, value, notes, outcome=outcome,
+                             duration=None if self.time_mode == "virtual" else duration)
+            
+            if result["navigates"]:
+                self.wait_ready()
+                self.targets.invalidate()
+        
+        # The page may have navigated before finishing the run; continue per step
+        for action_plan in run[len(results):]:
+            self._step_started = self._clock()
+            self._execute_action(action_plan, executed_actions)
+    
+    def _add_action(self, actions: List, action: str, target: str, value: str, notes: str,
+                    outcome: str = "ok", duration: float = None):
+        """Add action to log with its timestamp and duration on the log clock"""
+        now = self._clock()
+        if duration is None:
+            duration = now - self._step_started
+        self._step_started = now
+        elapsed = now - self._run_started
+        actions.append({
+            "step": len(actions) + 1,
+            "action": action,
+            "target": target,
+            "value": value,
+            "timestamp": f"{int(elapsed // 60):02d}:{elapsed % 60:06.3f}",
+            "notes": notes,
+            "t": now,
+            "duration": duration,
+            "outcome": outcome
+        })
+    
+    def reset(self):
+        """Return the session to a clean state between runs"""
+        self.driver.execute_script(
+            "try { window.localStorage.clear(); } catch (e) {}"
+            "try { window.sessionStorage.clear(); } catch (e) {}"
+        )
+        self.driver.delete_all_cookies()
+        self.driver.get("about:blank")
+    
+    def close(self):
+        """Close browser"""
+        if self.driver:
+            self.driver.quit()
+
+
+class BrowserPool:
+    """Keeps warm BrowserSimulator sessions alive and reuses them across runs
+    
+    At most size sessions are live. acquire() waits on a condition until a
+    session is idle or a slot is free, so a session that is discarded after
+    a crash or recycling lets a waiter launch a replacement.
+    """
+    
+    def __init__(self, size: int = 1, headless: bool = True, max_uses: int = 25, time_mode: str = "realtime",
+                 batch_js: bool = False):
+        self.size = max(1, size)
+        self.headless = headless
+        self.max_uses = max_uses
+        self.time_mode = time_mode
+        self.batch_js = batch_js
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._live = 0
+        self.stats = {
+            "launches": 0,
+            "reuses": 0,
+            "resets": 0,
+            "recycled": 0,
+            "crashed": 0,
+            "startup_time": 0.0,
+            "reset_time": 0.0
+        }
+    
+    def _launch(self) -> BrowserSimulator:
+        """Start a new Chrome session"""
+        start = time.perf_counter()
+        try:
+            with TRACER.span("chrome_startup", "browser"):
+                simulator = BrowserSimulator(headless=self.headless, time_mode=self.time_mode, batch_js=self.batch_js)
+        except Exception:
+            with self._available:
+                self._live -= 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self.stats["launches"] += 1
+            self.stats["startup_time"] += time.perf_counter() - start
+        return simulator
+    
+    def _discard(self, simulator: BrowserSimulator):
+        """Quit a session and free its slot"""
+        try:
+            simulator.close()
+        except Exception:
+            pass
+        with self._available:
+            self._live -= 1
+            self._available.notify()
+    
+    def acquire(self) -> BrowserSimulator:
+        """Get a clean session, launching one if the pool is not full yet"""
+        with self._available:
+            while not self._idle and self._live >= self.size:
+                self._available.wait()
+            if self._idle:
+                self.stats["reuses"] += 1
+                return self._idle.popleft()
+            self._live += 1
+        return self._launch()
+    
+    def release(self, simulator: BrowserSimulator, crashed: bool = False):
+        """Reset a session and put it back, or recycle it if worn out or broken"""
+        simulator.uses += 1
+        if not crashed and simulator.uses < self.max_uses:
+            start = time.perf_counter()
+            try:
+                with TRACER.span("session_reset", "browser"):
+                    simulator.reset()
+            except selenium_exceptions.WebDriverException:
+                crashed = True
+            else:
+                with self._available:
+                    self.stats["resets"] += 1
+                    self.stats["reset_time"] += time.perf_counter() - start
+                    self._idle.append(simulator)
+                    self._available.notify()
+                return
+        
+        with self._lock:
+            self.stats["crashed" if crashed else "recycled"] += 1
+        self._discard(simulator)
+    
+    @contextmanager
+    def session(self):
+        """Borrow a session for one run"""
+        simulator = self.acquire()
+        crashed = False
+        try:
+            yield simulator
+        except selenium_exceptions.WebDriverException:
+            crashed = True
+            raise
+        finally:
+            self.release(simulator, crashed=crashed)
+    
+    def report(self):
+        """Print startup vs. reuse timings"""
+        launches = self.stats["launches"]
+        reuses = self.stats["reuses"]
+        resets = self.stats["resets"]
+        avg_startup = self.stats["startup_time"] / launches if launches else 0.0
+        avg_reset = self.stats["reset_time"] / resets if resets else 0.0
+        print(f"\n   [POOL] {launches} launches (avg {avg_startup:.2f}s startup), "
+              f"{reuses} reuses (avg {avg_reset:.2f}s reset)")
+        print(f"   [POOL] Recycled: {self.stats['recycled']}, crashed: {self.stats['crashed']}")
+    
+    def close(self):
+        """Quit all idle sessions"""
+        with self._lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for simulator in idle:
+            self._discard(simulator)
+
+
+class ScreenshotStore:
+    """Deduplicated, compressed screenshot storage with off-thread encoding
+    
+    Captured PNG bytes are handed to submit() and decoded, hashed and
+    encoded (WebP, or PNG at a chosen compression level) on worker threads.
+    Frames are content-addressed by a 64-bit difference hash plus a pixel
+    digest, so identical frames (every "before" shot of one interface) are
+    stored once; max_distance > 0 also merges frames whose hashes differ by
+    at most that many bits. Frames in a sequence can be stored as deltas:
+    only the changed box against the previous frame. index-<pid>.jsonl maps
+    each screenshot name to its frame (one file per process, so browser
+    worker processes never share a file).
+    """
+    
+    FORMATS = ("webp", "png")
+    
+    def __init__(self, directory: str, fmt: str = "webp", quality: int = 80, compress_level: int = 6,
+                 max_distance: int = 0, workers: int = 2):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown screenshot format: {fmt}")
+        if fmt == "webp" and not features.check("webp"):
+            print("   [WARNING] Pillow has no WebP support, saving screenshots as PNG")
+            fmt = "png"
+        self.directory = directory
+        self.frames_dir = os.path.join(directory, "frames")
+        os.makedirs(self.frames_dir, exist_ok=True)
+        self.fmt = fmt
+        self.quality = quality
+        self.compress_level = compress_level
+        self.max_distance = max_distance
+        self.stats = {"frames": 0, "written": 0, "deduplicated": 0, "deltas": 0, "unchanged": 0, "bytes_in": 0, "bytes_out": 0}
+        self._hashes = []  # (phash, size, frame) for near-duplicate matching
+        self._claimed = set()  # frames this store has written or is writing
+        self._lock = threading.Lock()
+        self._last = {}  # sequence -> (name, future of its decoded image)
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="screenshots")
+        self._index = open(os.path.join(directory, f"index-{os.getpid()}.jsonl"), "a", encoding="utf-8")
+    
+    @staticmethod
+    def phash(image: Image.Image) -> int:
+        """64-bit difference hash of a 9x8 grayscale thumbnail"""
+        pixels = np.asarray(image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+        return int("".join("1" if bit else "0" for bit in bits), 2)
+    
+    def submit(self, name: str, png: bytes, sequence: str = None, delta: bool = False) -> Future:
+        """Queue one capture; with delta, store only what changed since the sequence's previous frame"""
+        previous = self._last.get(sequence) if delta and sequence else None
+        future = self._executor.submit(self._store, name, png, previous)
+        if sequence:
+            self._last[sequence] = (name, future)
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done()] + [future]
+        return future
+    
+    def end_sequence(self, sequence: str):
+        """Forget a sequence's previous frame"""
+        self._last.pop(sequence, None)
+    
+    def _store(self, name: str, png: bytes, previous) -> Image.Image:
+        """Worker: decode, dedup, encode and index one capture; returns the decoded image"""
+        image = Image.open(io.BytesIO(png)).convert("RGB")
+        entry = {"name": name, "width": image.width, "height": image.height}
+        frame_image = image
+        if previous:
+            base_name, base_future = previous
+            # Submitted earlier to the same FIFO pool, so it is already running or done
+            box = ImageChops.difference(base_future.result(), image).getbbox()
+            entry.update(delta_of=base_name, box=list(box) if box else None)
+            if box is None:
+                with self._lock:
+                    self.stats["frames"] += 1
+                    self.stats["unchanged"] += 1
+                    self.stats["bytes_in"] += len(png)
+                self._write_index(entry)
+                return image
+            frame_image = image.crop(box)
+        
+        phash = self.phash(frame_image)
+        digest = hashlib.sha1(frame_image.tobytes()).hexdigest()[:16]
+        frame = f"{phash:016x}-{digest}.{self.fmt}"
+        if self.max_distance:
+            with self._lock:
+                for other_hash, size, other_frame in self._hashes:
+                    if size == frame_image.size and bin(other_hash ^ phash).count("1") <= self.max_distance:
+                        frame = other_frame
+                        break
+                else:
+                    self._hashes.append((phash, frame_image.size, frame))
+        path = os.path.join(self.frames_dir, frame)
+        with self._lock:
+            # Claimed before encoding, so two workers never both write one frame
+            new = frame not in self._claimed and not os.path.exists(path)
+            self._claimed.add(frame)
+        
+        data = b""
+        if new:
+            buffer = io.BytesIO()
+            if self.fmt == "webp":
+                frame_image.save(buffer, "WEBP", quality=self.quality, method=4)
+            else:
+                frame_image.save(buffer, "PNG", compress_level=self.compress_level)
+            data = buffer.getvalue()
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        
+        entry.update(frame=f"frames/{frame}", phash=f"{phash:016x}")
+        with self._lock:
+            self.stats["frames"] += 1
+            self.stats["bytes_in"] += len(png)
+            self.stats["bytes_out"] += len(data)
+            self.stats["written" if data else "deduplicated"] += 1
+            if previous:
+                self.stats["deltas"] += 1
+        self._write_index(entry)
+        return image
+    
+    def _write_index(self, entry: Dict):
+        with self._lock:
+            self._index.write(json.dumps(entry) + "\n")
+    
+    def flush(self):
+        """Wait for queued captures; re-raises the first encoding error"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        with self._lock:
+            self._index.flush()
+    
+    def close(self):
+        """Finish queued work and close the index"""
+        if self._index.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+            self._index.close()
+    
+    def report(self):
+        """Print frame and storage counts"""
+        st = self.stats
+        print(f"\n   [SHOTS] {st['frames']} captures -> {st['written']} frames written, {st['deduplicated']} deduplicated, "
+              f"{st['deltas']} deltas, {st['unchanged']} unchanged ({self.fmt})")
+        if st["bytes_in"]:
+            print(f"   [SHOTS] {st['bytes_in'] / 1e6:.1f} MB captured -> {st['bytes_out'] / 1e6:.1f} MB stored")
+    
+    @staticmethod
+    def load_index(directory: str) -> Dict[str, Dict]:
+        """Latest index entry per screenshot name, across all processes"""
+        entries = {}
+        for filename in sorted(os.listdir(directory)):
+            if filename.startswith("index-") and filename.endswith(".jsonl"):
+                for entry in ResultsSink.load(os.path.join(directory, filename)):
+                    entries[entry["name"]] = entry
+        return entries
+    
+    @classmethod
+    def load(cls, directory: str, name: str, index: Dict[str, Dict] = None) -> Image.Image:
+        """Rebuild a screenshot, applying delta frames onto their base"""
+        index = index if index is not None else cls.load_index(directory)
+        entry = index[name]
+        if entry.get("delta_of") is None:
+            return Image.open(os.path.join(directory, entry["frame"])).convert("RGB")
+        image = cls.load(directory, entry["delta_of"], index).copy()
+        if entry.get("box"):
+            image.paste(Image.open(os.path.join(directory, entry["frame"])).convert("RGB"), tuple(entry["box"][:2]))
+        return image
+
+
+@lru_cache(maxsize=None)
+def _screenshot_store(directory: str, fmt: str = "webp", quality: int = 80, compress_level: int = 6,
+                      max_distance: int = 0) -> ScreenshotStore:
+    """One store per process and settings; flushed when the process exits"""
+    store = ScreenshotStore(directory, fmt=fmt, quality=quality, compress_level=compress_level, max_distance=max_distance)
+    multiprocessing.util.Finalize(store, store.close, exitpriority=20)
+    return store
+
+
+def simulate_cell(simulator: BrowserSimulator, job: Dict) -> Dict:
+    """Run one persona x interface cell on a borrowed simulator
+    
+    job["screenshots"] holds the capture settings: scope ("viewport" or a CSS
+    selector), steps (also capture a delta frame after every step) and the
+    ScreenshotStore options.
+    """
+    persona = job["persona"]
+    options = dict(job.get("screenshots") or {})
+    scope = options.pop("scope", "viewport")
+    capture_steps = options.pop("steps", False)
+    store = _screenshot_store(job["screenshots_dir"], **options)
+    name = f"{persona['id']}_{job['task']}" + (f"_r{job['repetition']}" if job.get("repetition") else "")
+    
+    simulator.load_page(job["file_path"], job.get("target_rules"))
+    store.submit(f"{name}_before", simulator.capture(scope), sequence=name)
+    if capture_steps:
+        simulator.on_step = lambda step: store.submit(f"{name}_step{step:03d}", simulator.capture(scope),
+                                                      sequence=name, delta=True)
+    
+    try:
+        # Execute the GPT-generated action plan
+        with TRACER.span("execute_actions", "browser", persona=persona['id'], task=job['task']):
+            executed_actions = simulator.execute_actions(job["action_plan"])
+    finally:
+        simulator.on_step = None
+    
+    simulator.wait_ready()
+    store.submit(f"{name}_after", simulator.capture(scope))
+    store.end_sequence(name)
+    return {"executed_actions": executed_actions, "stats": simulator.collect_stats()}
+
+
+# Per-process pool used when browser jobs run in a ProcessPoolExecutor
+_WORKER_POOL = None
+
+
+def _init_browser_worker(headless: bool, max_uses: int, time_mode: str, batch_js: bool, trace: bool = False):
+    """Start the browser pool of a worker process"""
+    global _WORKER_POOL
+    TRACER.enabled = trace
+    _WORKER_POOL = BrowserPool(size=1, headless=headless, max_uses=max_uses, time_mode=time_mode, batch_js=batch_js)
+    multiprocessing.util.Finalize(_WORKER_POOL, _WORKER_POOL.close, exitpriority=10)
+
+
+def _simulate_in_worker(job: Dict) -> Dict:
+    """Process pool entry point for one browser job"""
+    with _WORKER_POOL.session() as simulator:
+        result = simulate_cell(simulator, job)
+    # Spans recorded in this process travel back with the result
+    result["trace"] = TRACER.drain()
+    return result
+
+
+class SimulationScheduler:
+    """Runs the persona x interface matrix as a two-stage producer/consumer pipeline
+    
+    Planning (LLM) fills a bounded queue of ready plans and browser workers
+    drain it. Planning stops while the queue is full, so a slow browser stage
+    applies backpressure instead of piling up plans. Time-weighted stage
+    occupancy and queue depth are recorded so each stage can be sized.
+    Jobs that already carry an action_plan (replays) skip planning.
+    """
+    
+    def __init__(self, action_generator, browser_pool: BrowserPool, llm_workers: int = 4,
+                 browser_workers: int = 2, job_timeout: float = 300.0, use_processes: bool = True,
+                 stream_plans: bool = True, queue_size: int = None):
+        self.action_generator = action_generator
+        self.browser_pool = browser_pool
+        self.llm_workers = max(1, llm_workers)
+        self.browser_workers = max(1, browser_workers)
+        self.job_timeout = job_timeout
+        self.use_processes = use_processes
+        # Streamed plans are iterators and cannot cross a process boundary
+        self.stream_plans = stream_plans and not use_processes and hasattr(action_generator, "stream_actions")
+        # Plans in flight plus plans waiting for a browser never exceed this
+        self.queue_size = max(1, queue_size or 2 * self.browser_workers)
+        self.stats = {"jobs": 0, "completed": 0, "failed": 0, "timed_out": 0, "cancelled": 0, "elapsed": 0.0}
+        self.metrics = {}
+        self.first_action_latencies = []
+        self.interrupted = False
+        self._stop = threading.Event()
+    
+    def stop(self):
+        """Stop starting new jobs; jobs already in a browser finish normally (thread-safe)"""
+        self._stop.set()
+    
+    def _plan(self, job: Dict) -> List[Dict]:
+        """Generate the action plan for one job"""
+        with TRACER.span("plan", "generator", persona=job["persona"]["id"], task=job["task"]):
+            return self.action_generator.generate_actions(job["persona"], job["task"], job["task_description"],
+                                                          job.get("task_group"), seed=job.get("seed"))
+    
+    def _simulate_in_thread(self, job: Dict) -> Dict:
+        """Thread pool entry point for one browser job"""
+        with self.browser_pool.session() as simulator:
+            return simulate_cell(simulator, job)
+    
+    def _browser_executor(self):
+        """Executor for the browser stage"""
+        if self.use_processes:
+            return ProcessPoolExecutor(
+                max_workers=self.browser_workers,
+                initializer=_init_browser_worker,
+                initargs=(self.browser_pool.headless, self.browser_pool.max_uses,
+                          self.browser_pool.time_mode, self.browser_pool.batch_js, TRACER.enabled)
+            )
+        return ThreadPoolExecutor(max_workers=self.browser_workers)
+    
+    def run(self, jobs: List[Dict], on_result=None) -> List[Dict]:
+        """Run all jobs; results are returned in job order
+        
+        on_result(index, result) is called as soon as each job finishes or fails.
+        A KeyboardInterrupt (or stop()) drains the jobs already in a browser and
+        returns; jobs that never started are marked cancelled and not reported.
+        """
+        start = time.perf_counter()
+        results = [{"job": job, "action_plan": None, "executed_actions": [], "stats": {}, "error": None}
+                   for job in jobs]
+        # future -> (stage, job index, deadline); the deadline is None until a worker picks the job up
+        tracked = {}
+        hung = {}  # timed-out future -> stage; it holds its worker until it really ends
+        streams = {}  # job index -> ActionStream
+        unplanned = collections.deque(range(len(jobs)))
+        ready = collections.deque()  # (job index, plan) waiting for a browser
+        load = {"plan": 0, "browser": 0}
+        meter = {"plan_busy": 0.0, "browser_busy": 0.0, "queue_area": 0.0, "queue_max": 0,
+                 "producer_blocked": 0.0, "consumer_starved": 0.0}
+        last_tick = time.monotonic()
+        self.interrupted = False
+        self._stop.clear()
+        
+        def tick():
+            # Integrate stage occupancy and queue depth over the time since the last event
+            nonlocal last_tick
+            now = time.monotonic()
+            elapsed, last_tick = now - last_tick, now
+            meter["plan_busy"] += load["plan"] * elapsed
+            meter["browser_busy"] += load["browser"] * elapsed
+            meter["queue_area"] += len(ready) * elapsed
+            if unplanned and load["plan"] < self.llm_workers and load["plan"] + len(ready) >= self.queue_size:
+                meter["producer_blocked"] += elapsed
+            if load["browser"] < self.browser_workers and not ready and (unplanned or load["plan"]):
+                meter["consumer_starved"] += elapsed
+        
+        llm_pool = ThreadPoolExecutor(max_workers=self.llm_workers)
+        browser_pool = self._browser_executor()
+        runner = _simulate_in_worker if self.use_processes else self._simulate_in_thread
+        
+        def fill():
+            # Start browsers on queued plans, then top the queue up with new plans
+            while ready and load["browser"] < self.browser_workers and not self._stop.is_set():
+                index, plan = ready.popleft()
+                future = browser_pool.submit(runner, dict(jobs[index], action_plan=plan))
+                tracked[future] = ("browser", index, None)
+                load["browser"] += 1
+            
+            while (unplanned and not self._stop.is_set() and load["plan"] < self.llm_workers
+                   and load["plan"] + len(ready) < self.queue_size):
+                index = unplanned.popleft()
+                job = jobs[index]
+                if job.get("action_plan") is not None:
+                    # Recorded plans (replays) go straight to the browser stage
+                    results[index]["action_plan"] = job["action_plan"]
+                    ready.append((index, job["action_plan"]))
+                    continue
+                if self.stream_plans:
+                    # Planning and execution overlap: the browser starts on the first streamed step
+                    streams[index] = self.action_generator.stream_actions(job["persona"], job["task"], job["task_description"],
+                                                                          job.get("task_group"), seed=job.get("seed"))
+                    ready.append((index, streams[index]))
+                    continue
+                if getattr(self.action_generator, "async_client", None):
+                    # Concurrency is bounded by the async client's own limits; its futures never
+                    # report running, so their clock starts now
+                    future = self.action_generator.submit_actions(job["persona"], job["task"], job["task_description"],
+                                                                  job.get("task_group"), seed=job.get("seed"))
+                    tracked[future] = ("plan", index, time.monotonic() + self.job_timeout)
+                else:
+                    future = llm_pool.submit(self._plan, job)
+                    tracked[future] = ("plan", index, None)
+                load["plan"] += 1
+            
+            if ready and load["browser"] < self.browser_workers and not self._stop.is_set():
+                fill()
+            meter["queue_max"] = max(meter["queue_max"], len(ready))
+        
+        def start_clocks():
+            # A job's timeout counts from when a worker starts it, not from time spent in the executor's queue
+            now = time.monotonic()
+            for future, (stage, index, deadline) in list(tracked.items()):
+                if deadline is None and (future.running() or future.done()):
+                    tracked[future] = (stage, index, now + self.job_timeout)
+        
+        def waiting():
+            # Timed-out jobs only matter while queued work still needs their workers
+            return set(tracked) | (set(hung) if (unplanned or ready) and not self._stop.is_set() else set())
+        
+        try:
+            fill()
+            pending = waiting()
+            
+            while pending:
+                start_clocks()
+                timeout = min([tracked[f][2] for f in pending if f in tracked and tracked[f][2] is not None],
+                              default=time.monotonic() + 0.5) - time.monotonic()
+                # Wake up now and then to notice stop()
+                try:
+                    done, pending = wait(pending, timeout=min(max(0.0, timeout), 0.5), return_when=FIRST_COMPLETED)
+                except KeyboardInterrupt:
+                    if self.interrupted:
+                        raise
+                    print("\n   [SCHED] Interrupted: finishing jobs in progress (Ctrl+C again to abort)")
+                    self.interrupted = True
+                    self.stop()
+                    continue
+                tick()
+                
+                for future in done:
+                    if future in hung:
+                        # Its result was already reported as a timeout; only the worker comes back
+                        load[hung.pop(future)] -= 1
+                        continue
+                    stage, index, _ = tracked.pop(future)
+                    load[stage] -= 1
+                    result = results[index]
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        result["error"] = str(e) or type(e).__name__
+                    else:
+                        if stage == "browser":
+                            TRACER.extend(value.pop("trace", []))
+                            result.update(value)
+                        elif not value:
+                            result["error"] = "No actions generated"
+                    
+                    if index in streams:
+                        stream = streams.pop(index)
+                        result["action_plan"] = stream.actions
+                        if stream.first_action_latency is not None:
+                            self.first_action_latencies.append(stream.first_action_latency)
+                        if not stream.actions and not result["error"]:
+                            result["error"] = str(stream.error or "No actions generated")
+                    
+                    if stage == "plan" and not result["error"]:
+                        result["action_plan"] = value
+                        ready.append((index, value))
+                    elif on_result:
+                        on_result(index, result)
+                
+                now = time.monotonic()
+                start_clocks()
+                for future in [f for f in pending if f in tracked and tracked[f][2] is not None and tracked[f][2] <= now]:
+                    # A running job cannot be interrupted; its result is dropped, but it keeps
+                    # its worker busy until it ends, so no new job queues behind it on a fresh deadline
+                    stage, index, _ = tracked.pop(future)
+                    if future.cancel():
+                        load[stage] -= 1
+                    else:
+                        hung[future] = stage
+                    pending.discard(future)
+                    results[index]["error"] = f"Timed out after {self.job_timeout:.0f}s ({stage})"
+                    self.stats["timed_out"] += 1
+                    if on_result:
+                        on_result(index, results[index])
+                
+                fill()
+                pending = waiting()
+        finally:
+            abandon = bool(hung) or self.interrupted
+            llm_pool.shutdown(wait=not abandon, cancel_futures=True)
+            browser_pool.shutdown(wait=not abandon, cancel_futures=True)
+        
+        for index in list(unplanned) + [index for index, _ in ready]:
+            results[index]["error"] = "Cancelled before start"
+        
+        elapsed = time.perf_counter() - start
+        self.stats["jobs"] = len(jobs)
+        self.stats["cancelled"] = len(unplanned) + len(ready)
+        self.stats["failed"] = len([r for r in results if r["error"]]) - self.stats["cancelled"]
+        self.stats["completed"] = len(jobs) - self.stats["failed"] - self.stats["cancelled"]
+        self.stats["elapsed"] = elapsed
+        span = max(elapsed, 1e-9)
+        self.metrics = {
+            "llm_utilization": meter["plan_busy"] / (self.llm_workers * span),
+            "browser_utilization": meter["browser_busy"] / (self.browser_workers * span),
+            "queue_depth_avg": meter["queue_area"] / span,
+            "queue_depth_max": meter["queue_max"],
+            "queue_size": self.queue_size,
+            "producer_blocked": meter["producer_blocked"],
+            "consumer_starved": meter["consumer_starved"],
+        }
+        return results
+    
+    def throughput(self) -> float:
+        """Completed jobs per minute"""
+        if not self.stats["elapsed"]:
+            return 0.0
+        return self.stats["completed"] / self.stats["elapsed"] * 60
+    
+    def report(self):
+        """Print throughput and stage metrics"""
+        print(f"\n   [SCHED] {self.stats['completed']}/{self.stats['jobs']} jobs in {self.stats['elapsed']:.1f}s "
+              f"({self.throughput():.1f} jobs/min)")
+        print(f"   [SCHED] Failed: {self.stats['failed']}, timed out: {self.stats['timed_out']}, "
+              f"cancelled: {self.stats['cancelled']} "
+              f"| LLM workers: {self.llm_workers}, browser workers: {self.browser_workers} "
+              f"({'processes' if self.use_processes else 'threads'})")
+        if self.metrics:
+            m = self.metrics
+            # Streamed plans are generated inside the browser stage
+            llm = "streamed" if self.stream_plans else f"{m['llm_utilization']:.0%}"
+            print(f"   [SCHED] Utilization: LLM {llm}, browser {m['browser_utilization']:.0%} "
+                  f"| queue depth avg {m['queue_depth_avg']:.1f}, max {m['queue_depth_max']}/{m['queue_size']}")
+            print(f"   [SCHED] Planning blocked on a full queue {m['producer_blocked']:.1f}s, "
+                  f"browsers idle waiting for plans {m['consumer_starved']:.1f}s")
+        if self.first_action_latencies:
+            print(f"   [SCHED] Streamed plans: first action after "
+                  f"{sum(self.first_action_latencies) / len(self.first_action_latencies):.2f}s on average")
+
+
+class ResultsSink:
+    """Durable append-only sink for finished runs
+    
+    Every row is appended to a JSONL file as soon as its run finishes and
+    fsync'd in batches, so a crashed run keeps what it finished and can
+    resume. Rows can also be buffered into Parquet row groups (pyarrow).
+    """
+    
+    def __init__(self, path: str, fsync_every: int = 8, fsync_interval: float = 2.0,
+                 parquet_path: str = None, row_group_size: int = 1000):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self._drop_torn_tail(path)
+        self._file = open(path, "a", encoding="utf-8")
+        
+        self.parquet_path = parquet_path
+        self._parquet_rows = []
+        self._parquet_writer = None
+        if parquet_path and not PYARROW_AVAILABLE:
+            print("   [WARNING] pyarrow not installed, Parquet output disabled (pip install pyarrow)")
+            self.parquet_path = None
+    
+    @staticmethod
+    def _drop_torn_tail(path: str, block: int = 65536):
+        """Cut a half-written last line so appended rows start on a fresh line"""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(0, pos - block)
+                f.seek(start)
+                chunk = f.read(pos - start)
+                if pos == end and chunk.endswith(b"\n"):
+                    return
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    f.truncate(start + newline + 1)
+                    return
+                pos = start
+            f.truncate(0)
+    
+    @staticmethod
+    def load(path: str) -> List[Dict]:
+        """Read back every complete row; a torn last line from a crash is ignored"""
+        rows = []
+        if not os.path.exists(path):
+            return rows
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return rows
+    
+    def append(self, row: Dict):
+        """Write one finished run"""
+        with self._lock:
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.rows_written += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            
+            if self.parquet_path:
+                self._parquet_rows.append(row)
+                if len(self._parquet_rows) >= self.row_group_size:
+                    self._write_row_group()
+    
+    def _sync(self):
+        """Flush buffered rows to disk"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def _write_row_group(self):
+        """Write buffered rows as one Parquet row group"""
+        if not self._parquet_rows:
+            return
+        if self._parquet_writer is None:
+            table = pa.Table.from_pylist(self._parquet_rows)
+            self._parquet_writer = pq.ParquetWriter(self.parquet_path, table.schema)
+        else:
+            table = pa.Table.from_pylist(self._parquet_rows, schema=self._parquet_writer.schema)
+        self._parquet_writer.write_table(table)
+        self._parquet_rows = []
+    
+    def close(self):
+        """Sync and close all outputs"""
+        with self._lock:
+            self._sync()
+            self._file.close()
+            if self.parquet_path:
+                self._write_row_group()
+                if self._parquet_writer:
+                    self._parquet_writer.close()
+
+
+class StepStore:
+    """Append-only columnar store of every executed step
+    
+    Each column is a flat binary file of one fixed-width type under one
+    directory, appended run by run with array.tofile and read back with
+    numpy memmaps, so runs with hundreds of thousands of steps can be
+    aggregated in chunks without building a Python object per step.
+    Actions and outcomes are small enum codes; targets are interned strings.
+    """
+    
+    ACTIONS = ("look", "click", "type", "key", "wait", "error", "clear", "navigate", "other")
+    OUTCOMES = ("ok", "error", "missed", "failed")
+    COLUMNS = {
+        "run_id": "i",
+        "step": "i",
+        "action": "B",
+        "target": "i",
+        "t": "d",
+        "duration": "f",
+        "outcome": "B"
+    }
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.targets = self.load_targets(directory)
+        self._target_ids = {name: i for i, name in enumerate(self.targets)}
+        self._targets_dirty = False
+        self._lock = threading.Lock()
+        # A crash can leave columns of different lengths; cut them back to the shortest
+        rows = self.row_count(directory)
+        self._files = {}
+        for name in self.COLUMNS:
+            path = self.column_path(directory, name)
+            with open(path, "ab") as f:
+                f.truncate(rows * np.dtype(self.COLUMNS[name]).itemsize)
+            self._files[name] = open(path, "ab")
+    
+    @staticmethod
+    def column_path(directory: str, name: str) -> str:
+        return os.path.join(directory, f"{name}.bin")
+    
+    @classmethod
+    def row_count(cls, directory: str) -> int:
+        """Number of complete rows on disk"""
+        counts = []
+        for name, code in cls.COLUMNS.items():
+            path = cls.column_path(directory, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            counts.append(size // np.dtype(code).itemsize)
+        return min(counts)
+    
+    @staticmethod
+    def load_targets(directory: str) -> List[str]:
+        path = os.path.join(directory, "targets.json")
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    
+    @classmethod
+    def clear(cls, directory: str):
+        """Delete a stored step table"""
+        paths = [cls.column_path(directory, name) for name in cls.COLUMNS]
+        for path in paths + [os.path.join(directory, "targets.json")]:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _target_id(self, target) -> int:
+        target = str(target)
+        if target not in self._target_ids:
+            self._target_ids[target] = len(self.targets)
+            self.targets.append(target)
+            self._targets_dirty = True
+        return self._target_ids[target]
+    
+    def append_run(self, run_id: int, executed_actions: List[Dict]):
+        """Append every step of one run"""
+        action_codes = {name: i for i, name in enumerate(self.ACTIONS)}
+        outcome_codes = {name: i for i, name in enumerate(self.OUTCOMES)}
+        with self._lock:
+            columns = {name: array.array(code) for name, code in self.COLUMNS.items()}
+            for a in executed_actions:
+                columns["run_id"].append(run_id)
+                columns["step"].append(a["step"])
+                columns["action"].append(action_codes.get(a["action"], action_codes["other"]))
+                columns["target"].append(self._target_id(a.get("target", "")))
+                columns["t"].append(a.get("t", 0.0))
+                columns["duration"].append(a.get("duration", 0.0))
+                columns["outcome"].append(outcome_codes.get(a.get("outcome", "ok"), 0))
+            
+            if self._targets_dirty:
+                # Replaced atomically: a torn targets.json would make the whole store unreadable
+                path = os.path.join(self.directory, "targets.json")
+                with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(self.targets, f)
+                os.replace(f"{path}.tmp", path)
+                self._targets_dirty = False
+            for name, column in columns.items():
+                column.tofile(self._files[name])
+                self._files[name].flush()
+    
+    def close(self):
+        """Sync and close the column files"""
+        with self._lock:
+            for f in self._files.values():
+                os.fsync(f.fileno())
+                f.close()
+    
+    @classmethod
+    def load(cls, directory: str) -> Dict[str, np.ndarray]:
+        """Read-only memory maps of every column"""
+        rows = cls.row_count(directory) if os.path.isdir(directory) else 0
+        columns = {}
+        for name, code in cls.COLUMNS.items():
+            if rows:
+                columns[name] = np.memmap(cls.column_path(directory, name), dtype=code, mode="r", shape=(rows,))
+            else:
+                columns[name] = np.zeros(0, dtype=code)
+        return columns
+    
+    @classmethod
+    def iter_chunks(cls, directory: str, chunk_rows: int = 1_000_000):
+        """Yield the table in bounded slices of column arrays"""
+        columns = cls.load(directory)
+        rows = len(columns["run_id"])
+        for start in range(0, rows, chunk_rows):
+            yield {name: np.asarray(column[start:start + chunk_rows]) for name, column in columns.items()}
+
+
+def _content_hash(*parts) -> str:
+    """Stable SHA-256 over JSON-serialisable values and raw bytes"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cell_seed(seed: int, persona_id: str, task: str, repetition: int = 0) -> int:
+    """Seed of one persona x interface x repetition cell, derived from the run seed"""
+    return int(_content_hash(seed, persona_id, task, repetition)[:8], 16)
+
+
+# Wall-clock fields of a logged step; a log without them is comparable across time modes
+LOG_TIMING_FIELDS = ("t", "duration", "timestamp")
+
+
+def action_log_bytes(executed_actions: List[Dict], timing: bool = True) -> bytes:
+    """Canonical JSONL of an action log, the form replays are compared in"""
+    return "".join(json.dumps({k: v for k, v in action.items() if timing or k not in LOG_TIMING_FIELDS},
+                              sort_keys=True, ensure_ascii=False) + "\n"
+                   for action in executed_actions).encode("utf-8")
+
+
+class RunManifest:
+    """Records finished steps with the content hashes of their inputs
+    
+    A step counts as done only while its input hash still matches, so
+    reruns skip finished work and redo only what went stale. Simulation
+    cells are not tracked here: the runs JSONL is their checkpoint, since
+    each row (with its input_hash) is on disk as soon as the cell ends.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {"steps": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.data.update(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                print(f"   [WARNING] Ignoring unreadable manifest: {path}")
+        # Older manifests also held a cell table; the runs JSONL replaced it
+        self.data.pop("cells", None)
+    
+    def step_done(self, step: str, input_hash: str) -> bool:
+        """True if the step finished with the same inputs"""
+        return self.data["steps"].get(step, {}).get("input_hash") == input_hash
+    
+    def mark_step(self, step: str, input_hash: str, **info):
+        """Record a finished step and save"""
+        self.data["steps"][step] = dict(info, input_hash=input_hash, finished=datetime.now().isoformat(timespec="seconds"))
+        self.save()
+    
+    def save(self):
+        """Write atomically"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class DashboardFeed:
+    """Paged, pre-aggregated run data for the web dashboard, written as runs finish
+    
+    The directory holds summary.json (persona x task aggregates),
+    rows-NNNNN.json pages of page_rows detail rows, and index.json listing
+    the pages. A full page never changes again, so the dashboard fetches it
+    once. Only the last page and the two small files are rewritten, at most
+    every min_interval seconds. Each file is replaced atomically, and the
+    index is written last so that it only lists pages already on disk.
+    """
+    
+    COLUMNS = ("run_id", "persona_id", "persona_label", "task", "task_label", "steps_count", "errors", "success",
+               "actions")
+    
+    def __init__(self, directory: str, page_rows: int = 1000, min_interval: float = 1.0):
+        self.directory = directory
+        self.page_rows = page_rows
+        self.min_interval = min_interval
+        self.rows = 0
+        self.version = 0
+        self.groups = {}
+        self._page = []
+        self._pages = []
+        self._published = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # The feed is rebuilt from the run log each run; stale pages must not linger
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(directory, name))
+    
+    def add(self, row: Dict):
+        """Add one finished run; publishes if the last publish is old enough"""
+        with self._lock:
+            self._page.append([row.get(column) for column in self.COLUMNS])
+            group = self.groups.setdefault((row["persona_label"], row["task_label"]),
+                                           {"runs": 0, "steps": 0, "errors": 0, "successes": 0})
+            group["runs"] += 1
+            group["steps"] += row["steps_count"]
+            group["errors"] += row["errors"]
+            group["successes"] += row["success"]
+            self.rows += 1
+            if len(self._page) == self.page_rows:
+                self._write(self._page_name(len(self._pages)), {"columns": self.COLUMNS, "rows": self._page})
+                self._pages.append(len(self._page))
+                self._page = []
+            if time.monotonic() - self._published >= self.min_interval:
+                self._publish("running")
+    
+    def close(self):
+        """Publish the final state"""
+        with self._lock:
+            self._publish("finished")
+    
+    @staticmethod
+    def _page_name(number: int) -> str:
+        return f"rows-{number:05d}.json"
+    
+    def _write(self, name: str, data: Dict):
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+    
+    def _publish(self, status: str):
+        self.version += 1
+        pages = [{"file": self._page_name(i), "rows": rows} for i, rows in enumerate(self._pages)]
+        if self._page:
+            pages.append({"file": self._page_name(len(self._pages)), "rows": len(self._page)})
+            self._write(pages[-1]["file"], {"columns": self.COLUMNS, "rows": self._page})
+        successes = sum(group["successes"] for group in self.groups.values())
+        self._write("summary.json", {
+            "version": self.version,
+            "rows": self.rows,
+            "success_rate": round(successes / self.rows, 4) if self.rows else None,
+            "groups": [dict(group, persona_label=persona, task_label=task)
+                       for (persona, task), group in self.groups.items()]
+        })
+        self._write("index.json", {"version": self.version, "status": status, "rows": self.rows,
+                                   "page_rows": self.page_rows, "columns": self.COLUMNS, "pages": pages,
+                                   "updated": datetime.now().isoformat(timespec="seconds")})
+        self._published = time.monotonic()
+
+
+class _DashboardHandler(SimpleHTTPRequestHandler):
+    """The dashboard's static files, plus /events: a server-sent event each time the feed index changes
+    
+    Only what the page loads is served; the rest of the project directory
+    (response cache, configs, run data) answers 404.
+    """
+    
+    PUBLIC_FILES = ("/", "/index.html", "/data/simpersonas.json", "/data/simpersona_actions.csv")
+    PUBLIC_DIRS = ("/assets/", "/data/persona_cards/", "/data/interfaces/")
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _public(self, path: str) -> bool:
+        path = posixpath.normpath(urllib.parse.unquote(path.split("?", 1)[0].split("#", 1)[0]))
+        if path in self.PUBLIC_FILES:
+            return True
+        dirs = self.PUBLIC_DIRS + (self.server.feed_prefix,)
+        return any(path.startswith(prefix) for prefix in dirs)
+    
+    def list_directory(self, path):
+        self.send_error(404)
+    
+    def do_HEAD(self):
+        if not self._public(self.path):
+            return self.send_error(404)
+        return super().do_HEAD()
+    
+    def do_GET(self):
+        if self.path.split("?")[0] != "/events":
+            if not self._public(self.path):
+                return self.send_error(404)
+            return super().do_GET()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        last, idle = None, 0.0
+        try:
+            while not self.server.stopping.is_set():
+                try:
+                    changed = os.stat(self.server.index_path).st_mtime_ns
+                except OSError:
+                    changed = None
+                if changed is not None and changed != last:
+                    with open(self.server.index_path, encoding="utf-8") as f:
+                        index = f.read()
+                    self.wfile.write(f"event: index\ndata: {index}\n\n".encode("utf-8"))
+                    last, idle = changed, 0.0
+                elif idle >= 15.0:
+                    # Keeps proxies and the browser from dropping a quiet connection
+                    self.wfile.write(b": ping\n\n")
+                    idle = 0.0
+                self.wfile.flush()
+                self.server.stopping.wait(0.5)
+                idle += 0.5
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class DashboardServer:
+    """Local HTTP server for index.html that pushes DashboardFeed updates while a run is in progress"""
+    
+    def __init__(self, root: str, port: int = 8000, feed_dir: str = "data/dashboard"):
+        handler = lambda *args, **kwargs: _DashboardHandler(*args, directory=root, **kwargs)
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.server.stopping = threading.Event()
+        self.server.index_path = os.path.join(root, feed_dir, "index.json")
+        self.server.feed_prefix = f"/{feed_dir.strip('/')}/"
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/index.html"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    
+    def start(self) -> "DashboardServer":
+        self._thread.start()
+        return self
+    
+    def close(self):
+        self.server.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ReportEngine:
+    """Vectorized persona x task analytics over the run table and the step store
+    
+    The step store is read once, in bounded chunks, and reduced with
+    np.bincount into per-run totals; every table is then grouped from
+    those per-run arrays, so memory grows with runs rather than steps.
+    """
+    
+    PERCENTILES = (50, 90, 95)
+    
+    def __init__(self, runs: pd.DataFrame, steps_dir: str, bootstrap: int = 1000,
+                 seed: int = 0, chunk_rows: int = 1_000_000):
+        self.runs = runs.reset_index(drop=True)
+        self.steps_dir = steps_dir
+        self.bootstrap = bootstrap
+        self.rng = np.random.default_rng(seed)
+        self.chunk_rows = chunk_rows
+    
+    def _scan_steps(self) -> pd.DataFrame:
+        """One pass over the step store: per-run step count, duration and outcome counts"""
+        runs = self.runs
+        run_ids = runs["run_id"].fillna(-1).astype(np.int64).to_numpy() if "run_id" in runs else np.full(len(runs), -1)
+        size = int(run_ids.max()) + 1 if len(run_ids) else 0
+        # Row position of each run id; -1 for orphaned steps of replaced runs
+        position = np.full(size, -1, dtype=np.int64)
+        position[run_ids[run_ids >= 0]] = np.flatnonzero(run_ids >= 0)
+        
+        targets = StepStore.load_targets(self.steps_dir)
+        n_outcomes = len(StepStore.OUTCOMES)
+        error_code = StepStore.ACTIONS.index("error")
+        steps = np.zeros(len(runs), dtype=np.int64)
+        duration = np.zeros(len(runs))
+        outcomes = np.zeros(len(runs) * n_outcomes, dtype=np.int64)
+        error_targets = np.zeros(len(runs) * max(1, len(targets)), dtype=np.int64)
         
-        # Goals
-        draw.text((20, y), "Goals:", fill='#1f2937', font=header_font)
-        y += 20
-        for goal in persona['behavior']['goals'][:3]:
-            wrapped = textwrap.fill(f"- {goal}", width=50)
-            for line in wrapped.split('\n'):
-                draw.text((25, y), line, fill='#4b5563', font=body_font)
-                y += 15
+        for chunk in StepStore.iter_chunks(self.steps_dir, self.chunk_rows):
+            rid = chunk["run_id"].astype(np.int64)
+            keep = (rid >= 0) & (rid < size)
+            pos = position[rid[keep]]
+            valid = pos >= 0
+            pos = pos[valid]
+            if not len(pos):
+                continue
+            steps += np.bincount(pos, minlength=len(runs))
+            duration += np.bincount(pos, weights=chunk["duration"][keep][valid], minlength=len(runs))
+            outcomes += np.bincount(pos * n_outcomes + chunk["outcome"][keep][valid],
+                                    minlength=len(outcomes))
+            is_error = chunk["action"][keep][valid] == error_code
+            error_targets += np.bincount(pos[is_error] * max(1, len(targets)) + chunk["target"][keep][valid][is_error],
+                                         minlength=len(error_targets))
         
-        y += 10
-        # Frustrations
-        draw.text((20, y), "Frustrations:", fill='#1f2937', font=header_font)
-        y += 20
-        for frust in persona['behavior']['frustrations'][:3]:
-            wrapped = textwrap.fill(f"- {frust}", width=50)
-            for line in wrapped.split('\n'):
-                draw.text((25, y), line, fill='#4b5563', font=body_font)
-                y += 15
+        per_run = pd.DataFrame({
+            "persona_label": runs["persona_label"],
+            "task_label": runs["task_label"],
+            # Runs recorded before the step store existed fall back to their summary row
+            "steps": np.where(steps > 0, steps, runs["steps_count"].to_numpy()),
+            "duration": duration,
+            "errors": runs["errors"].to_numpy(),
+            "success": runs["success"].to_numpy(dtype=float)
+        })
+        for i, name in enumerate(StepStore.OUTCOMES):
+            per_run[f"outcome_{name}"] = outcomes[i::n_outcomes]
+        self._error_targets = error_targets.reshape(len(runs), max(1, len(targets)))
+        self._target_names = targets or [""]
+        return per_run
+    
+    def _bootstrap_ci(self, values: np.ndarray):
+        """95% percentile-bootstrap interval of the mean"""
+        if len(values) < 2:
+            mean = float(values.mean()) if len(values) else float("nan")
+            return mean, mean
+        means = np.empty(self.bootstrap)
+        # Resample in blocks so very large groups stay memory-bounded
+        block = max(1, 2_000_000 // len(values))
+        for start in range(0, self.bootstrap, block):
+            stop = min(self.bootstrap, start + block)
+            idx = self.rng.integers(0, len(values), size=(stop - start, len(values)))
+            means[start:stop] = values[idx].mean(axis=1)
+        low, high = np.percentile(means, [2.5, 97.5])
+        return float(low), float(high)
+    
+    def _group_table(self, per_run: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        grouped = per_run.groupby(keys, sort=False)
+        table = grouped.agg(
+            avg_steps=("steps", "mean"),
+            total_errors=("errors", "sum"),
+            success_rate=("success", "mean"),
+            runs=("steps", "size"),
+            avg_duration=("duration", "mean")
+        )
+        for q in self.PERCENTILES:
+            table[f"steps_p{q}"] = grouped["steps"].quantile(q / 100)
+            table[f"duration_p{q}"] = grouped["duration"].quantile(q / 100)
+        for name in StepStore.OUTCOMES:
+            table[f"{name}_steps"] = grouped[f"outcome_{name}"].sum()
         
-        img.save(output_path)
+        success_ci = []
+        steps_ci = []
+        for _, index in grouped.indices.items():
+            success_ci.append(self._bootstrap_ci(per_run["success"].to_numpy()[index]))
+            steps_ci.append(self._bootstrap_ci(per_run["steps"].to_numpy(dtype=float)[index]))
+        table["success_ci_low"], table["success_ci_high"] = zip(*success_ci)
+        table["steps_ci_low"], table["steps_ci_high"] = zip(*steps_ci)
+        for column in ("success_rate", "success_ci_low", "success_ci_high"):
+            table[column] = (table[column] * 100).round(1)
+        return table.reset_index()
+    
+    def compute(self) -> Dict[str, pd.DataFrame]:
+        """Persona, persona x task and error-type tables"""
+        per_run = self._scan_steps()
+        
+        # Error-type breakdown: planned error actions by target, per persona x task
+        cell_codes, cells = pd.MultiIndex.from_frame(per_run[["persona_label", "task_label"]]).factorize()
+        sums = np.zeros((len(cells), self._error_targets.shape[1]), dtype=np.int64)
+        np.add.at(sums, cell_codes, self._error_targets)
+        nonzero = np.nonzero(sums)
+        errors = pd.DataFrame({
+            "persona_label": cells.get_level_values(0)[nonzero[0]],
+            "task_label": cells.get_level_values(1)[nonzero[0]],
+            "error_target": np.array(self._target_names, dtype=object)[nonzero[1]],
+            "count": sums[nonzero]
+        })
+        
+        return {
+            "persona": self._group_table(per_run, ["persona_label"]),
+            "cells": self._group_table(per_run, ["persona_label", "task_label"]),
+            "errors": errors
+        }
 
 
-class BrowserSimulator:
-    """Simulates persona interactions with HTML"""
+class ReportExporter:
+    """Base class for report output formats"""
     
-    def __init__(self, headless=False):
-        chrome_options = Options()
-        if headless:
-            chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
+    name = ""
+    
+    def export(self, tables: Dict[str, pd.DataFrame], detail: pd.DataFrame, output_dir: str) -> List[str]:
+        """Write the report tables and detail rows; returns the written paths"""
+        raise NotImplementedError
+
+
+class LegacyExcelExporter(ReportExporter):
+    """The original pandas + openpyxl workbook (kept for comparison)"""
+    
+    name = "openpyxl"
+    
+    def export(self, tables, detail, output_dir):
+        path = os.path.join(output_dir, "SimPersona_Analysis.xlsx")
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            for sheet, table in tables.items():
+                table.to_excel(writer, sheet_name=sheet, index=False)
+            detail.to_excel(writer, sheet_name='Detailed Actions', index=False)
+        return [path]
+
+
+class StreamingExcelExporter(ReportExporter):
+    """Constant-memory xlsx: rows are streamed to disk as they are written
+    
+    Uses xlsxwriter's constant_memory mode, or openpyxl's write-only
+    workbook when xlsxwriter is not installed.
+    """
+    
+    name = "xlsx"
+    
+    @staticmethod
+    def _rows(frame: pd.DataFrame):
+        yield list(frame.columns)
+        for row in frame.itertuples(index=False, name=None):
+            yield [None if isinstance(v, float) and v != v else (v.item() if hasattr(v, "item") else v) for v in row]
+    
+    def export(self, tables, detail, output_dir):
+        path = os.path.join(output_dir, "SimPersona_Analysis.xlsx")
+        sheets = list(tables.items()) + [('Detailed Actions', detail)]
+        if XLSXWRITER_AVAILABLE:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+            for sheet, frame in sheets:
+                worksheet = workbook.add_worksheet(sheet)
+                for r, row in enumerate(self._rows(frame)):
+                    worksheet.write_row(r, 0, row)
+            workbook.close()
+        else:
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            for sheet, frame in sheets:
+                worksheet = workbook.create_sheet(sheet)
+                for row in self._rows(frame):
+                    worksheet.append(row)
+            workbook.save(path)
+        return [path]
+
+
+class ParquetExporter(ReportExporter):
+    """One Parquet file per table for machine use"""
+    
+    name = "parquet"
+    
+    def export(self, tables, detail, output_dir):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow not installed. Run: pip install pyarrow")
+        report_dir = os.path.join(output_dir, "reports")
+        os.makedirs(report_dir, exist_ok=True)
+        paths = []
+        for sheet, frame in list(tables.items()) + [('Detailed Actions', detail)]:
+            path = os.path.join(report_dir, sheet.lower().replace(' ', '_') + ".parquet")
+            pa_table = pa.Table.from_pandas(frame, preserve_index=False)
+            pq.write_table(pa_table, path, row_group_size=100_000)
+            paths.append(path)
+        return paths
+
+
+class ChunkedCsvExporter(ReportExporter):
+    """Summary tables as CSV plus the detail rows split into fixed-size CSV parts"""
+    
+    name = "csv"
+    
+    def __init__(self, chunk_rows: int = 50_000):
+        self.chunk_rows = chunk_rows
+    
+    def export(self, tables, detail, output_dir):
+        report_dir = os.path.join(output_dir, "reports")
+        os.makedirs(report_dir, exist_ok=True)
+        paths = []
+        for sheet, frame in tables.items():
+            path = os.path.join(report_dir, sheet.lower().replace(' ', '_') + ".csv")
+            frame.to_csv(path, index=False)
+            paths.append(path)
+        for part, start in enumerate(range(0, max(1, len(detail)), self.chunk_rows)):
+            path = os.path.join(report_dir, f"detailed_actions-{part:05d}.csv")
+            detail.iloc[start:start + self.chunk_rows].to_csv(path, index=False)
+            paths.append(path)
+        return paths
+
+
+REPORT_EXPORTERS = {
+    exporter.name: exporter
+    for exporter in (StreamingExcelExporter, LegacyExcelExporter, ParquetExporter, ChunkedCsvExporter)
+}
+
+
+def benchmark_exporters(rows: int = 50_000, formats=None):
+    """Time each exporter (and peak Python memory) on a synthetic detail table of the given size"""
+    import tempfile, tracemalloc
+    
+    rng = np.random.default_rng(0)
+    labels = ["Novice User", "Expert User", "Distracted User", "Accessibility User"]
+    tasks = ["Login Form", "Checkout Form", "Profile Update"]
+    steps = rng.integers(6, 16, rows)
+    detail = pd.DataFrame({
+        "run_id": np.arange(rows),
+        "persona_id": [f"persona_{i % 4000:05d}" for i in range(rows)],
+        "persona_label": [labels[i % 4] for i in range(rows)],
+        "task": [tasks[i % 3].split()[0].lower() for i in range(rows)],
+        "task_label": [tasks[i % 3] for i in range(rows)],
+        "steps_count": steps,
+        "errors": rng.integers(0, 4, rows),
+        "success": rng.integers(0, 2, rows),
+        "actions": ["look(page); click(username_field); type(username) ... +8 more"] * rows,
+        "estimated_time": steps * 2.5
+    })
+    with tempfile.TemporaryDirectory() as steps_dir:
+        tables = ReportEngine(detail, steps_dir, bootstrap=200).compute()
+    sheets = {'Summary': tables["persona"], 'Persona x Task': tables["cells"], 'Error Types': tables["errors"]}
+    
+    print(f"\n[BENCH] Report export, {rows:,} detail rows")
+    print("   " + "-" * 56)
+    print(f"   {'Format':<12} {'Seconds':>10} {'Peak MB':>10} {'Output MB':>10}")
+    print("   " + "-" * 56)
+    results = {}
+    for name in formats or list(REPORT_EXPORTERS):
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                paths = REPORT_EXPORTERS[name]().export(sheets, detail, output_dir)
+                elapsed = time.perf_counter() - start
+                size = sum(os.path.getsize(p) for p in paths) / 1e6
+            # Separate pass for memory: tracing slows the exporters down
+            with tempfile.TemporaryDirectory() as output_dir:
+                tracemalloc.start()
+                REPORT_EXPORTERS[name]().export(sheets, detail, output_dir)
+                peak = tracemalloc.get_traced_memory()[1] / 1e6
+                tracemalloc.stop()
+        except ImportError as e:
+            print(f"   {name:<12} skipped: {e}")
+            continue
+        results[name] = {"seconds": elapsed, "peak_mb": peak, "output_mb": size}
+        print(f"   {name:<12} {elapsed:>10.2f} {peak:>10.1f} {size:>10.1f}")
+    
+    baseline = results.get("openpyxl")
+    if baseline:
+        for name, result in results.items():
+            if name != "openpyxl":
+                print(f"   {name}: {baseline['seconds'] / max(result['seconds'], 1e-9):.1f}x faster than openpyxl")
+    return results
+
+
+def _no_api_key(messages) -> str:
+    """FakeChatClient responder for runs without an API key"""
+    raise RuntimeError("No OpenAI API key, and this request is not in the response cache (set OPENAI_API_KEY)")
+
+
+class FakeChatClient:
+    """Offline stand-in for the OpenAI client, for benchmarks and dry runs
+    
+    Answers chat.completions.create() (blocking, optionally streamed) with
+    generated personas or action plans derived from the prompt, after an
+    optional simulated latency. Pass a responder(messages) -> str for
+    canned responses.
+    """
+    
+    WORDS = ("patient", "curious", "hurried", "careful", "skeptical", "organised", "mobile", "keyboard", "mouse",
+             "forms", "errors", "labels", "deadlines", "commute", "family", "budget", "privacy", "speed")
+    
+    def __init__(self, latency: float = 0.0, responder=None, chunk_size: int = 40):
+        self.latency = latency
+        self.responder = responder or self.generate
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, model="gpt-4", messages=(), stream=False, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.responder(messages)
+        # Estimated counts; the system prompt stands in for the provider-cached prefix after the first call
+        usage = SimpleNamespace(prompt_tokens=sum(_estimate_tokens(m["content"]) for m in messages),
+                                completion_tokens=_estimate_tokens(content),
+                                prompt_tokens_details=SimpleNamespace(
+                                    cached_tokens=_estimate_tokens(messages[0]["content"]) if self.calls > 1 else 0))
+        if stream:
+            chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + self.chunk_size]))],
+                                      usage=None) for i in range(0, len(content), self.chunk_size)]
+            if (kwargs.get("stream_options") or {}).get("include_usage"):
+                chunks.append(SimpleNamespace(choices=[], usage=usage))
+            return iter(chunks)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+    
+    @classmethod
+    def generate(cls, messages) -> str:
+        """A plausible response, seeded by the prompt so reruns match"""
+        prompt = messages[-1]["content"]
+        rng = random.Random(prompt)
+        if "persona" in messages[0]["content"].lower():
+            words = lambda n: " ".join(rng.choice(cls.WORDS) for _ in range(n))
+            return json.dumps({
+                "age": rng.randint(18, 65), "gender": rng.choice(["male", "female", "non-binary"]),
+                "location": rng.choice(["Canada", "Kenya", "India", "Brazil", "Germany"]),
+                "occupation": rng.choice(["Nurse", "Teacher", "Developer", "Chef", "Accountant"]),
+                "tech_experience": rng.choice(["Low", "Medium", "High"]),
+                "description": f"{words(12)}. {words(10)}.",
+                "goals": [words(4) for _ in range(3)],
+                "frustrations": [words(4) for _ in range(3)],
+                "preferred_actions": [words(3) for _ in range(3)]
+            })
         
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.wait = WebDriverWait(self.driver, 10)
+        if re.search(r"^TASKS:", prompt, re.MULTILINE):
+            tasks = re.findall(r"^- (\w+): (.*)$", prompt.split("TASKS:", 1)[1], re.MULTILINE)
+            return "```json\n" + json.dumps({task: cls._plan(description) for task, description in tasks}, indent=2) + "\n```"
+        match = re.search(r"^TASK: (.*)$", prompt, re.MULTILINE)
+        return "```json\n" + json.dumps(cls._plan(match.group(1) if match else ""), indent=2) + "\n```"
     
-    def load_page(self, file_path: str):
-        """Load HTML file"""
-        abs_path = os.path.abspath(file_path)
-        self.driver.get(f"file://{abs_path}")
-        time.sleep(1)
+    @staticmethod
+    def _plan(task_description: str) -> List[Dict]:
+        actions = [{"action": "look", "target": "page", "value": "", "notes": "Reading page", "delay": 1.0}]
+        for target, value in MarkovActionGenerator.task_fields(task_description):
+            actions.append({"action": "click", "target": _canonical_target(f"{target}_field") or target,
+                            "value": "", "notes": f"Clicked {target}", "delay": 0.5})
+            actions.append({"action": "type", "target": target, "value": value, "notes": f"Typing {target}", "delay": 0.0})
+        actions.append({"action": "click", "target": "button", "value": "", "notes": "Submit", "delay": 0.5})
+        return actions
+
+
+def _bench(results: Dict, name: str, items: int, func, repeat: int = 3):
+    """Time func() and record seconds, per-item milliseconds and throughput; returns its result
     
-    def take_screenshot(self, path: str):
-        """Capture screenshot"""
-        self.driver.save_screenshot(path)
+    Takes the best of at least `repeat` runs, repeating short benchmarks
+    (up to 20 runs, half a second in total) to keep noise down.
+    """
+    elapsed = float("inf")
+    spent = 0.0
+    runs = 0
+    while runs < repeat or (repeat > 1 and runs < 20 and spent < 0.5):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            value = func()
+        took = time.perf_counter() - start
+        elapsed = min(elapsed, took)
+        spent += took
+        runs += 1
+    results[name] = {"seconds": round(elapsed, 4), "items": items,
+                     "per_item_ms": round(elapsed / max(items, 1) * 1000, 4),
+                     "per_second": round(items / max(elapsed, 1e-9), 2)}
+    print(f"   {name:<36} {items:>8,} {elapsed:>10.3f}s {results[name]['per_item_ms']:>10.3f} ms/item")
+    return value
+
+
+def run_benchmarks(sizes=(40, 400), interfaces_dir: str = "data/interfaces", output: str = "data/benchmark.json",
+                   baseline: str = "data/benchmark_baseline.json", save_baseline: bool = False,
+                   tolerance: float = 0.25, llm_latency: float = 0.0) -> bool:
+    """Benchmark the pipeline offline at several matrix sizes (personas x the interface pages)
     
-    def execute_actions(self, actions: List[Dict]) -> List[Dict]:
-        """Execute GPT-generated action sequence"""
-        executed_actions = []
+    Covers persona generation and planning through FakeChatClient, card
+    rendering, report computation and export, and, when Chrome can start,
+    headless action execution on the local interface pages. Results are
+    written as JSON and compared with the stored baseline; returns False
+    if anything got slower than the baseline by more than tolerance.
+    """
+    import tempfile
+    
+    results = {}
+    interfaces = InterfaceRegistry(interfaces_dir).scan()
+    print(f"\n[BENCH] Pipeline benchmark, matrix sizes {', '.join(str(n) for n in sizes)} personas x {len(interfaces)} tasks")
+    print("   " + "-" * 76)
+    for size in sizes:
+        client = FakeChatClient(latency=llm_latency)
+        with redirect_stdout(io.StringIO()):
+            persona_generator = PersonaGenerator(None, client=client)
+            action_generator = ActionGenerator(None, client=client, interfaces=interfaces)
+            local_planner = MarkovActionGenerator(interfaces=interfaces)
         
-        try:
-            for action_plan in actions:
-                action_type = action_plan.get("action", "")
-                target = action_plan.get("target", "")
-                value = action_plan.get("value", "")
-                notes = action_plan.get("notes", "")
-                delay = action_plan.get("delay", 0.0)
-                
-                # Execute based on action type
-                if action_type == "look":
-                    time.sleep(delay)
-                    self._add_action(executed_actions, "look", target, value, notes)
-                
-                elif action_type == "click":
-                    if target == "username_field":
-                        elem = self.driver.find_elements(By.TAG_NAME, "input")[0]
-                        elem.click()
-                    elif target == "password_field":
-                        elem = self.driver.find_elements(By.TAG_NAME, "input")[1]
-                        elem.click()
-                    elif target == "name_field":
-                        elem = self.driver.find_elements(By.TAG_NAME, "input")[0]
-                        elem.click()
-                    elif target == "address_field":
-                        elem = self.driver.find_elements(By.TAG_NAME, "input")[1]
-                        elem.click()
-                    elif target == "button":
-                        elem = self.driver.find_element(By.TAG_NAME, "button")
-                        elem.click()
-                    elif target == "signup_link":
-                        try:
-                            elem = self.driver.find_element(By.LINK_TEXT, "Sign up")
-                            elem.click()
-                        except:
-                            pass
-                    
-                    time.sleep(delay)
-                    self._add_action(executed_actions, "click", target, value, notes)
-                
-                elif action_type == "type":
-                    if target in ["username", "password", "name", "address"]:
-                        # Type character by character if delay specified
-                        if "slowly" in notes.lower():
-                            for char in value:
-                                self.driver.switch_to.active_element.send_keys(char)
-                                time.sleep(0.3)
-                        else:
-                            self.driver.switch_to.active_element.send_keys(value)
-                    
-                    time.sleep(delay)
-                    # Mask password
-                    display_value = "********" if target == "password" else value
-                    self._add_action(executed_actions, "type", target, display_value, notes)
-                
-                elif action_type == "key":
-                    if target == "tab":
-                        self.driver.switch_to.active_element.send_keys(Keys.TAB)
-                    elif target == "enter":
-                        self.driver.switch_to.active_element.send_keys(Keys.RETURN)
-                    
-                    time.sleep(delay)
-                    self._add_action(executed_actions, "key", target, value, notes)
-                
-                elif action_type == "clear":
-                    self.driver.switch_to.active_element.clear()
-                    time.sleep(delay)
-                    self._add_action(executed_actions, "clear", target, value, notes)
-                
-                elif action_type == "wait":
-                    time.sleep(delay if delay > 0 else float(value))
-                    self._add_action(executed_actions, "wait", target, value, notes)
-                
-                elif action_type == "navigate":
-                    if target == "back":
-                        self.driver.back()
-                        time.sleep(delay)
-                    self._add_action(executed_actions, "navigate", target, value, notes)
-                
-                elif action_type == "error":
-                    # Error actions are just logged, not executed
-                    time.sleep(delay)
-                    self._add_action(executed_actions, "error", target, value, notes)
+        slots = [(f"persona_{i + 1:05d}", PERSONA_TYPES[i % len(PERSONA_TYPES)]) for i in range(size)]
+        personas = _bench(results, f"persona_generation[{size}]", size, lambda: list(
+            persona_generator.generate_population(slots, dedup=NearDuplicateIndex())))
         
-        except Exception as e:
-            self._add_action(executed_actions, "error", "interaction", "", f"Execution error: {str(e)}")
+        cells = [(persona, task, interface["description"]) for persona in personas for task, interface in interfaces.items()]
+        plans = _bench(results, f"gpt_planning[{size}]", len(cells),
+                       lambda: [action_generator.generate_actions(*cell) for cell in cells])
+        _bench(results, f"local_planning[{size}]", len(cells), lambda: local_planner.generate_actions_batch(cells))
         
-        return executed_actions
+        with tempfile.TemporaryDirectory() as cards_dir:
+            _bench(results, f"card_rendering[{size}]", len(personas),
+                   lambda: PersonaCardGenerator.render_batch(personas, cards_dir, policy="overwrite"), repeat=1)
+        
+        # Synthetic executed runs with one step every 0.4s
+        rows = []
+        with tempfile.TemporaryDirectory() as work_dir:
+            steps_dir = os.path.join(work_dir, "steps")
+            store = StepStore(steps_dir)
+            for run_id, ((persona, task, _), plan) in enumerate(zip(cells, plans)):
+                executed = [{"step": i + 1, "action": a["action"], "target": a["target"], "t": i * 0.4,
+                             "duration": 0.4, "outcome": "error" if a["action"] == "error" else "ok"}
+                            for i, a in enumerate(plan)]
+                store.append_run(run_id, executed)
+                rows.append({"run_id": run_id, "persona_id": persona["id"], "persona_label": persona["label"],
+                             "task": task, "task_label": task.title(), "steps_count": len(executed),
+                             "errors": sum(1 for a in plan if a["action"] == "error"), "success": run_id % 3 != 0,
+                             "actions": "",
+                             "estimated_time": len(executed) * 0.4})
+            store.close()
+            detail = pd.DataFrame(rows)
+            tables = _bench(results, f"report_compute[{size}]", len(rows),
+                            lambda: ReportEngine(detail, steps_dir, bootstrap=200).compute())
+            sheets = {'Summary': tables["persona"], 'Persona x Task': tables["cells"], 'Error Types': tables["errors"]}
+            _bench(results, f"report_export_xlsx[{size}]", len(rows),
+                   lambda: REPORT_EXPORTERS["xlsx"]().export(sheets, detail, work_dir))
     
-    def _add_action(self, actions: List, action: str, target: str, value: str, notes: str):
-        """Add action to log"""
-        actions.append({
-            "step": len(actions) + 1,
-            "action": action,
-            "target": target,
-            "value": value,
-            "timestamp": f"00:00:{len(actions)+1:02d}",
-            "notes": notes
-        })
+    _benchmark_browser(results, interfaces, interfaces_dir)
     
-    def close(self):
-        """Close browser"""
-        if self.driver:
-            self.driver.quit()
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "llm_latency": llm_latency,
+        "results": results
+    }
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n   [SAVED] {output}")
+    
+    ok = True
+    if os.path.exists(baseline) and not save_baseline:
+        ok = compare_benchmarks(report, baseline, tolerance)
+    if save_baseline:
+        with open(baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"   [SAVED] Baseline: {baseline}")
+    return ok
+
+
+def _benchmark_browser(results: Dict, interfaces: Dict[str, Dict], interfaces_dir: str):
+    """Per-step execution time on each local interface with headless Chrome, if it can start"""
+    if not interfaces:
+        print(f"   {'action_execution':<36} skipped: no interface pages in {interfaces_dir}")
+        return
+    try:
+        with redirect_stdout(io.StringIO()):
+            simulators = {"": BrowserSimulator(headless=True, time_mode="compressed"),
+                          "_batched": BrowserSimulator(headless=True, time_mode="compressed", batch_js=True)}
+    except Exception as e:
+        print(f"   {'action_execution':<36} skipped: Chrome unavailable ({str(e).splitlines()[0] if str(e) else type(e).__name__})")
+        return
+    
+    with redirect_stdout(io.StringIO()):
+        planner = MarkovActionGenerator(interfaces=interfaces)
+    try:
+        for suffix, simulator in simulators.items():
+            for task, interface in interfaces.items():
+                plans = [planner.generate_actions({"id": f"bench_{i}", "type": PERSONA_TYPES[i % 4]}, task,
+                                                  interface["description"]) for i in range(20)]
+                steps = sum(len(plan) for plan in plans)
+                rules = TargetResolver.RULES + interface["rules"] if interface["rules"] else None
+                
+                def execute():
+                    for plan in plans:
+                        simulator.load_page(interface["file_path"], rules)
+                        simulator.execute_actions(plan)
+                _bench(results, f"action_execution{suffix}[{task}]", steps, execute, repeat=1)
+    finally:
+        for simulator in simulators.values():
+            simulator.close()
+
+
+def compare_benchmarks(report: Dict, baseline_path: str, tolerance: float = 0.25) -> bool:
+    """Print each benchmark against the baseline; False if any is slower by more than tolerance"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    
+    print(f"\n[BENCH] Compared with {baseline_path} (tolerance {tolerance:.0%})")
+    print("   " + "-" * 76)
+    print(f"   {'Benchmark':<36} {'Baseline':>10} {'Now':>10} {'Change':>9}")
+    regressions = []
+    for name, result in report["results"].items():
+        if name not in baseline:
+            print(f"   {name:<36} {'-':>10} {result['per_item_ms']:>8.3f}ms {'new':>9}")
+            continue
+        before, now = baseline[name]["per_item_ms"], result["per_item_ms"]
+        change = (now - before) / before if before else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"   {name:<36} {before:>8.3f}ms {now:>8.3f}ms {change:>+9.1%}{flag}")
+    
+    if regressions:
+        print(f"\n   [WARNING] {len(regressions)} benchmark(s) slower than baseline: {', '.join(regressions)}")
+    else:
+        print("\n   [OK] No regressions")
+    return not regressions
 
 
 class SimPersonaPipeline:
     """Complete research pipeline - GPT-4 powered only"""
     
-    def __init__(self, api_key):
+    def __init__(self, api_key, headless=True, max_browser_uses=25,
+                 llm_workers=4, browser_workers=2, job_timeout=300.0, use_processes=True,
+                 async_llm=True, base_url=OPENAI_BASE_URL, requests_per_second=5.0, cache_mode="readwrite",
+                 time_mode="realtime", batch_js=False, resume=True, parquet=False, report_formats=("xlsx",),
+                 card_policy="skip-unchanged", card_workers=None, personas_per_type=1, persona_seed=0,
+                 persona_window=32, dedup_threshold=0.8, planner="gpt", gpt_fraction=0.1, planner_seed=0,
+                 stream_plans=True, queue_size=None, trace_path=None, screenshot_format="webp",
+                 screenshot_quality=80, screenshot_scope="viewport", screenshot_steps=False,
+                 persona_counts=None, interfaces=None, repetitions=1, tasks_per_call=3):
         self.base_dir = os.getcwd()
         self.data_dir = os.path.join(self.base_dir, "data")
         self.interfaces_dir = os.path.join(self.data_dir, "interfaces")
@@ -401,30 +4264,146 @@ class SimPersonaPipeline:
         for directory in [self.data_dir, self.cards_dir, self.screenshots_dir]:
             os.makedirs(directory, exist_ok=True)
         
+        # Pages are parsed once; unchanged ones come from the descriptor cache
+        registry = InterfaceRegistry(self.interfaces_dir, os.path.join(self.data_dir, "interface_registry.json"))
+        self.interface_descriptors = registry.scan()
+        print(f"[OK] {registry.stats['interfaces']} interfaces in data/interfaces/ "
+              f"({registry.stats['parsed']} parsed, {registry.stats['cached']} cached)")
+        unknown = set(interfaces or ()) - set(self.interface_descriptors)
+        if unknown:
+            raise ValueError(f"Unknown interfaces: {', '.join(sorted(unknown))}")
+        
         # Initialize GPT-4 generators (will raise error if API key invalid)
-        self.persona_generator = PersonaGenerator(api_key=api_key)
-        self.action_generator = ActionGenerator(api_key=api_key)
+        self.response_cache = None
+        if cache_mode != "off":
+            self.response_cache = ResponseCache(os.path.join(self.data_dir, "llm_cache.sqlite"), mode=cache_mode)
+        # Without a key (offline runs) only cached responses can be served; any real call fails clearly
+        client = None if api_key else FakeChatClient(responder=_no_api_key)
+        self.llm_client = None
+        if async_llm and api_key:
+            self.llm_client = AsyncLLMClient(api_key, base_url=base_url, max_concurrency=llm_workers,
+                                             requests_per_second=requests_per_second)
+        self.persona_generator = PersonaGenerator(api_key=api_key, base_url=base_url, client=client,
+                                                  async_client=self.llm_client, cache=self.response_cache)
+        self.action_generator = ActionGenerator(api_key=api_key, base_url=base_url, client=client,
+                                                async_client=self.llm_client, cache=self.response_cache,
+                                                interfaces=self.interface_descriptors, tasks_per_call=tasks_per_call)
+        if planner != "gpt":
+            # Fit the local planner from whatever GPT plans are already cached
+            local = MarkovActionGenerator(seed=planner_seed, cache=self.response_cache,
+                                          interfaces=self.interface_descriptors)
+            self.action_generator = (local if planner == "markov" else
+                                     HybridActionGenerator(self.action_generator, local, gpt_fraction, planner_seed))
         self.personas = []
         self.action_logs = []
+        self.llm_workers = llm_workers
+        self.browser_workers = browser_workers
+        self.job_timeout = job_timeout
+        self.use_processes = use_processes
+        self.stream_plans = stream_plans
+        self.queue_size = queue_size
+        self.trace_path = trace_path
+        if trace_path:
+            TRACER.enable()
+        self.browser_pool = BrowserPool(size=browser_workers, headless=headless, max_uses=max_browser_uses,
+                                        time_mode=time_mode, batch_js=batch_js)
+        self.resume = resume
+        self.parquet = parquet
+        self.report_formats = list(report_formats)
+        self.card_policy = card_policy
+        self.card_workers = card_workers
+        self.personas_per_type = personas_per_type
+        self.persona_seed = persona_seed
+        self.persona_window = persona_window
+        self.dedup_threshold = dedup_threshold
+        # Matrix: persona type -> count, interface task names (None: all) and runs per cell
+        self.persona_counts = dict(persona_counts or {ptype: personas_per_type for ptype in PERSONA_TYPES})
+        unknown = set(self.persona_counts) - set(PERSONA_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown persona types: {', '.join(sorted(unknown))}")
+        self.interfaces = list(interfaces) if interfaces else None
+        self.repetitions = repetitions
+        self.failed_cells = []
+        self.cells_total = 0
+        self.step_seconds = {}
+        self.screenshot_options = {"fmt": screenshot_format, "quality": screenshot_quality,
+                                   "scope": screenshot_scope, "steps": screenshot_steps}
+        self.runs_path = os.path.join(self.data_dir, "simpersona_runs.jsonl")
+        self.steps_dir = os.path.join(self.data_dir, "steps")
+        # Seed, plan, page hash and log of every cell, for --replay
+        self.replay_path = os.path.join(self.data_dir, "replay_record.jsonl")
+        self.dashboard_dir = os.path.join(self.data_dir, "dashboard")
+        self.manifest = RunManifest(os.path.join(self.data_dir, "run_manifest.json"))
+        self.skipped = []
         
         print(f"[DIR] Working in: {self.base_dir}")
         print(f"[DIR] Data folder: {self.data_dir}")
         print(f"[DIR] Screenshots: {self.screenshots_dir}")
     
     def step1_generate_personas(self):
-        """Generate 4 GPT-powered personas"""
+        """Generate GPT-powered personas, persona_counts[type] of each type"""
         print("\n[STEP 1] GENERATING PERSONAS (GPT-4)")
         print("-" * 60)
         
-        persona_types = ["novice", "expert", "distracted", "accessibility-focused"]
-        for ptype in persona_types:
-            persona = self.persona_generator.generate_persona(ptype)
-            self.personas.append(persona)
-            print(f"      -> {ptype}: {persona['id']}")
-        
+        # Types interleave so every prefix of the population is balanced
+        counts = {ptype: self.persona_counts[ptype] for ptype in PERSONA_TYPES if self.persona_counts.get(ptype)}
+        order = [ptype for index in range(max(counts.values(), default=0)) for ptype in counts if index < counts[ptype]]
+        total = len(order)
+        slots = [(f"persona_{index + 1:0{PERSONA_ID_WIDTH}d}", ptype) for index, ptype in enumerate(order)]
         json_path = os.path.join(self.data_dir, "simpersonas.json")
+        stream_path = os.path.join(self.data_dir, "simpersonas.jsonl")
+        uniform = counts == {ptype: self.personas_per_type for ptype in PERSONA_TYPES}
+        input_hash = _content_hash([self.persona_generator._build_request(ptype) for ptype in counts],
+                                   PERSONA_DISTRIBUTION, self.personas_per_type if uniform else counts,
+                                   self.persona_seed, self.dedup_threshold)
+        
+        if self.resume and self.manifest.step_done("personas", input_hash) and os.path.exists(json_path):
+            with open(json_path, encoding='utf-8') as f:
+                self.personas = json.load(f)
+            print(f"   [SKIP] Reusing {len(self.personas)} personas from data/simpersonas.json")
+            self.skipped.append(f"step 1: {len(self.personas)} personas reused")
+            return
+        
+        # Personas stream to JSONL as they arrive; an interrupted run picks up where it stopped
+        found = {}
+        if self.resume and self.manifest.step_done("personas_stream", input_hash):
+            found = {persona["id"]: persona for persona in ResultsSink.load(stream_path)}
+            if found:
+                print(f"   [SKIP] Resuming with {len(found)} personas from data/simpersonas.jsonl")
+                self.skipped.append(f"step 1: {len(found)} streamed personas reused")
+        else:
+            open(stream_path, "w").close()
+            self.manifest.mark_step("personas_stream", input_hash)
+        
+        dedup = NearDuplicateIndex(threshold=self.dedup_threshold)
+        for persona in found.values():
+            dedup.add(persona["id"], PersonaGenerator.persona_text(persona))
+        
+        todo = [slot for slot in slots if slot[0] not in found]
+        print(f"   [GPT] Generating {len(todo)} of {total} personas "
+              f"({', '.join(f'{count} {ptype}' for ptype, count in counts.items())})")
+        sink = ResultsSink(stream_path)
+        try:
+            for persona in self.persona_generator.generate_population(todo, seed=self.persona_seed, window=self.persona_window,
+                                                                      dedup=dedup):
+                sink.append(persona)
+                found[persona["id"]] = persona
+                if total <= 20:
+                    print(f"      -> {persona['type']}: {persona['id']} - {persona['demographics']['occupation']}")
+                elif sink.rows_written % 100 == 0:
+                    print(f"      -> {len(found)}/{total} personas")
+        finally:
+            sink.close()
+        
+        self.personas = [found[persona_id] for persona_id, _ in slots if persona_id in found]
+        stats = self.persona_generator.population_stats
+        print(f"   [OK] {len(self.personas)} personas, {stats['duplicates']} near-duplicates regenerated, "
+              f"{stats['dropped']} dropped, {stats['failed']} failed")
+        
         with open(json_path, 'w', encoding='utf-8') as f:
             json.dump(self.personas, f, indent=2, ensure_ascii=False)
+        if not stats["failed"]:
+            self.manifest.mark_step("personas", input_hash, count=len(self.personas))
         print(f"\n   [SAVED] data/simpersonas.json")
     
     def step2_create_persona_cards(self):
@@ -432,23 +4411,20 @@ class SimPersonaPipeline:
         print("\n[STEP 2] CREATING PERSONA CARDS")
         print("-" * 60)
         
-        existing_cards = [f for f in os.listdir(self.cards_dir) if f.endswith('.png')] if os.path.exists(self.cards_dir) else []
-        
-        if len(existing_cards) >= 4:
-            print(f"   [INFO] Found {len(existing_cards)} existing persona cards")
-            skip = input("   Skip card generation? (y/n): ").strip().lower()
-            if skip == 'y':
-                print(f"   [SKIP] Skipping persona card generation")
-                return
+        input_hash = _content_hash(self.personas)
+        card_paths = [os.path.join(self.cards_dir, f"{persona['id']}.png") for persona in self.personas]
+        if self.resume and self.manifest.step_done("cards", input_hash) and all(map(os.path.exists, card_paths)):
+            print(f"   [SKIP] All {len(card_paths)} persona cards are up to date")
+            self.skipped.append(f"step 2: {len(card_paths)} cards up to date")
+            return
         
-        for persona in self.personas:
-            card_path = os.path.join(self.cards_dir, f"{persona['id']}.png")
-            try:
-                PersonaCardGenerator.create_card(persona, card_path)
-                print(f"   [IMAGE] Created: {os.path.basename(card_path)}")
-            except Exception as e:
-                print(f"   [WARNING] Card error: {e}")
+        stats = PersonaCardGenerator.render_batch(self.personas, self.cards_dir, policy=self.card_policy,
+                                                  workers=self.card_workers)
+        print(f"   [IMAGE] Rendered {stats['rendered']} cards, skipped {stats['skipped']} "
+              f"({self.card_policy}), {stats['failed']} failed")
         
+        if not stats["failed"]:
+            self.manifest.mark_step("cards", input_hash, count=len(self.personas))
         print(f"\n   [SAVED] data/persona_cards/")
     
     def step3_simulate_tasks(self):
@@ -463,90 +4439,199 @@ class SimPersonaPipeline:
             "accessibility-focused": "Accessibility User"
         }
         
-        task_labels = {
-            "login": "Login Form",
-            "checkout": "Checkout Form",
-            "profile": "Profile Update"
-        }
+        # Every page in data/interfaces/, or the requested ones in the requested order
+        interfaces = [self.interface_descriptors[task] for task in self.interfaces or self.interface_descriptors]
         
-        task_descriptions = {
-            "login": "a login form with username, password fields and a login button",
-            "checkout": "a checkout form with name and address fields and a place order button",
-            "profile": "a profile update form with a name field and save button"
-        }
+        if not self.resume:
+            for path in (self.runs_path, self.replay_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            StepStore.clear(self.steps_dir)
+        # Later rows win, so a redone cell replaces its stale predecessor
+        previous_rows = ResultsSink.load(self.runs_path)
+        finished = {(row["persona_id"], row["task"], row.get("repetition", 0)): row for row in previous_rows}
+        next_run_id = max([row.get("run_id", -1) for row in previous_rows], default=-1) + 1
         
-        interfaces = [
-            ("login", "Login", os.path.join(self.interfaces_dir, "login.html")),
-            ("checkout", "Checkout", os.path.join(self.interfaces_dir, "checkout.html")),
-            ("profile", "Profile", os.path.join(self.interfaces_dir, "profile.html"))
-        ]
+        jobs = []
+        rows = []
+        stale = 0
+        # GPT plans keep their original hashes; other planners key cells by their own settings
+        planner_fingerprint = [self.action_generator.fingerprint()] if hasattr(self.action_generator, "fingerprint") else []
+        cells = [(persona, interface, repetition) for persona in self.personas for interface in interfaces
+                 for repetition in range(self.repetitions)]
+        for persona, interface, repetition in cells:
+            interface_type = interface["task"]
+            # Repetition 0 keeps the hash of a single-run cell
+            input_hash = _content_hash(persona, interface["description"], interface["hash"],
+                                       *planner_fingerprint, *([repetition] if repetition else []))
+            done = finished.get((persona['id'], interface_type, repetition))
+            if done and done.get("input_hash") == input_hash:
+                rows.append(done)
+                continue
+            if done:
+                stale += 1
+            jobs.append({
+                "persona": persona,
+                "task": interface_type,
+                "task_description": interface["description"],
+                "interface_name": interface["name"],
+                "file_path": interface["file_path"],
+                "target_rules": TargetResolver.RULES + interface["rules"] if interface["rules"] else None,
+                "screenshots_dir": self.screenshots_dir,
+                "screenshots": self.screenshot_options,
+                "repetition": repetition,
+                "seed": cell_seed(self.persona_seed, persona["id"], interface_type, repetition),
+                "interface_hash": interface["hash"],
+                "input_hash": input_hash
+            })
+            rows.append(None)
         
-        for persona in self.personas:
-            for interface_type, interface_name, file_path in interfaces:
-                print(f"\n   [SIM] {persona['type']} -> {interface_name}")
-                
-                if not os.path.exists(file_path):
-                    print(f"      [WARNING] File not found: {file_path}")
-                    continue
-                
-                # Generate action plan using GPT-4
-                action_plan = self.action_generator.generate_actions(
-                    persona, 
-                    interface_type, 
-                    task_descriptions[interface_type]
-                )
-                
-                if not action_plan:
-                    print(f"      [WARNING] No actions generated")
-                    continue
-                
-                simulator = BrowserSimulator(headless=False)
-                try:
-                    simulator.load_page(file_path)
-                    
-                    before_path = os.path.join(self.screenshots_dir, f"{persona['type']}_{interface_type}_before.png")
-                    simulator.take_screenshot(before_path)
-                    
-                    # Execute the GPT-generated action plan
-                    executed_actions = simulator.execute_actions(action_plan)
-                    
-                    time.sleep(1)
-                    after_path = os.path.join(self.screenshots_dir, f"{persona['type']}_{interface_type}_after.png")
-                    simulator.take_screenshot(after_path)
-                    
-                    # Log actions with error tracking
-                    error_count = len([a for a in executed_actions if a['action'] == 'error'])
-                    success = 'error' not in [a['action'] for a in executed_actions[-3:]] if executed_actions else False
-                    
-                    action_summary = "; ".join([f"{a['action']}({a['target']})" for a in executed_actions[:5]])
-                    if len(executed_actions) > 5:
-                        action_summary += f" ... +{len(executed_actions)-5} more"
-                    
-                    self.action_logs.append({
-                        "persona_id": persona['id'],
-                        "persona_label": type_labels.get(persona['type'], persona['type']),
-                        "task": interface_type,
-                        "task_label": task_labels.get(interface_type, interface_name),
-                        "steps_count": len(executed_actions),
-                        "errors": error_count,
-                        "success": 1 if success else 0,
-                        "actions": action_summary,
-                        "estimated_time": len(executed_actions) * 2.5
-                    })
-                    
-                    print(f"      [OK] Completed: {len(executed_actions)} actions, {error_count} errors")
-                    
-                except Exception as e:
-                    print(f"      [ERROR] Error: {e}")
-                finally:
-                    simulator.close()
-                    time.sleep(2)
+        if hasattr(self.action_generator, "group_tasks"):
+            # One planning call covers several of a persona's tasks in one repetition; its cells share the response
+            by_persona = {}
+            for job in jobs:
+                by_persona.setdefault((job["persona"]["id"], job["repetition"]), []).append(job)
+            for persona_jobs in by_persona.values():
+                cells = list(dict.fromkeys((job["task"], job["task_description"], job["seed"]) for job in persona_jobs))
+                groups = {task: group for group in self.action_generator.group_tasks(persona_jobs[0]["persona"], cells)
+                          for task, *_ in group}
+                for job in persona_jobs:
+                    if len(groups[job["task"]]) > 1:
+                        job["task_group"] = groups[job["task"]]
+        
+        reused = len(rows) - len(jobs)
+        if reused or stale:
+            print(f"   [SKIP] {reused} cells up to date, {stale} stale, {len(jobs) - stale} new")
+            self.skipped.append(f"step 3: {reused} cells up to date, {stale} stale cells redone")
+        
+        parquet_path = None
+        if self.parquet:
+            parquet_path = os.path.join(self.data_dir, f"simpersona_runs_{datetime.now():%Y%m%d_%H%M%S}.parquet")
+        sink = ResultsSink(self.runs_path, parquet_path=parquet_path)
+        replay_record = ResultsSink(self.replay_path)
+        step_store = StepStore(self.steps_dir)
+        # The dashboard sees reused runs at once and new ones as they finish
+        feed = DashboardFeed(self.dashboard_dir)
+        for row in rows:
+            if row:
+                feed.add(row)
+        slots = [i for i, row in enumerate(rows) if row is None]
+        
+        def record(index, result):
+            # Called as each job finishes; the row is on disk before the next one starts
+            job = result["job"]
+            persona = job["persona"]
+            print(f"\n   [SIM] {persona['type']} -> {job['interface_name']}")
+            usage = self.action_generator.pop_usage(persona, job["task"], job["seed"]) \
+                if hasattr(self.action_generator, "pop_usage") else {}
+            
+            if result["action_plan"]:
+                # Enough to rerun the cell without the LLM; failed cells included
+                replay_record.append({
+                    "name": f"{persona['id']}_{job['task']}" + (f"_r{job['repetition']}" if job["repetition"] else ""),
+                    "run_id": None if result["error"] else next_run_id + index,
+                    "persona_id": persona["id"],
+                    "persona": {"id": persona["id"], "type": persona["type"]},
+                    "task": job["task"],
+                    "repetition": job["repetition"],
+                    "seed": job["seed"],
+                    "interface_hash": job["interface_hash"],
+                    "time_mode": self.browser_pool.time_mode,
+                    "plan": list(result["action_plan"]),
+                    "log": result["executed_actions"],
+                    "error": str(result["error"]) if result["error"] else None
+                })
+            
+            if result["error"]:
+                print(f"      [ERROR] Error: {result['error']}")
+                self.failed_cells.append({"persona_id": persona['id'], "task": job['task'],
+                                          "repetition": job["repetition"], "error": str(result["error"])})
+                return
+            
+            executed_actions = result["executed_actions"]
+            
+            # Log actions with error tracking
+            error_count = len([a for a in executed_actions if a['action'] == 'error'])
+            success = 'error' not in [a['action'] for a in executed_actions[-3:]] if executed_actions else False
+            
+            action_summary = "; ".join([f"{a['action']}({a['target']})" for a in executed_actions[:5]])
+            if len(executed_actions) > 5:
+                action_summary += f" ... +{len(executed_actions)-5} more"
+            
+            row = {
+                "run_id": next_run_id + index,
+                "persona_id": persona['id'],
+                "persona_label": type_labels.get(persona['type'], persona['type']),
+                "task": job['task'],
+                "task_label": self.interface_descriptors[job['task']]["label"],
+                "steps_count": len(executed_actions),
+                "errors": error_count,
+                "success": 1 if success else 0,
+                "actions": action_summary,
+                "estimated_time": len(executed_actions) * 2.5,
+                "virtual_time": round(result["stats"].get("virtual_time", 0.0), 2),
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "cached_prompt_tokens": usage.get("cached_tokens", 0),
+                "input_hash": job["input_hash"]
+            }
+            if job["repetition"]:
+                row["repetition"] = job["repetition"]
+            # Steps first: a run in the sink always has its steps stored
+            step_store.append_run(row["run_id"], executed_actions)
+            sink.append(row)
+            feed.add(row)
+            rows[slots[index]] = row
+            
+            print(f"      [OK] Completed: {len(executed_actions)} actions, {error_count} errors")
+        
+        scheduler = SimulationScheduler(
+            self.action_generator,
+            browser_pool=self.browser_pool,
+            llm_workers=self.llm_workers,
+            browser_workers=self.browser_workers,
+            job_timeout=self.job_timeout,
+            use_processes=self.use_processes,
+            stream_plans=self.stream_plans,
+            queue_size=self.queue_size
+        )
+        try:
+            scheduler.run(jobs, on_result=record)
+        finally:
+            step_store.close()
+            replay_record.close()
+            sink.close()
+            feed.close()
+        
+        # Logs keep matrix order, whichever job finished first
+        self.action_logs.extend(row for row in rows if row)
+        self.cells_total = len(rows)
+        
+        scheduler.report()
+        if hasattr(self.action_generator, "report_usage"):
+            self.action_generator.report_usage()
+        if not self.use_processes:
+            self.browser_pool.report()
+        self.browser_pool.close()
+        if jobs and not self.use_processes:
+            # Worker processes flush their own stores on exit
+            store = _screenshot_store(self.screenshots_dir, **{k: v for k, v in self.screenshot_options.items()
+                                                              if k not in ("scope", "steps")})
+            store.close()
+            store.report()
+            _screenshot_store.cache_clear()
+        print(f"\n   [SAVED] data/simpersona_runs.jsonl ({sink.rows_written} new runs)")
         
         csv_path = os.path.join(self.data_dir, "simpersona_actions.csv")
         if self.action_logs:
-            df = pd.DataFrame(self.action_logs)
-            df.to_csv(csv_path, index=False)
+            with TRACER.span("write_actions_csv", "report", rows=len(self.action_logs)):
+                df = pd.DataFrame(self.action_logs)
+                df.to_csv(csv_path, index=False)
             print(f"\n   [SAVED] data/simpersona_actions.csv")
+        
+        if scheduler.interrupted:
+            # Finished runs are saved; the next run resumes with the cancelled cells
+            raise KeyboardInterrupt
     
     def step4_generate_reports(self):
         """Generate analysis reports"""
@@ -558,36 +4643,82 @@ class SimPersonaPipeline:
             return
         
         df = pd.DataFrame(self.action_logs)
+        input_hash = _content_hash(self.action_logs, self.report_formats)
+        outputs = self.manifest.data["steps"].get("reports", {}).get("outputs", [])
+        if (self.resume and self.manifest.step_done("reports", input_hash)
+                and all(os.path.exists(os.path.join(self.base_dir, path)) for path in outputs)):
+            print("   [SKIP] Reports are up to date")
+            self.skipped.append("step 4: reports up to date")
+            return
+        
+        with TRACER.span("report_compute", "report"):
+            tables = ReportEngine(df, self.steps_dir).compute()
+        persona_table = tables["persona"]
         
         print("\n   [METRICS] SUMMARY")
         print("   " + "-" * 56)
         print(f"   {'Persona':<20} {'Steps':<8} {'Errors':<8} {'Success'}")
         print("   " + "-" * 56)
         
-        for persona_label in df['persona_label'].unique():
-            pdata = df[df['persona_label'] == persona_label]
-            if len(pdata) > 0:
-                steps = int(pdata['steps_count'].mean())
-                errors = int(pdata['errors'].sum())
-                success_rate = (pdata['success'].sum() / len(pdata)) * 100
-                print(f"   {persona_label:<20} {steps:<8} {errors:<8} {success_rate:.0f}%")
+        for _, prow in persona_table.iterrows():
+            print(f"   {prow['persona_label']:<20} {int(prow['avg_steps']):<8} {int(prow['total_errors']):<8} "
+                  f"{prow['success_rate']:.0f}%  (95% CI {prow['success_ci_low']:.0f}-{prow['success_ci_high']:.0f}%)")
         
-        excel_path = os.path.join(self.base_dir, "SimPersona_Analysis.xlsx")
-        try:
-            with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-                summary = df.groupby('persona_label').agg({
-                    'steps_count': 'mean',
-                    'errors': 'sum',
-                    'success': 'mean'
-                }).reset_index()
-                summary['success'] = (summary['success'] * 100).round(1)
-                summary.columns = ['Persona', 'Avg Steps', 'Total Errors', 'Success Rate (%)']
-                summary.to_excel(writer, sheet_name='Summary', index=False)
-                df.to_excel(writer, sheet_name='Detailed Actions', index=False)
-            
-            print(f"\n   [SAVED] SimPersona_Analysis.xlsx")
-        except Exception as e:
-            print(f"   [WARNING] Excel error: {e}")
+        summary = persona_table.rename(columns={
+            'persona_label': 'Persona',
+            'avg_steps': 'Avg Steps',
+            'total_errors': 'Total Errors',
+            'success_rate': 'Success Rate (%)'
+        })
+        sheets = {'Summary': summary, 'Persona x Task': tables["cells"], 'Error Types': tables["errors"]}
+        
+        outputs = []
+        failed = False
+        for report_format in self.report_formats:
+            try:
+                with TRACER.span(f"export_{report_format}", "report", rows=len(df)):
+                    paths = REPORT_EXPORTERS[report_format]().export(sheets, df, self.base_dir)
+            except Exception as e:
+                print(f"   [WARNING] {report_format} export error: {e}")
+                failed = True
+                continue
+            for path in paths:
+                outputs.append(os.path.relpath(path, self.base_dir))
+            print(f"\n   [SAVED] {report_format}: {', '.join(os.path.relpath(p, self.base_dir) for p in paths[:3])}"
+                  + (f" (+{len(paths) - 3} more)" if len(paths) > 3 else ""))
+        
+        if not failed:
+            self.manifest.mark_step("reports", input_hash, rows=len(df), outputs=outputs)
+    
+    def run_summary(self) -> Dict:
+        """Counts, timings and outputs of this run for the machine-readable summary"""
+        rows = self.action_logs
+        return {
+            "personas": len(self.personas),
+            "cells": {"total": self.cells_total, "completed": len(rows), "failed": len(self.failed_cells)},
+            "success_rate": round(sum(row["success"] for row in rows) / len(rows), 4) if rows else None,
+            "step_seconds": self.step_seconds,
+            # Spent by this run's planning calls (cached responses and local plans cost none)
+            "tokens": dict(getattr(self.action_generator, "usage_totals", {})),
+            "skipped": self.skipped,
+            "outputs": self.manifest.data["steps"].get("reports", {}).get("outputs", []),
+            "failed_cells": self.failed_cells
+        }
+    
+    def report_trace(self):
+        """Export the Chrome trace and print where the time went"""
+        TRACER.export(self.trace_path)
+        summary = TRACER.summary()
+        print(f"\n[TRACE] {len(TRACER.events)} events saved to {os.path.relpath(self.trace_path, self.base_dir)} "
+              f"(open in chrome://tracing or ui.perfetto.dev)")
+        if summary.empty:
+            return
+        summary.to_csv(os.path.splitext(self.trace_path)[0] + "_summary.csv", index=False)
+        print(f"   {'Category':<10} {'Span':<24} {'Count':>7} {'Total s':>9} {'Mean ms':>9} {'p95 ms':>9} {'Max ms':>9}")
+        print("   " + "-" * 82)
+        for _, row in summary.iterrows():
+            print(f"   {row['category']:<10} {row['span']:<24} {row['count']:>7} {row['total']:>9.2f} "
+                  f"{row['mean'] * 1000:>9.1f} {row['p95'] * 1000:>9.1f} {row['max'] * 1000:>9.1f}")
     
     def run_complete_pipeline(self):
         """Run all steps"""
@@ -595,56 +4726,339 @@ class SimPersonaPipeline:
         print("SimPersona - GPT-4 Powered Research Pipeline")
         print("="*60)
         
-        self.step1_generate_personas()
-        self.step2_create_persona_cards()
-        self.step3_simulate_tasks()
-        self.step4_generate_reports()
+        try:
+            for step in (self.step1_generate_personas, self.step2_create_persona_cards,
+                         self.step3_simulate_tasks, self.step4_generate_reports):
+                started = time.perf_counter()
+                with TRACER.span(step.__name__, "pipeline"):
+                    step()
+                self.step_seconds[step.__name__] = round(time.perf_counter() - started, 3)
+        finally:
+            if self.llm_client:
+                self.llm_client.close()
+            if self.response_cache:
+                self.response_cache.report()
+                self.response_cache.close()
+            if self.trace_path:
+                self.report_trace()
         
         print("\n" + "="*60)
         print("[SUCCESS] PIPELINE COMPLETE!")
         print("="*60)
+        if self.skipped:
+            print(f"\n[SKIP] Reused from previous runs:")
+            for line in self.skipped:
+                print(f"   - {line}")
         print(f"\n[DIR] All files saved in: {self.base_dir}")
         print(f"\n[FILES] Generated files:")
         print(f"   [OK] data/simpersonas.json")
         print(f"   [OK] data/simpersona_actions.csv")
-        print(f"   [OK] data/persona_cards/ (4 PNG files)")
-        print(f"   [OK] screenshots/ (24 PNG files)")
+        cards = sum(os.path.exists(os.path.join(self.cards_dir, f"{persona['id']}.png")) for persona in self.personas)
+        print(f"   [OK] data/persona_cards/ ({cards} PNG files)")
+        print(f"   [OK] screenshots/ (deduplicated frames + index)")
+        print(f"   [OK] data/dashboard/ (paged dashboard feed)")
         print(f"   [OK] SimPersona_Analysis.xlsx")
         print(f"\n[INFO] All personas and actions were AI-generated by GPT-4")
         print(f"\n[WEB] Open index.html in browser to view dashboard!")
         print(f"[PATH] Full path: {os.path.join(self.base_dir, 'index.html')}")
 
 
-def main():
+# Exit statuses of main(), for batch runs
+EXIT_OK, EXIT_FAILED, EXIT_USAGE, EXIT_PARTIAL, EXIT_INTERRUPTED = 0, 1, 2, 3, 130
+
+
+def run_replay(cells: str = "all", record_path: str = "data/replay_record.jsonl",
+               interfaces_dir: str = "data/interfaces", output_dir: str = "data/replay", workers: int = 2) -> int:
+    """Re-execute recorded cells from their stored plans, with no LLM calls
+    
+    cells is "all", "failed", or comma-separated run ids, persona ids, tasks
+    or persona_id:task pairs. Browsers run in parallel in virtual time; each
+    cell's log is written to output_dir and compared with the recorded one:
+    byte for byte when the run was recorded in virtual time, otherwise
+    without the wall-clock fields. Cells whose page changed since the
+    recording are reported stale and not run.
+    """
+    print("\n[REPLAY] RE-EXECUTING RECORDED CELLS (no LLM calls)")
+    print("-" * 60)
+    # Later entries win, like the run log
+    record = {}
+    for entry in ResultsSink.load(record_path):
+        record[(entry["persona_id"], entry["task"], entry.get("repetition", 0))] = entry
+    wanted = [s.strip() for s in cells.split(",") if s.strip()]
+    
+    def selected(entry):
+        if "all" in wanted:
+            return True
+        if "failed" in wanted and entry.get("error"):
+            return True
+        return bool({str(entry.get("run_id")), entry["persona_id"], entry["task"],
+                     f"{entry['persona_id']}:{entry['task']}"} & set(wanted))
+    
+    entries = [entry for entry in record.values() if selected(entry)]
+    if not entries:
+        print(f"   [ERROR] No recorded cells match {cells!r} in {record_path}")
+        return EXIT_USAGE
+    
+    interfaces = InterfaceRegistry(interfaces_dir).scan()
+    outcomes = {"identical": 0, "differs": 0, "stale": 0, "failed": 0}
+    report = []
+    jobs = []
+    for entry in entries:
+        interface = interfaces.get(entry["task"])
+        if not interface or interface["hash"] != entry["interface_hash"]:
+            outcomes["stale"] += 1
+            report.append({"cell": entry["name"], "status": "stale", "detail": "interface changed since recording"})
+            continue
+        jobs.append({
+            "persona": entry["persona"],
+            "task": entry["task"],
+            "task_description": interface["description"],
+            "interface_name": interface["name"],
+            "file_path": interface["file_path"],
+            "target_rules": TargetResolver.RULES + interface["rules"] if interface["rules"] else None,
+            "screenshots_dir": os.path.join(output_dir, "screenshots"),
+            "screenshots": {"fmt": "png"},
+            "repetition": entry.get("repetition", 0),
+            "seed": entry["seed"],
+            "action_plan": entry["plan"],
+            "entry": entry
+        })
+    
+    os.makedirs(output_dir, exist_ok=True)
+    
+    def compare(index, result):
+        entry = jobs[index]["entry"]
+        if result["error"]:
+            outcomes["failed"] += 1
+            report.append({"cell": entry["name"], "status": "failed", "detail": result["error"]})
+            print(f"   [REPLAY] {entry['name']}: failed ({result['error']})")
+            return
+        log = action_log_bytes(result["executed_actions"])
+        with open(os.path.join(output_dir, f"{entry['name']}.jsonl"), "wb") as f:
+            f.write(log)
+        # Wall-clock logs are only comparable without their timing fields
+        exact = entry["time_mode"] == "virtual"
+        expected = action_log_bytes(entry["log"], timing=exact)
+        actual = log if exact else action_log_bytes(result["executed_actions"], timing=False)
+        if actual == expected:
+            status, detail = "identical", "byte-identical log" if exact else "identical steps (recorded in wall-clock time)"
+        else:
+            lines = list(zip(expected.splitlines(), actual.splitlines()))
+            first = next((i for i, (a, b) in enumerate(lines) if a != b), len(lines))
+            status, detail = "differs", f"first difference at step {first + 1}"
+        outcomes[status] += 1
+        report.append({"cell": entry["name"], "status": status, "detail": detail})
+        print(f"   [REPLAY] {entry['name']}: {status} ({detail})")
+    
+    if jobs:
+        scheduler = SimulationScheduler(None, BrowserPool(size=workers, headless=True, time_mode="virtual"),
+                                        browser_workers=workers, stream_plans=False)
+        scheduler.run(jobs, on_result=compare)
+        scheduler.report()
+    
+    report.sort(key=lambda item: item["cell"])
+    with open(os.path.join(output_dir, "replay_report.json"), "w", encoding="utf-8") as f:
+        json.dump({"outcomes": outcomes, "cells": report}, f, indent=2)
+    print(f"\n   [REPLAY] {len(entries)} cells: {outcomes['identical']} identical, {outcomes['differs']} differ, "
+          f"{outcomes['failed']} failed, {outcomes['stale']} stale")
+    print(f"   [SAVED] {output_dir}/replay_report.json and one log per cell")
+    return EXIT_OK if outcomes["identical"] == len(entries) else EXIT_PARTIAL
+
+
+def load_run_config(path: str) -> Dict:
+    """Read a batch config: TOML for .toml files, JSON otherwise"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("TOML configs need Python 3.11+")
+        config = tomllib.loads(data.decode("utf-8"))
+    else:
+        config = json.loads(data)
+    if not isinstance(config, dict):
+        raise ValueError("config must be a mapping of option names to values")
+    return config
+
+
+def write_run_summary(path: str, summary: Dict):
+    """Write the run summary JSON atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Pipeline settings main() derives from a differently named flag; configs must use the flag name
+CONFIG_FLAG_NAMES = {"report_formats": "report_format", "screenshot_steps": "step_frames",
+                     "trace_path": "trace", "persona_counts": "personas", "parquet": "sink_format"}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="SimPersona - GPT-4 Powered Research Pipeline")
+    parser.add_argument("--config", metavar="FILE",
+                        help="JSON or TOML batch config; its keys are these flags (personas, interfaces, "
+                             "repetitions, planner, ...) plus any pipeline option, and flags override it")
+    parser.add_argument("--personas", metavar="TYPES",
+                        help=f"comma-separated persona types to simulate (default: {','.join(PERSONA_TYPES)})")
+    parser.add_argument("--interfaces", metavar="NAMES",
+                        help="comma-separated interfaces (file names in data/interfaces/ without .html) to test "
+                             "(default: all)")
+    parser.add_argument("--repetitions", type=int, default=1, metavar="N",
+                        help="runs of every persona x interface cell (default: 1)")
+    parser.add_argument("--headed", action="store_true",
+                        help="show the Chrome window instead of running headless")
+    parser.add_argument("--summary", metavar="PATH",
+                        help="where to write the machine-readable run summary (default: data/run_summary.json)")
+    parser.add_argument("--report-format", action="append", choices=sorted(REPORT_EXPORTERS),
+                        help="report output format; repeat for several (default: xlsx)")
+    parser.add_argument("--card-policy", choices=PersonaCardGenerator.POLICIES, default="skip-unchanged",
+                        help="what to do with persona cards that already exist (default: skip-unchanged)")
+    parser.add_argument("--personas-per-type", type=int, default=1, metavar="N",
+                        help="personas to generate for each persona type (default: 1)")
+    parser.add_argument("--persona-seed", type=int, default=0,
+                        help="seed for sampling persona demographics (default: 0)")
+    parser.add_argument("--planner", choices=("gpt", "markov", "hybrid"), default="gpt",
+                        help="action planner: GPT-4, the local model, or local with a GPT sample (default: gpt)")
+    parser.add_argument("--gpt-fraction", type=float, default=0.1,
+                        help="share of cells planned by GPT with --planner hybrid (default: 0.1)")
+    parser.add_argument("--tasks-per-call", type=int, default=3, metavar="N",
+                        help="a persona's tasks planned together in one GPT call; 1 sends one call per cell "
+                             "(default: 3)")
+    parser.add_argument("--cache-mode", choices=("readwrite", "replay", "off"), default="readwrite",
+                        help="LLM response cache in data/llm_cache.sqlite: read and write, replay (cached responses "
+                             "only, no API calls; a miss fails the cell), or off (default: readwrite)")
+    parser.add_argument("--time-mode", choices=BrowserSimulator.TIME_MODES, default="realtime",
+                        help="persona pacing: realtime sleeps the planned delays, compressed only records them, "
+                             "virtual also stamps logs with persona time (default: realtime)")
+    parser.add_argument("--batch-js", action="store_true",
+                        help="send runs of consecutive zero-delay steps to the page as one injected script "
+                             "(every step in compressed and virtual time)")
+    parser.add_argument("--sink-format", choices=("jsonl", "parquet"), default="jsonl",
+                        help="finished-run storage; parquet also writes the rows to a Parquet file "
+                             "in data/ (needs pyarrow; default: jsonl)")
+    parser.add_argument("--screenshot-format", choices=ScreenshotStore.FORMATS, default="webp",
+                        help="screenshot encoding; png is lossless (default: webp)")
+    parser.add_argument("--screenshot-quality", type=int, default=80,
+                        help="WebP quality, 1-100 (default: 80)")
+    parser.add_argument("--screenshot-scope", default="viewport", metavar="SELECTOR",
+                        help="capture only the first element matching this CSS selector (default: viewport)")
+    parser.add_argument("--step-frames", action="store_true",
+                        help="also capture a delta frame after every step")
+    parser.add_argument("--trace", nargs="?", const="data/trace.json", metavar="PATH",
+                        help="record spans to a Chrome trace JSON and print a timing summary (default: data/trace.json)")
+    parser.add_argument("--benchmark", nargs="?", const="40,400", metavar="SIZES",
+                        help="benchmark the pipeline offline at comma-separated persona counts and exit "
+                             "(default: 40,400); results go to data/benchmark.json")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="with --benchmark, store the results as data/benchmark_baseline.json")
+    parser.add_argument("--benchmark-exports", type=int, metavar="ROWS",
+                        help="time every report format on ROWS synthetic detail rows and exit")
+    parser.add_argument("--replay", nargs="?", const="all", metavar="CELLS",
+                        help="re-execute recorded cells from data/replay_record.jsonl without LLM calls and exit; "
+                             "CELLS is all, failed, or comma-separated run ids, persona ids, tasks or "
+                             "persona_id:task (default: all)")
+    parser.add_argument("--replay-workers", type=int, default=2, metavar="N",
+                        help="browsers replaying cells in parallel (default: 2)")
+    parser.add_argument("--serve", nargs="?", type=int, const=8000, metavar="PORT",
+                        help="serve the dashboard on localhost during the run and push new results to it "
+                             "(default: 8000)")
+    args = parser.parse_args(argv)
+    
+    # Paths given on the command line are the caller's; data/ and the rest live next to this file
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    summary_path = os.path.abspath(args.summary) if args.summary else os.path.join(script_dir, "data", "run_summary.json")
+    config_path = os.path.abspath(args.config) if args.config else None
+    os.chdir(script_dir)
+    
+    if args.benchmark:
+        ok = run_benchmarks([int(size) for size in args.benchmark.split(",")], save_baseline=args.save_baseline)
+        return EXIT_OK if ok else EXIT_FAILED
+    
+    if args.benchmark_exports:
+        benchmark_exporters(args.benchmark_exports, args.report_format)
+        return EXIT_OK
+    
+    if args.replay:
+        return run_replay(args.replay, workers=args.replay_workers)
+    
+    started = time.time()
+    pipeline = None
+    
+    def finish(code: int, status: str, error: str = None) -> int:
+        summary = {"status": status, "exit_code": code, "started": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+                   "seconds": round(time.time() - started, 3), "config": args.config, "error": error}
+        if pipeline:
+            summary.update(pipeline.run_summary())
+        write_run_summary(summary_path, summary)
+        print(f"\n[SUMMARY] {status} (exit {code}), written to {summary_path}")
+        return code
+    
+    # Config values become flag defaults, so explicit flags still win
+    options = {}
+    if args.config:
+        try:
+            config = {key.replace("-", "_"): value for key, value in load_run_config(config_path).items()}
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Cannot read config {args.config}: {e}")
+            return finish(EXIT_USAGE, "usage_error", str(e))
+        flags = {key: value for key, value in config.items() if key in vars(args)}
+        options = {key: value for key, value in config.items() if key not in flags}
+        allowed = set(inspect.signature(SimPersonaPipeline.__init__).parameters) - {"self", "api_key", "headless"}
+        unknown = sorted(set(options) - allowed)
+        if unknown:
+            print(f"[ERROR] Unknown config keys: {', '.join(unknown)}")
+            return finish(EXIT_USAGE, "usage_error", f"unknown config keys: {', '.join(unknown)}")
+        # These pipeline settings are always filled in from their flags, so a config value would be lost
+        renamed = sorted(set(options) & set(CONFIG_FLAG_NAMES))
+        if renamed:
+            hint = ", ".join(f"{key} -> {CONFIG_FLAG_NAMES[key]}" for key in renamed)
+            print(f"[ERROR] Config keys set by flags, use the flag names instead: {hint}")
+            return finish(EXIT_USAGE, "usage_error", f"config keys set by flags: {hint}")
+        parser.set_defaults(**flags)
+        args = parser.parse_args(argv)
+    
+    def names(value):
+        return [name.strip() for name in value.split(",") if name.strip()] if isinstance(value, str) else value
+    
+    personas = names(args.personas)
+    persona_counts = personas if isinstance(personas, dict) else (
+        {ptype: args.personas_per_type for ptype in personas} if personas else None)
+    interfaces = names(args.interfaces)
+    report_formats = names(args.report_format) or ["xlsx"]
+    
     print("="*60)
     print("SimPersona - GPT-4 Powered Research Pipeline")
     print("="*60)
-    print("\n[REQUIRED] This pipeline requires GPT-4 API access")
-    print("   No fallback modes available\n")
-    
-    # Check OpenAI library
-    if not OPENAI_AVAILABLE:
-        print("[ERROR] OpenAI library not installed")
-        print("   Run: pip install openai")
-        print("\n[STOP] Cannot proceed without OpenAI library")
-        return
     
-    # Check API key
-    api_key = OPENAI_API_KEY
-    if not api_key or api_key == "your-api-key-here":
+    # The key is only needed when the planner calls the API (GPT planning outside replay mode); without one,
+    # personas must come from a previous run or the response cache
+    api_key = OPENAI_API_KEY.strip() if OPENAI_API_KEY else None
+    if api_key in ("", "!!!key here!!!", "your-api-key-here"):
+        api_key = None
+    needs_api = args.planner != "markov" and args.cache_mode != "replay"
+    planner_label = {"gpt": "GPT-4", "markov": "local model", "hybrid": f"local model, {args.gpt_fraction:.0%} GPT-4"}
+    
+    if api_key:
+        # Check OpenAI library
+        if not OPENAI_AVAILABLE:
+            print("[ERROR] OpenAI library not installed")
+            print("   Run: pip install openai")
+            print("\n[STOP] Cannot proceed without OpenAI library")
+            return finish(EXIT_USAGE, "usage_error", "openai library not installed")
+        print(f"[OK] API Key found: {api_key[:15]}...{api_key[-4:]}")
+    elif needs_api:
         print("[ERROR] No valid API key found")
-        print("   Set OPENAI_API_KEY environment variable, or")
-        print("   Add your key at line 20 in Code.py")
+        print("   Set the OPENAI_API_KEY environment variable, or OPENAI_API_KEY near the top of main.py")
+        print("   Without a key, use --planner markov or a replay-mode response cache")
         print("\n[STOP] Cannot proceed without valid API key")
-        return
-    
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    os.chdir(script_dir)
-    
-    print(f"[OK] API Key found: {api_key[:15]}...{api_key[-4:]}")
-    print(f"[OK] Mode: 100% GPT-4 Powered")
-    print(f"   - Personas: AI-generated")
-    print(f"   - Actions: AI-generated with realistic errors")
+        return finish(EXIT_USAGE, "usage_error", "no API key")
+    else:
+        print("[OK] No API key: offline run (saved personas, cached responses and the local planner only)")
+    print(f"   - Personas: GPT-4, or reused from data/ and the response cache")
+    print(f"   - Actions: {planner_label[args.planner]}")
     
     # Check folder structure
     data_dir = os.path.join(os.getcwd(), "data")
@@ -655,46 +5069,61 @@ def main():
     if not os.path.exists(interfaces_dir):
         print(f"[ERROR] Missing: data/interfaces/ folder")
         print(f"   Create: {interfaces_dir}")
-        print(f"   Add files: login.html, checkout.html, profile.html")
+        print(f"   Add one HTML file per interface, e.g. login.html")
         print("\n[STOP] Cannot proceed without interface files")
-        return
-    
-    required_files = [
-        ("login.html", os.path.join(interfaces_dir, "login.html")),
-        ("checkout.html", os.path.join(interfaces_dir, "checkout.html")),
-        ("profile.html", os.path.join(interfaces_dir, "profile.html"))
-    ]
+        return finish(EXIT_USAGE, "usage_error", "missing data/interfaces/")
     
-    missing = []
-    for name, full_path in required_files:
-        if not os.path.exists(full_path):
-            missing.append(name)
+    # Every page in data/interfaces/ is an interface; InterfaceRegistry discovers its fields
+    pages = sorted(name for name in os.listdir(interfaces_dir) if name.endswith(".html"))
+    missing = [f"{name}.html" for name in interfaces or () if f"{name}.html" not in pages]
     
-    if missing:
+    if not pages or missing:
         print(f"[ERROR] Missing HTML files in data/interfaces/:")
-        for f in missing:
+        for f in missing or ["(no .html files)"]:
             print(f"   - {f}")
         print("\n[STOP] Cannot proceed without all interface files")
-        return
+        return finish(EXIT_USAGE, "usage_error", f"missing interface files: {', '.join(missing) or 'none found'}")
     
-    print(f"[OK] All interface files found")
+    print(f"[OK] {len(pages)} interface files found")
+    if api_key:
+        print("[WARNING] This run uses your OpenAI API credits")
     
-    # Confirm before running (since it will use API credits)
-    print("\n" + "-"*60)
-    print("[WARNING] This will use your OpenAI API credits")
-    print("-"*60)
+    print("\n[START] Initializing pipeline...")
     
-    confirm = input("\n[CONFIRM] Proceed with GPT-4 powered simulation? (yes/no): ").strip().lower()
-    
-    if confirm not in ['yes', 'y']:
-        print("\n[CANCELLED] Pipeline cancelled by user")
-        return
+    try:
+        pipeline = SimPersonaPipeline(**dict(options, api_key=api_key, headless=not args.headed,
+                                             report_formats=report_formats, card_policy=args.card_policy,
+                                             personas_per_type=args.personas_per_type, persona_seed=args.persona_seed,
+                                             planner=args.planner, gpt_fraction=args.gpt_fraction, trace_path=args.trace,
+                                             screenshot_format=args.screenshot_format,
+                                             screenshot_quality=args.screenshot_quality,
+                                             screenshot_scope=args.screenshot_scope, screenshot_steps=args.step_frames,
+                                             persona_counts=persona_counts, interfaces=interfaces,
+                                             repetitions=args.repetitions, tasks_per_call=args.tasks_per_call,
+                                             cache_mode=args.cache_mode, time_mode=args.time_mode,
+                                             batch_js=args.batch_js, parquet=args.sink_format == "parquet"))
+    except ValueError as e:
+        print(f"\n[ERROR] Invalid settings: {e}")
+        return finish(EXIT_USAGE, "usage_error", str(e))
     
-    print("\n[START] Initializing GPT-4 powered pipeline...")
+    server = None
+    if args.serve:
+        try:
+            server = DashboardServer(script_dir, args.serve).start()
+        except OSError as e:
+            print(f"\n[ERROR] Cannot serve the dashboard on port {args.serve}: {e}")
+            return finish(EXIT_USAGE, "usage_error", str(e))
+        print(f"\n[WEB] Live dashboard: {server.url}")
     
     try:
-        pipeline = SimPersonaPipeline(api_key=api_key)
-        pipeline.run_complete_pipeline()
+        try:
+            pipeline.run_complete_pipeline()
+        finally:
+            if server:
+                server.close()
+    except KeyboardInterrupt:
+        print("\n[STOPPED] Interrupted. Finished runs are saved and the next run resumes from them")
+        return finish(EXIT_INTERRUPTED, "interrupted")
     except Exception as e:
         print(f"\n[ERROR] Pipeline failed: {e}")
         print("\nPossible issues:")
@@ -702,6 +5131,11 @@ def main():
         print("   - Insufficient API credits")
         print("   - Network connection issues")
         print("   - Rate limit exceeded")
+        return finish(EXIT_FAILED, "failed", str(e))
+    
+    if pipeline.failed_cells:
+        return finish(EXIT_PARTIAL, "partial", f"{len(pipeline.failed_cells)} cells failed")
+    return finish(EXIT_OK, "ok")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
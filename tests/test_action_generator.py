@@ -0,0 +1,33 @@
+import time
+
+import main
+from test_repetition_seeding import PERSONA, TASKS
+
+
+def test_grouped_stream_does_not_block_the_caller_on_a_sync_client():
+    planner = main.ActionGenerator(None, client=main.FakeChatClient(latency=0.5), tasks_per_call=2)
+    started = time.monotonic()
+    streams = [planner.stream_actions(PERSONA, task, description, TASKS) for task, description in TASKS]
+    assert time.monotonic() - started < 0.25
+    assert all(list(stream) for stream in streams)
+    assert planner.client.calls == 1
+
+
+def test_async_completion_keeps_cache_io_off_the_event_loop(tmp_path):
+    cache = main.ResponseCache(str(tmp_path / "cache.sqlite"))
+    threads = []
+    for name in ("get", "put"):
+        method = getattr(cache, name)
+        setattr(cache, name, lambda *args, method=method: threads.append(main.threading.current_thread()) or method(*args))
+
+    class Client:
+        async def complete(self, usage=None, **request):
+            return "[]"
+
+    async def complete():
+        loop_thread = main.threading.current_thread()
+        await main._achat_completion(Client(), cache, {"model": "gpt-4", "messages": []})
+        return loop_thread
+
+    loop_thread = main.asyncio.run(complete())
+    assert len(threads) == 2 and loop_thread not in threads
@@ -0,0 +1,69 @@
+import json
+
+import main
+
+PLAN = [{"action": "look", "target": "page", "value": "", "notes": "Reading {the} page", "delay": 1.0},
+        {"action": "click", "target": "username_field", "value": "", "notes": "", "delay": 0.5},
+        {"action": "type", "target": "username", "value": "truman]", "notes": "", "delay": 0.0}]
+
+
+def parse(text, chunk=None, targets=None):
+    parser = main.ActionStreamParser(targets)
+    chunks = [text[i:i + chunk] for i in range(0, len(text), chunk)] if chunk else [text]
+    actions = [action for part in chunks for action in parser.feed(part)] + parser.close()
+    return actions, parser.defects
+
+
+def test_streamed_chunks_parse_like_the_whole_response():
+    text = "```json\n" + json.dumps(PLAN) + "\n```\nGood luck!"
+    assert parse(text) == (PLAN, {})
+    assert parse(text, chunk=3) == (PLAN, {})
+
+
+def test_brackets_in_the_preamble_are_skipped_and_counted():
+    fenced = "Here is the plan [3 steps]:\n```json\n" + json.dumps(PLAN) + "\n```"
+    bare = "Plan [v2] follows: " + json.dumps(PLAN)
+    for text in (fenced, bare):
+        assert parse(text) == (PLAN, {"preamble": 1})
+        assert parse(text, chunk=4) == (PLAN, {"preamble": 1})
+
+
+def test_lenient_json_is_repaired():
+    text = """[{action: “look”, "target": "page", "value": None, "notes": "", "delay": 1,},
+               {'action': 'look'}, {"action": "wait", "target": "", "delay": 2}]"""
+    actions, defects = parse(text)
+    assert [a["action"] for a in actions] == ["look", "wait"]
+    assert actions[0]["value"] == "" and actions[1]["target"] == "page"
+    assert defects == {"unparseable": 1}
+
+
+def test_steps_are_validated_and_repaired_one_by_one():
+    text = json.dumps([{"action": "Tap", "target": "Username Field"},
+                       {"action": "dance", "target": "page"},
+                       {"action": "press", "target": "Return"},
+                       {"action": "look", "delay": "soon"},
+                       {"action": "wait", "delay": 999}])
+    actions, defects = parse(text)
+    assert [(a["action"], a["target"]) for a in actions] == [
+        ("click", "username_field"), ("key", "enter"), ("look", "page"), ("wait", "page")]
+    assert actions[2]["delay"] == 0.0 and actions[3]["delay"] == main.MAX_ACTION_DELAY
+    assert defects == {"aliased_action": 2, "renamed_target": 1, "unknown_action": 1, "bad_delay": 1}
+    assert main.validate_action("not a step", defects) is None and defects["not_an_object"] == 1
+
+
+def test_page_targets_count_and_unknown_targets_are_kept():
+    step = json.dumps([{"action": "click", "target": "coupon"}])
+    assert parse(step, targets=["coupon_field"])[1] == {}
+    actions, defects = parse(step)
+    assert actions[0]["target"] == "coupon" and defects == {"unknown_target": 1}
+
+
+def test_truncated_tail_loses_only_the_step_it_cuts_off():
+    text = json.dumps(PLAN)
+    actions, defects = parse(text[:text.rindex("{") + 20], chunk=7)
+    assert actions == PLAN[:2]
+    assert defects == {"truncated": 1}
+
+
+def test_response_without_an_array():
+    assert parse("I cannot help with that.") == ([], {"no_array": 1})
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+import main
+
+
+class FakeSimulator:
+    def __init__(self, headless=True, time_mode="realtime", batch_js=False):
+        self.uses = 0
+        self.closed = False
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(main, "BrowserSimulator", FakeSimulator)
+    return main.BrowserPool(size=1, max_uses=25)
+
+
+def test_waiter_gets_a_new_session_after_a_crash(pool):
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()), daemon=True)
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive(), "the pool is full, so the waiter must block"
+
+    pool.release(held, crashed=True)
+    waiter.join(2)
+    assert not waiter.is_alive(), "a discarded session must free its slot for the waiter"
+    assert got[0] is not held and held.closed
+    assert pool.stats["launches"] == 2 and pool.stats["crashed"] == 1
+
+
+def test_waiter_reuses_a_released_session(pool):
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()), daemon=True)
+    waiter.start()
+    pool.release(held)
+    waiter.join(2)
+    assert got == [held]
+    assert pool.stats["launches"] == 1 and pool.stats["reuses"] == 1
+
+
+def test_worn_out_session_is_recycled(pool):
+    pool.max_uses = 1
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    assert second is not first and first.closed
+    assert pool.stats["recycled"] == 1
+
+
+def test_close_quits_idle_sessions(pool):
+    simulator = pool.acquire()
+    pool.release(simulator)
+    pool.close()
+    assert simulator.closed
+    pool.acquire()
+    assert pool.stats["launches"] == 2
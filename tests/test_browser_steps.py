@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+
+class FakeElement:
+    def __init__(self, editable=True):
+        self.editable = editable
+        self.keys = []
+
+    def send_keys(self, keys):
+        self.keys.append(keys)
+
+    def clear(self):
+        self.keys.append(None)
+
+
+class FakeDriver:
+    """Answers the simulator's scripts the way the page would"""
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.switch_to = SimpleNamespace(active_element=FakeElement())
+
+    def execute_script(self, script, *args):
+        if script == main.TARGET_MAP_JS:
+            return self.targets
+        if script == main.EDITABLE_JS:
+            return args[0].editable
+        if script == main.BATCH_ACTIONS_JS:
+            return [self.run_step(step) for step in args[0]]
+        raise AssertionError("unexpected script")
+
+    @staticmethod
+    def run_step(step):
+        el = step["element"]
+        outcome = "ok"
+        if step["action"] in ("click", "type", "clear") and el is None:
+            outcome = "missed"
+        elif step["action"] in ("type", "clear") and not el.editable:
+            outcome = "failed"
+        elif step["action"] == "type":
+            el.send_keys(step["value"])
+        elif step["action"] == "clear":
+            el.clear()
+        return {"ok": True, "error": "", "navigates": False, "outcome": outcome}
+
+
+PLAN = [{"action": "type", "target": "username", "value": "truman"},
+        {"action": "clear", "target": "bio"},
+        {"action": "type", "target": "bio", "value": "hello"},
+        {"action": "clear", "target": "nickname"},
+        {"action": "clear", "target": "username"}]
+
+
+@pytest.fixture
+def make_simulator(monkeypatch):
+    def make(batch_js):
+        driver = FakeDriver({"username_field": FakeElement(), "bio_field": FakeElement(editable=False)})
+        monkeypatch.setattr(main, "webdriver", SimpleNamespace(Chrome=lambda options: driver))
+        return main.BrowserSimulator(headless=True, time_mode="virtual", batch_js=batch_js), driver
+    return make
+
+
+@pytest.mark.parametrize("batch_js", [False, True])
+def test_type_and_clear_act_on_the_resolved_element(make_simulator, batch_js):
+    simulator, driver = make_simulator(batch_js)
+    log = simulator.execute_actions(PLAN)
+    assert [step["outcome"] for step in log] == ["ok", "failed", "failed", "missed", "ok"]
+    assert driver.targets["username_field"].keys == ["truman", None]
+    assert driver.targets["bio_field"].keys == []
+    assert driver.switch_to.active_element.keys == []
+    assert simulator.run_stats["batches"] == (1 if batch_js else 0)
+
+
+def test_batch_and_per_step_logs_match(make_simulator):
+    logs = [make_simulator(batch_js)[0].execute_actions(PLAN) for batch_js in (False, True)]
+    strip = lambda log: [{k: v for k, v in step.items() if k not in ("duration", "t", "timestamp")} for step in log]
+    assert strip(logs[0]) == strip(logs[1])
@@ -0,0 +1,126 @@
+import functools
+import json
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def pipeline_kwargs(monkeypatch):
+    # Stop main() where it builds the pipeline and keep the settings it would have used
+    seen = {}
+    init = main.SimPersonaPipeline.__init__
+
+    @functools.wraps(init)
+    def capture(self, **kwargs):
+        seen.update(kwargs)
+        raise ValueError("captured")
+
+    monkeypatch.setattr(main.SimPersonaPipeline, "__init__", capture)
+    monkeypatch.setattr(main, "OPENAI_AVAILABLE", True)
+    monkeypatch.setattr(main, "OPENAI_API_KEY", "sk-test-0000000000000000")
+    monkeypatch.chdir(main.os.getcwd())
+    return seen
+
+
+def run(tmp_path, config, *flags):
+    path = tmp_path / "run.json"
+    path.write_text(json.dumps(config))
+    code = main.main(["--config", str(path), "--summary", str(tmp_path / "summary.json"), *flags])
+    return code, json.loads((tmp_path / "summary.json").read_text())
+
+
+def test_config_values_become_flag_defaults(tmp_path, pipeline_kwargs):
+    run(tmp_path, {"card_policy": "overwrite", "persona_seed": 7, "queue_size": 3})
+    assert pipeline_kwargs["card_policy"] == "overwrite"
+    assert pipeline_kwargs["persona_seed"] == 7
+    assert pipeline_kwargs["queue_size"] == 3
+
+
+def test_explicit_flags_win_over_config(tmp_path, pipeline_kwargs):
+    run(tmp_path, {"card_policy": "overwrite", "persona_seed": 7}, "--persona-seed", "9")
+    assert pipeline_kwargs["card_policy"] == "overwrite"
+    assert pipeline_kwargs["persona_seed"] == 9
+
+
+@pytest.mark.parametrize("key", sorted(main.CONFIG_FLAG_NAMES))
+def test_keys_owned_by_flags_are_rejected(tmp_path, pipeline_kwargs, key):
+    code, summary = run(tmp_path, {key: "value"})
+    assert code == main.EXIT_USAGE
+    assert main.CONFIG_FLAG_NAMES[key] in summary["error"]
+    assert not pipeline_kwargs
+
+
+def test_unknown_keys_are_rejected(tmp_path, pipeline_kwargs):
+    code, summary = run(tmp_path, {"no_such_option": 1})
+    assert code == main.EXIT_USAGE
+    assert "no_such_option" in summary["error"]
+
+
+def test_replay_runs_in_the_project_folder(tmp_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(main, "run_replay", lambda cells, workers: seen.append(main.os.getcwd()) or main.EXIT_OK)
+    monkeypatch.chdir(tmp_path)
+    assert main.main(["--replay", "all"]) == main.EXIT_OK
+    assert seen == [main.os.path.dirname(main.os.path.abspath(main.__file__))]
+
+
+def test_config_and_summary_paths_are_relative_to_the_caller(tmp_path, pipeline_kwargs, monkeypatch):
+    (tmp_path / "run.json").write_text(json.dumps({"persona_seed": 5}))
+    monkeypatch.chdir(tmp_path)
+    main.main(["--config", "run.json", "--summary", "summary.json"])
+    assert pipeline_kwargs["persona_seed"] == 5
+    assert (tmp_path / "summary.json").exists()
+
+
+def test_benchmarks_run_in_the_project_folder(tmp_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(main, "run_benchmarks", lambda sizes, save_baseline: seen.append(main.os.getcwd()) or True)
+    monkeypatch.setattr(main, "benchmark_exporters", lambda rows, formats: seen.append(main.os.getcwd()))
+    monkeypatch.chdir(tmp_path)
+    assert main.main(["--benchmark", "4"]) == main.EXIT_OK
+    assert main.main(["--benchmark-exports", "10"]) == main.EXIT_OK
+    assert seen == [main.os.path.dirname(main.os.path.abspath(main.__file__))] * 2
+
+
+def test_local_planner_runs_without_an_api_key(tmp_path, pipeline_kwargs, monkeypatch):
+    monkeypatch.setattr(main, "OPENAI_API_KEY", " !!!key here!!! ")
+    run(tmp_path, {}, "--planner", "markov")
+    assert pipeline_kwargs["api_key"] is None
+
+
+def test_gpt_planner_needs_an_api_key(tmp_path, pipeline_kwargs, monkeypatch):
+    monkeypatch.setattr(main, "OPENAI_API_KEY", " !!!key here!!! ")
+    code, summary = run(tmp_path, {})
+    assert code == main.EXIT_USAGE and summary["error"] == "no API key"
+    assert not pipeline_kwargs
+
+
+def test_replay_cache_mode_runs_without_an_api_key(tmp_path, pipeline_kwargs, monkeypatch):
+    monkeypatch.setattr(main, "OPENAI_API_KEY", " !!!key here!!! ")
+    run(tmp_path, {}, "--cache-mode", "replay")
+    assert pipeline_kwargs["cache_mode"] == "replay" and pipeline_kwargs["api_key"] is None
+    run(tmp_path, {"cache_mode": "off"}, "--planner", "markov")
+    assert pipeline_kwargs["cache_mode"] == "off"
+
+
+def test_time_mode_flag(tmp_path, pipeline_kwargs):
+    run(tmp_path, {"time_mode": "virtual"})
+    assert pipeline_kwargs["time_mode"] == "virtual"
+    run(tmp_path, {"time_mode": "virtual"}, "--time-mode", "compressed")
+    assert pipeline_kwargs["time_mode"] == "compressed"
+
+
+def test_batch_js_flag(tmp_path, pipeline_kwargs):
+    run(tmp_path, {})
+    assert pipeline_kwargs["batch_js"] is False
+    run(tmp_path, {}, "--batch-js")
+    assert pipeline_kwargs["batch_js"] is True
+
+
+def test_sink_format_flag(tmp_path, pipeline_kwargs):
+    run(tmp_path, {})
+    assert pipeline_kwargs["parquet"] is False
+    run(tmp_path, {"sink_format": "parquet"})
+    assert pipeline_kwargs["parquet"] is True
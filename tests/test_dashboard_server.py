@@ -0,0 +1,38 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import main
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("site")
+    for name in ("index.html", "assets/js/app.js", "data/dashboard/index.json", "data/simpersonas.json",
+                 "llm_cache.sqlite", "run.json", "data/simpersona_runs.jsonl"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(name)
+    server = main.DashboardServer(str(tmp_path), port=0).start()
+    yield server.url.rsplit("/", 1)[0]
+    server.close()
+
+
+def status(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.mark.parametrize("path", ["/", "/index.html", "/assets/js/app.js", "/data/dashboard/index.json?v=1",
+                                  "/data/simpersonas.json"])
+def test_serves_the_dashboard(server, path):
+    assert status(server + path) == 200
+
+
+@pytest.mark.parametrize("path", ["/llm_cache.sqlite", "/run.json", "/data/simpersona_runs.jsonl", "/assets/",
+                                  "/assets/../llm_cache.sqlite", "/assets/%2e%2e/run.json", "/data/"])
+def test_hides_the_rest_of_the_project(server, path):
+    assert status(server + path) == 404
@@ -0,0 +1,87 @@
+import json
+import os
+
+import main
+
+PAGE = """<html><head><title>Acme — Newsletter Signup</title></head><body>
+<form>
+  <label for="mail">Email</label><input id="mail" type="email">
+  <label>Favourite colour <input name="colour" placeholder="e.g. Teal"></label>
+  <input type="hidden" name="token" value="x">
+  <select aria-label="Plan"><option>Free</option></select>
+  <input type="checkbox" id="terms"><label for="terms">Accept terms</label>
+  <button type="submit">Subscribe</button>
+  <a href="#">Sign up later</a>
+</form></body></html>"""
+
+
+def test_page_is_parsed_into_targets_fields_and_rules():
+    descriptor = main.InterfaceRegistry.describe(PAGE, "newsletter")
+    assert descriptor["name"] == "Newsletter Signup" and descriptor["label"] == "Newsletter Signup Form"
+    fields = {field["target"]: field for field in descriptor["fields"]}
+    assert list(fields) == ["email_field", "favourite_colour_field", "shipping_field", "accept_terms_field"]
+    # Known targets come from TargetResolver.RULES; the rest get a rule of their own
+    assert [rule[0] for rule in descriptor["rules"]] == ["favourite_colour_field", "accept_terms_field"]
+    assert fields["email_field"]["value"] == "truman@example.com"
+    assert fields["favourite_colour_field"]["value"] == "Teal"
+    assert fields["accept_terms_field"]["value"] == "" and fields["shipping_field"]["label"] == "Plan"
+    assert descriptor["buttons"] == [{"target": "button", "label": "Subscribe"}]
+    assert descriptor["links"] == [{"target": "signup_link", "label": "Sign up later"}]
+    # Typed fields are offered under their short name too; hidden inputs are not offered at all
+    assert descriptor["targets"] == ["page", "email_field", "email", "favourite_colour_field", "favourite_colour",
+                                     "shipping_field", "accept_terms_field", "button", "signup_link"]
+    assert descriptor["description"].startswith("a newsletter signup form with email, favourite colour")
+
+
+def test_untitled_page_is_named_after_its_file():
+    descriptor = main.InterfaceRegistry.describe("<input placeholder='Search'>", "site-search")
+    assert descriptor["name"] == "Site Search"
+    assert descriptor["fields"][0]["target"] == "search_field"
+
+
+def test_scan_reuses_cached_descriptors_until_a_page_changes(tmp_path):
+    pages = tmp_path / "interfaces"
+    pages.mkdir()
+    (pages / "newsletter.html").write_text(PAGE, encoding="utf-8")
+    (pages / "search.html").write_text("<input placeholder='Search'>", encoding="utf-8")
+    (pages / "notes.txt").write_text("not an interface")
+    cache_path = str(tmp_path / "interface_registry.json")
+
+    registry = main.InterfaceRegistry(str(pages), cache_path)
+    interfaces = registry.scan()
+    assert sorted(interfaces) == ["newsletter", "search"]
+    assert interfaces["search"]["file_path"] == os.path.join(str(pages), "search.html")
+    assert registry.stats == {"interfaces": 2, "parsed": 2, "cached": 0}
+
+    registry = main.InterfaceRegistry(str(pages), cache_path)
+    assert registry.scan() == interfaces
+    assert registry.stats == {"interfaces": 2, "parsed": 0, "cached": 2}
+
+    (pages / "search.html").write_text("<input placeholder='Search'><button>Go</button>", encoding="utf-8")
+    os.remove(pages / "newsletter.html")
+    registry = main.InterfaceRegistry(str(pages), cache_path)
+    interfaces = registry.scan()
+    assert interfaces["search"]["buttons"] == [{"target": "button", "label": "Go"}]
+    assert registry.stats == {"interfaces": 1, "parsed": 1, "cached": 0}
+    with open(cache_path, encoding="utf-8") as f:
+        assert list(json.load(f)["interfaces"]) == [f"search:{interfaces['search']['hash']}"]
+
+
+def test_cache_from_another_version_is_ignored(tmp_path):
+    pages = tmp_path / "interfaces"
+    pages.mkdir()
+    (pages / "search.html").write_text("<input placeholder='Search'>", encoding="utf-8")
+    cache_path = tmp_path / "interface_registry.json"
+    main.InterfaceRegistry(str(pages), str(cache_path)).scan()
+    data = json.loads(cache_path.read_text())
+    cache_path.write_text(json.dumps(dict(data, version=main.InterfaceRegistry.VERSION + 1)))
+
+    registry = main.InterfaceRegistry(str(pages), str(cache_path))
+    registry.scan()
+    assert registry.stats["parsed"] == 1
+
+
+def test_shipped_interfaces_offer_their_resolver_targets():
+    interfaces = main.InterfaceRegistry(os.path.join(os.path.dirname(main.__file__), "data", "interfaces")).scan()
+    assert {"login", "checkout", "profile"} <= set(interfaces)
+    assert {"username_field", "password_field", "button"} <= set(interfaces["login"]["targets"])
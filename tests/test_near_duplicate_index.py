@@ -0,0 +1,43 @@
+import json
+
+import main
+
+TEXT = ("Retail store manager who checks every label twice before submitting a form and "
+        "keeps a notebook of passwords because reset emails never arrive on time")
+
+
+def test_near_duplicates_hit_and_distinct_text_misses():
+    index = main.NearDuplicateIndex(threshold=0.8)
+    assert index.add("p01", TEXT) is None
+    assert index.add("p02", TEXT.replace("twice", "twice,").upper()) == "p01"
+    assert index.add("p03", "Night shift nurse who fills forms on a phone between patients using voice input only") is None
+    assert len(index) == 2
+
+
+def test_threshold_decides_how_close_a_duplicate_is():
+    # One word changed: 3 of 27 shingles differ
+    edited = TEXT.replace("notebook", "spreadsheet")
+    loose = main.NearDuplicateIndex(threshold=0.5)
+    loose.add("p01", TEXT)
+    strict = main.NearDuplicateIndex(threshold=0.99)
+    strict.add("p01", TEXT)
+    assert loose.add("p02", edited) == "p01"
+    assert strict.add("p02", edited) is None
+
+
+def test_signatures_are_deterministic_per_seed():
+    assert (main.NearDuplicateIndex(seed=7).signature(TEXT) == main.NearDuplicateIndex(seed=7).signature(TEXT)).all()
+    assert len(main.NearDuplicateIndex().signature("")) == 64
+
+
+def test_population_regenerates_then_drops_duplicates():
+    persona = {"age": 30, "gender": "female", "location": "Canada", "occupation": "Store manager",
+               "tech_experience": "Low", "description": TEXT, "goals": ["finish"], "frustrations": ["waiting"],
+               "preferred_actions": ["click"]}
+    client = main.FakeChatClient(responder=lambda messages: json.dumps(persona))
+    generator = main.PersonaGenerator(None, client=client)
+    personas = list(generator.generate_population([("p01", "novice"), ("p02", "novice")],
+                                                  dedup=main.NearDuplicateIndex(), max_attempts=3))
+    assert [p["id"] for p in personas] == ["p01"]
+    assert generator.population_stats == {"generated": 1, "duplicates": 3, "dropped": 1, "failed": 0}
+    assert client.calls == 4
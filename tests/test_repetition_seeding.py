@@ -0,0 +1,46 @@
+import main
+
+PERSONA = {"id": "novice_1", "type": "novice", "label": "Novice User",
+           "behavior": {"description": "New to the web", "goals": ["finish"], "frustrations": ["jargon"]},
+           "demographics": {"tech_comfort": "Low"}}
+TASKS = [("login", "Login form with username and password"), ("signup", "Signup form with name, email and password")]
+
+
+def seeds(repetition):
+    return [main.cell_seed(0, PERSONA["id"], task, repetition) for task, _ in TASKS]
+
+
+def test_markov_repetitions_draw_their_own_plans():
+    planner = main.MarkovActionGenerator()
+    task, description = TASKS[1]
+    plans = [planner.generate_actions(PERSONA, task, description, seed=main.cell_seed(0, PERSONA["id"], task, r))
+             for r in range(6)]
+    assert len({repr(plan) for plan in plans}) > 1
+    assert planner.generate_actions(PERSONA, task, description, seed=seeds(0)[1]) == plans[0]
+
+
+def test_gpt_requests_and_cache_keys_carry_the_cell_seed(tmp_path):
+    client = main.FakeChatClient()
+    sent = []
+    create = client.create
+    client.chat.completions.create = lambda **request: sent.append(request) or create(**request)
+    cache = main.ResponseCache(str(tmp_path / "cache.sqlite"))
+    planner = main.ActionGenerator(None, client=client, cache=cache)
+    task, description = TASKS[0]
+    for repetition in (0, 1, 0):
+        planner.generate_actions(PERSONA, task, description, seed=seeds(repetition)[0])
+    assert [request["seed"] for request in sent] == [seeds(0)[0], seeds(1)[0]]
+    assert cache.stats["hits"] == 1
+
+
+def test_group_calls_are_shared_within_a_repetition_only():
+    client = main.FakeChatClient()
+    planner = main.ActionGenerator(None, client=client, tasks_per_call=2)
+    for repetition in (0, 1):
+        group = [(task, description, seed) for (task, description), seed in zip(TASKS, seeds(repetition))]
+        for (task, description), seed in zip(TASKS, seeds(repetition)):
+            assert planner.generate_actions(PERSONA, task, description, group, seed=seed)
+    assert client.calls == 2
+    # Each repetition's tokens are booked to its own cells
+    usage = [planner.pop_usage(PERSONA, "login", seed) for seed in (seeds(0)[0], seeds(1)[0])]
+    assert all(u["prompt_tokens"] > 0 for u in usage)
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+import main
+
+
+def step(n, action="click", target="submit", outcome="ok", duration=1.0):
+    return {"step": n, "action": action, "target": target, "t": float(n), "duration": duration, "outcome": outcome}
+
+
+@pytest.fixture
+def runs(tmp_path):
+    """Three stored runs, one run from before the step store, and orphaned steps of a replaced run"""
+    store = main.StepStore(str(tmp_path / "steps"))
+    store.append_run(0, [step(1), step(2, "error", "email"), step(3, outcome="missed")])
+    store.append_run(1, [step(1), step(2, duration=3.0)])
+    store.append_run(2, [step(1, "error", "email", outcome="error"), step(2, "error", "password")])
+    store.append_run(7, [step(1), step(2), step(3), step(4)])
+    store.close()
+    return pd.DataFrame({
+        "run_id": [0, 1, 2, None],
+        "persona_label": ["Novice", "Novice", "Expert", "Expert"],
+        "task_label": ["Login", "Login", "Login", "Checkout"],
+        "steps_count": [0, 0, 0, 6],
+        "errors": [1, 0, 2, 0],
+        "success": [False, True, True, True]
+    })
+
+
+def compute(tmp_path, runs, **kwargs):
+    return main.ReportEngine(runs, str(tmp_path / "steps"), bootstrap=200, **kwargs).compute()
+
+
+def test_cells_are_grouped_from_stored_steps(tmp_path, runs):
+    cells = compute(tmp_path, runs)["cells"].set_index(["persona_label", "task_label"])
+    novice = cells.loc[("Novice", "Login")]
+    assert novice["runs"] == 2 and novice["avg_steps"] == 2.5
+    assert novice["avg_duration"] == 3.5
+    assert novice["success_rate"] == 50.0 and novice["total_errors"] == 1
+    assert novice["ok_steps"] == 4 and novice["missed_steps"] == 1
+    assert cells.loc[("Expert", "Login")]["error_steps"] == 1
+    # A run with no stored steps falls back to its summary row; orphaned steps are ignored
+    assert cells.loc[("Expert", "Checkout")]["avg_steps"] == 6
+
+
+def test_error_breakdown_counts_planned_errors_by_target(tmp_path, runs):
+    errors = compute(tmp_path, runs)["errors"]
+    counts = {(row.persona_label, row.error_target): row.count for row in errors.itertuples()}
+    assert counts == {("Novice", "email"): 1, ("Expert", "email"): 1, ("Expert", "password"): 1}
+
+
+def test_chunk_size_does_not_change_the_tables(tmp_path, runs):
+    whole = compute(tmp_path, runs)
+    chunked = compute(tmp_path, runs, chunk_rows=2)
+    for name in whole:
+        pd.testing.assert_frame_equal(whole[name], chunked[name])
+
+
+def test_persona_table_has_bootstrap_intervals(tmp_path, runs):
+    persona = compute(tmp_path, runs)["persona"].set_index("persona_label")
+    novice = persona.loc["Novice"]
+    assert novice["success_ci_low"] <= novice["success_rate"] <= novice["success_ci_high"]
+    assert novice["steps_ci_low"] <= novice["avg_steps"] <= novice["steps_ci_high"]
+    assert novice["steps_p50"] == 2.5
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+import main
+
+
+def request(text="Plan the login task", **extra):
+    return dict({"model": "gpt-4", "messages": [{"role": "user", "content": text}],
+                 "temperature": 0.7, "max_tokens": 800}, **extra)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "llm_cache.sqlite")
+
+
+def test_miss_then_hit(path):
+    cache = main.ResponseCache(path)
+    assert cache.get(request()) is None
+    cache.put(request(), "[]")
+    assert cache.get(request()) == "[]"
+    assert cache.get(request("Plan the checkout task")) is None
+    assert cache.stats == {"hits": 1, "misses": 2, "writes": 1, "evicted": 0}
+    cache.close()
+
+
+def test_responses_survive_a_reopen(path):
+    cache = main.ResponseCache(path)
+    cache.put(request(), "plan")
+    cache.close()
+    cache = main.ResponseCache(path)
+    assert cache.get(request()) == "plan"
+    assert list(cache.entries()) == [(request(), "plan")]
+    cache.close()
+
+
+def test_key_covers_the_response_inputs_only(path):
+    key = main.ResponseCache.make_key(request())
+    assert main.ResponseCache.make_key(request(stream=True, timeout=30)) == key
+    assert main.ResponseCache.make_key(request(seed=None)) == key
+    assert main.ResponseCache.make_key(request(seed=1)) != key
+    assert main.ResponseCache.make_key(request(seed=1)) != main.ResponseCache.make_key(request(seed=2))
+    assert main.ResponseCache.make_key(request(temperature=0.0)) != key
+
+
+def test_replay_serves_hits_and_raises_on_misses(path):
+    cache = main.ResponseCache(path)
+    cache.put(request(), "plan")
+    cache.close()
+    replay = main.ResponseCache(path, mode="replay")
+    assert replay.get(request()) == "plan"
+    with pytest.raises(main.CacheMissError):
+        replay.get(request("Plan the checkout task"))
+    replay.put(request("Plan the checkout task"), "other")
+    assert replay.stats["writes"] == 0
+    with pytest.raises(main.CacheMissError):
+        replay.get(request("Plan the checkout task"))
+    replay.close()
+
+
+def test_chat_completion_calls_the_client_only_on_a_miss(path):
+    cache = main.ResponseCache(path)
+    client = main.FakeChatClient(responder=lambda messages: "plan")
+    assert main._chat_completion(client, cache, request()) == "plan"
+    assert main._chat_completion(client, cache, request()) == "plan"
+    assert client.calls == 1
+    cache.close()
+
+
+def test_stale_and_oversized_entries_are_evicted(path):
+    cache = main.ResponseCache(path, max_bytes=10)
+    cache.put(request("a"), "x" * 8)
+    time.sleep(0.01)
+    cache.put(request("b"), "y" * 8)
+    cache.evict()
+    assert [content for _, content in cache.entries()] == ["y" * 8]
+    cache.max_age = -1
+    cache.evict()
+    assert list(cache.entries()) == []
+    assert cache.stats["evicted"] == 2
+    cache.close()
+
+
+def test_unknown_mode_is_rejected(path):
+    with pytest.raises(ValueError):
+        main.ResponseCache(path, mode="off")
@@ -0,0 +1,63 @@
+import pytest
+
+import main
+
+
+def rows(n, start=0):
+    return [{"persona_id": f"p{i:02d}", "task": "login", "steps_count": i, "success": i % 2 == 0}
+            for i in range(start, start + n)]
+
+
+def test_rows_round_trip_across_reopens(tmp_path):
+    path = str(tmp_path / "runs.jsonl")
+    sink = main.ResultsSink(path)
+    for row in rows(3):
+        sink.append(row)
+    sink.close()
+    sink = main.ResultsSink(path)
+    for row in rows(2, start=3):
+        sink.append(row)
+    sink.close()
+    assert main.ResultsSink.load(path) == rows(5)
+    assert sink.rows_written == 2
+
+
+def test_rows_are_synced_in_batches(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(main.os, "fsync", synced.append)
+    sink = main.ResultsSink(str(tmp_path / "runs.jsonl"), fsync_every=3, fsync_interval=3600)
+    for row in rows(7):
+        sink.append(row)
+    assert len(synced) == 2
+    sink.close()
+    assert len(synced) == 3
+
+
+def test_torn_tail_without_any_newline_is_dropped(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    path.write_text('{"persona_id": "p0')
+    sink = main.ResultsSink(str(path))
+    sink.append(rows(1)[0])
+    sink.close()
+    assert main.ResultsSink.load(str(path)) == rows(1)
+
+
+def test_parquet_is_skipped_without_pyarrow(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(main, "PYARROW_AVAILABLE", False)
+    sink = main.ResultsSink(str(tmp_path / "runs.jsonl"), parquet_path=str(tmp_path / "runs.parquet"))
+    sink.append(rows(1)[0])
+    sink.close()
+    assert sink.parquet_path is None and not (tmp_path / "runs.parquet").exists()
+    assert "pyarrow not installed" in capsys.readouterr().out
+
+
+def test_parquet_copy_holds_every_row(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sink = main.ResultsSink(str(tmp_path / "runs.jsonl"), parquet_path=str(tmp_path / "runs.parquet"),
+                            row_group_size=2)
+    for row in rows(5):
+        sink.append(row)
+    sink.close()
+    parquet = pq.ParquetFile(str(tmp_path / "runs.parquet"))
+    assert parquet.num_row_groups == 3
+    assert parquet.read().to_pylist() == rows(5)
@@ -0,0 +1,43 @@
+import json
+
+import main
+
+
+def test_finished_steps_survive_a_restart(tmp_path):
+    path = str(tmp_path / "run_manifest.json")
+    main.RunManifest(path).mark_step("personas", "abc", count=4)
+    manifest = main.RunManifest(path)
+    assert manifest.step_done("personas", "abc")
+    assert manifest.data["steps"]["personas"]["count"] == 4
+
+
+def test_a_step_with_changed_inputs_is_redone(tmp_path):
+    path = str(tmp_path / "run_manifest.json")
+    main.RunManifest(path).mark_step("cards", "old")
+    manifest = main.RunManifest(path)
+    assert not manifest.step_done("cards", "new")
+    assert not manifest.step_done("reports", "old")
+
+
+def test_unreadable_or_old_manifests_start_clean(tmp_path):
+    path = tmp_path / "run_manifest.json"
+    path.write_text("{not json")
+    assert main.RunManifest(str(path)).data == {"steps": {}}
+    path.write_text(json.dumps({"steps": {"personas": {"input_hash": "abc"}}, "cells": {"p1|login": "h"}}))
+    manifest = main.RunManifest(str(path))
+    assert manifest.step_done("personas", "abc") and "cells" not in manifest.data
+
+
+def test_runs_log_is_the_cell_checkpoint(tmp_path):
+    # Each finished cell is on disk at once; a torn last line from a crash is dropped on reopen
+    path = str(tmp_path / "runs.jsonl")
+    sink = main.ResultsSink(path)
+    for n in range(3):
+        sink.append({"persona_id": f"p{n}", "task": "login", "input_hash": f"h{n}"})
+    sink.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"persona_id": "p3", "ta')
+    sink = main.ResultsSink(path)
+    sink.append({"persona_id": "p3", "task": "login", "input_hash": "h3"})
+    sink.close()
+    assert [row["input_hash"] for row in main.ResultsSink.load(path)] == ["h0", "h1", "h2", "h3"]
@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+from test_browser_pool import FakeSimulator
+
+PLAN = [{"action": "look", "target": "page", "value": "", "notes": "", "delay": 0.0}]
+
+
+class FakePlanner:
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+
+    def generate_actions(self, persona, task, task_description, group=None, seed=None):
+        time.sleep(self.seconds)
+        return list(PLAN)
+
+
+def fake_simulate_cell(simulator, job):
+    time.sleep(job["seconds"])
+    return {"executed_actions": [{"action": "look"}], "stats": {}}
+
+
+@pytest.fixture(autouse=True)
+def fake_browser(monkeypatch):
+    monkeypatch.setattr(main, "BrowserSimulator", FakeSimulator)
+    monkeypatch.setattr(main, "simulate_cell", fake_simulate_cell)
+
+
+def job(n, seconds):
+    return {"persona": {"id": f"p{n}", "type": "novice"}, "task": "login", "task_description": "Login",
+            "seconds": seconds}
+
+
+def scheduler(planner=None, browser_workers=1, job_timeout=0.5):
+    return main.SimulationScheduler(planner or FakePlanner(), main.BrowserPool(size=browser_workers),
+                                    llm_workers=1, browser_workers=browser_workers, job_timeout=job_timeout,
+                                    use_processes=False, stream_plans=False)
+
+
+def test_timeout_does_not_spill_onto_jobs_queued_behind_a_hung_worker():
+    results = scheduler().run([job(0, 1.5), job(1, 0.05), job(2, 0.05)])
+    assert results[0]["error"].startswith("Timed out")
+    assert [r["error"] for r in results[1:]] == [None, None]
+    assert all(r["executed_actions"] for r in results[1:])
+
+
+def test_results_are_reported_once_in_job_order():
+    reported = []
+    sched = scheduler(browser_workers=2)
+    results = sched.run([job(n, 0.01 * (3 - n)) for n in range(3)], on_result=lambda i, r: reported.append(i))
+    assert sorted(reported) == [0, 1, 2]
+    assert [r["job"]["persona"]["id"] for r in results] == ["p0", "p1", "p2"]
+    assert sched.stats["completed"] == 3 and sched.stats["timed_out"] == 0
+
+
+def test_timeout_counts_from_when_a_queued_job_starts():
+    # The executor runs one job at a time, so later jobs wait in its queue longer than job_timeout
+    class SingleWorkerScheduler(main.SimulationScheduler):
+        def _browser_executor(self):
+            return ThreadPoolExecutor(max_workers=1)
+
+    sched = SingleWorkerScheduler(FakePlanner(), main.BrowserPool(size=3), llm_workers=3, browser_workers=3,
+                                  job_timeout=0.5, use_processes=False, stream_plans=False)
+    results = sched.run([job(n, 0.3) for n in range(3)])
+    assert [r["error"] for r in results] == [None, None, None]
+    assert sched.stats["timed_out"] == 0
@@ -0,0 +1,108 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import main
+
+
+def png(button=None, noise=0):
+    """A 160x120 page with an optional filled box, as captured PNG bytes"""
+    image = Image.new("RGB", (160, 120), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((10, 10, 150, 30), fill="navy")
+    if button:
+        draw.rectangle(button, fill="green")
+    if noise:
+        pixels = np.asarray(image).copy()
+        pixels[60, 80] = (255 - noise, 255, 255)
+        image = Image.fromarray(pixels)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def pixels(image):
+    return np.asarray(image.convert("RGB"))
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "screenshots")
+
+
+def frames(directory):
+    return sorted(os.listdir(os.path.join(directory, "frames")))
+
+
+def test_identical_captures_share_one_frame(directory):
+    store = main.ScreenshotStore(directory, fmt="png")
+    store.submit("p01_login_before", png())
+    store.submit("p02_login_before", png())
+    store.submit("p01_login_after", png(button=(40, 60, 120, 90)))
+    store.close()
+
+    assert len(frames(directory)) == 2
+    assert store.stats["written"] == 2 and store.stats["deduplicated"] == 1
+    index = main.ScreenshotStore.load_index(directory)
+    assert index["p01_login_before"]["frame"] == index["p02_login_before"]["frame"]
+    assert index["p01_login_after"]["frame"] != index["p01_login_before"]["frame"]
+
+
+def test_near_duplicates_merge_only_within_max_distance(directory, tmp_path):
+    exact = main.ScreenshotStore(directory, fmt="png")
+    exact.submit("a", png())
+    exact.submit("b", png(noise=40))
+    exact.close()
+    assert exact.stats["written"] == 2
+
+    near = main.ScreenshotStore(str(tmp_path / "near"), fmt="png", max_distance=4)
+    near.submit("a", png())
+    near.submit("b", png(noise=40))
+    near.close()
+    assert near.stats["deduplicated"] == 1
+    assert len(frames(str(tmp_path / "near"))) == 1
+
+
+def test_png_frames_round_trip_losslessly(directory):
+    store = main.ScreenshotStore(directory, fmt="png")
+    store.submit("p01_login_before", png(button=(40, 60, 120, 90)))
+    store.close()
+    loaded = main.ScreenshotStore.load(directory, "p01_login_before")
+    assert (pixels(loaded) == pixels(Image.open(io.BytesIO(png(button=(40, 60, 120, 90)))))).all()
+
+
+def test_delta_frames_store_the_changed_box_and_rebuild(directory):
+    store = main.ScreenshotStore(directory, fmt="png")
+    store.submit("cell_before", png(), sequence="cell")
+    store.submit("cell_step001", png(button=(40, 60, 80, 90)), sequence="cell", delta=True)
+    store.submit("cell_step002", png(button=(40, 60, 80, 90)), sequence="cell", delta=True)
+    store.end_sequence("cell")
+    store.close()
+
+    index = main.ScreenshotStore.load_index(directory)
+    assert index["cell_step001"]["delta_of"] == "cell_before"
+    assert index["cell_step001"]["box"] == [40, 60, 81, 91]
+    assert index["cell_step002"]["box"] is None
+    assert store.stats["deltas"] == 1 and store.stats["unchanged"] == 1
+    expected = pixels(Image.open(io.BytesIO(png(button=(40, 60, 80, 90)))))
+    for name in ("cell_step001", "cell_step002"):
+        assert (pixels(main.ScreenshotStore.load(directory, name)) == expected).all()
+
+
+def test_reopened_store_reuses_frames_on_disk(directory):
+    first = main.ScreenshotStore(directory, fmt="png")
+    first.submit("a", png())
+    first.close()
+    second = main.ScreenshotStore(directory, fmt="png")
+    second.submit("b", png())
+    second.close()
+    assert second.stats["deduplicated"] == 1 and len(frames(directory)) == 1
+    assert set(main.ScreenshotStore.load_index(directory)) == {"a", "b"}
+
+
+def test_unknown_format_is_rejected(directory):
+    with pytest.raises(ValueError):
+        main.ScreenshotStore(directory, fmt="gif")
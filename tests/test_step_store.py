@@ -0,0 +1,80 @@
+import numpy as np
+
+import main
+
+
+def steps(*actions):
+    return [{"step": i + 1, "action": action, "target": target, "t": float(i), "duration": 0.5, "outcome": outcome}
+            for i, (action, target, outcome) in enumerate(actions)]
+
+
+def test_runs_read_back_as_memmapped_columns(tmp_path):
+    directory = str(tmp_path / "steps")
+    store = main.StepStore(directory)
+    store.append_run(0, steps(("click", "login_button", "ok"), ("type", "username", "error")))
+    store.append_run(1, steps(("scroll", "login_button", "missed")))
+    store.close()
+
+    columns = main.StepStore.load(directory)
+    assert isinstance(columns["run_id"], np.memmap)
+    assert columns["run_id"].tolist() == [0, 0, 1]
+    assert columns["step"].tolist() == [1, 2, 1]
+    assert [main.StepStore.ACTIONS[c] for c in columns["action"]] == ["click", "type", "other"]
+    assert [main.StepStore.OUTCOMES[c] for c in columns["outcome"]] == ["ok", "error", "missed"]
+    targets = main.StepStore.load_targets(directory)
+    assert [targets[c] for c in columns["target"]] == ["login_button", "username", "login_button"]
+    assert columns["t"].tolist() == [0.0, 1.0, 0.0]
+
+
+def test_reopened_store_appends_and_keeps_target_ids(tmp_path):
+    directory = str(tmp_path / "steps")
+    store = main.StepStore(directory)
+    store.append_run(0, steps(("click", "submit", "ok")))
+    store.close()
+    store = main.StepStore(directory)
+    store.append_run(1, steps(("click", "submit", "ok"), ("look", "header", "ok")))
+    store.close()
+
+    columns = main.StepStore.load(directory)
+    assert main.StepStore.row_count(directory) == 3
+    assert columns["run_id"].tolist() == [0, 1, 1]
+    assert main.StepStore.load_targets(directory) == ["submit", "header"]
+    assert columns["target"].tolist() == [0, 0, 1]
+
+
+def test_torn_columns_are_cut_back_on_reopen(tmp_path):
+    directory = str(tmp_path / "steps")
+    store = main.StepStore(directory)
+    store.append_run(0, steps(("click", "a", "ok"), ("click", "b", "ok")))
+    store.close()
+    # A crash mid-append: one column got a row the others did not
+    with open(main.StepStore.column_path(directory, "step"), "ab") as f:
+        f.write(np.array([3], dtype="i").tobytes())
+
+    main.StepStore(directory).close()
+    for name, code in main.StepStore.COLUMNS.items():
+        size = (tmp_path / "steps" / f"{name}.bin").stat().st_size
+        assert size == 2 * np.dtype(code).itemsize
+
+
+def test_chunks_cover_the_table_in_order(tmp_path):
+    directory = str(tmp_path / "steps")
+    store = main.StepStore(directory)
+    for run_id in range(5):
+        store.append_run(run_id, steps(("click", "a", "ok"), ("key", "b", "ok")))
+    store.close()
+
+    chunks = list(main.StepStore.iter_chunks(directory, chunk_rows=4))
+    assert [len(chunk["run_id"]) for chunk in chunks] == [4, 4, 2]
+    assert np.concatenate([chunk["run_id"] for chunk in chunks]).tolist() == [0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+
+
+def test_missing_or_cleared_store_is_empty(tmp_path):
+    directory = str(tmp_path / "steps")
+    assert all(len(column) == 0 for column in main.StepStore.load(directory).values())
+    store = main.StepStore(directory)
+    store.append_run(0, steps(("click", "a", "ok")))
+    store.close()
+    main.StepStore.clear(directory)
+    assert main.StepStore.row_count(directory) == 0
+    assert main.StepStore.load_targets(directory) == []